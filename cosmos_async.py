@@ -0,0 +1,155 @@
+# cosmos_async.py
+"""
+Async Cosmos DB access for the request path, built on azure.cosmos.aio.
+
+One client, and with it one aiohttp connection pool of COSMOS_POOL_SIZE connections,
+is created on first use and shared by every request, so saves and reads no longer hold
+up the event loop for a round trip. Each operation's latency is recorded and reported
+by stats(). Same document layout and lookup rules as cosmos_helper.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+load_dotenv()
+
+COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
+COSMOS_KEY = os.getenv("COSMOS_KEY")
+DATABASE_NAME = os.getenv("COSMOS_DATABASE", "TravelDB")
+CONTAINER_NAME = os.getenv("COSMOS_CONTAINER", "Recommendations")
+COSMOS_STUB = os.getenv("COSMOS_STUB", "false").lower() in ("1", "true", "yes")
+POOL_SIZE = int(os.getenv("COSMOS_POOL_SIZE", "100"))
+# Latency percentiles are taken over this many most recent calls per operation
+LATENCY_WINDOW = 500
+
+_client = None
+_http_session = None
+_container = None
+_init_lock = None
+
+
+class OperationStats:
+    __slots__ = ("calls", "errors", "not_found", "ms_total", "ms_max", "recent")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.not_found = 0
+        self.ms_total = 0.0
+        self.ms_max = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, ms):
+        self.calls += 1
+        self.ms_total += ms
+        self.ms_max = max(self.ms_max, ms)
+        self.recent.append(ms)
+
+    def to_dict(self):
+        ordered = sorted(self.recent)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1) if ordered else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "not_found": self.not_found,
+            "ms_avg": round(self.ms_total / self.calls, 1) if self.calls else 0.0,
+            "ms_p50": percentile(0.5),
+            "ms_p95": percentile(0.95),
+            "ms_max": round(self.ms_max, 1)
+        }
+
+
+_ops = {"upsert": OperationStats(), "read": OperationStats(), "query": OperationStats()}
+
+
+async def _get_container():
+    global _client, _http_session, _container, _init_lock
+    if _container is not None:
+        return _container
+    if _init_lock is None:
+        _init_lock = asyncio.Lock()
+    async with _init_lock:
+        if _container is not None:
+            return _container
+        if COSMOS_STUB:
+            import stub_cosmos
+            _container = stub_cosmos.AsyncInMemoryContainer(partition_key="session_id")
+            return _container
+        import aiohttp
+        from azure.core.pipeline.transport import AioHttpTransport
+        from azure.cosmos import PartitionKey
+        from azure.cosmos.aio import CosmosClient
+
+        if not COSMOS_ENDPOINT or not COSMOS_KEY:
+            raise ValueError("COSMOS_ENDPOINT and COSMOS_KEY must be set in your .env")
+
+        _http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=POOL_SIZE))
+        _client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY, transport=AioHttpTransport(session=_http_session, session_owner=False))
+        # Create database and container (idempotent)
+        database = await _client.create_database_if_not_exists(id=DATABASE_NAME)
+        _container = await database.create_container_if_not_exists(
+            id=CONTAINER_NAME,
+            partition_key=PartitionKey(path="/session_id"),
+            offer_throughput=400
+        )
+        return _container
+
+
+async def _timed(op, coro):
+    op_stats = _ops[op]
+    started = time.perf_counter()
+    try:
+        return await coro
+    except Exception as e:
+        if getattr(e, "status_code", None) == 404:
+            op_stats.not_found += 1
+        else:
+            op_stats.errors += 1
+        raise
+    finally:
+        op_stats.add((time.perf_counter() - started) * 1000)
+
+
+async def save_result(final_result: dict):
+    """
+    Upsert the entire final_result JSON (persona, recommendations, inter_city_travel, etc.)
+    """
+    container = await _get_container()
+    return await _timed("upsert", container.upsert_item(final_result))
+
+
+async def get_result(session_id: str):
+    """
+    Read the item by id/partition_key; fall back to a query if the read fails for any reason but a 404.
+    """
+    container = await _get_container()
+    try:
+        return await _timed("read", container.read_item(item=session_id, partition_key=session_id))
+    except Exception as e:
+        if getattr(e, "status_code", None) == 404:
+            return None
+
+    async def collect():
+        query = "SELECT * FROM c WHERE c.session_id=@session_id"
+        return [item async for item in container.query_items(query, parameters=[{"name": "@session_id", "value": session_id}])]
+
+    items = await _timed("query", collect())
+    return items[0] if items else None
+
+
+async def close():
+    global _client, _http_session, _container
+    if _client is not None:
+        await _client.close()
+    if _http_session is not None:
+        await _http_session.close()
+    _client = _http_session = _container = None
+
+
+def stats():
+    return {op: op_stats.to_dict() for op, op_stats in _ops.items()}
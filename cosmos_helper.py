@@ -1,25 +1,32 @@
 # cosmos_helper.py
 
 import os
-from azure.cosmos import CosmosClient, PartitionKey
 from dotenv import load_dotenv
 load_dotenv()
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
 COSMOS_KEY = os.getenv("COSMOS_KEY")
 DATABASE_NAME = os.getenv("COSMOS_DATABASE", "TravelDB")
 CONTAINER_NAME = os.getenv("COSMOS_CONTAINER", "Recommendations")
+# Swap the real account for an in-memory container (load benchmarks, offline runs)
+COSMOS_STUB = os.getenv("COSMOS_STUB", "false").lower() in ("1", "true", "yes")
 
-if not COSMOS_ENDPOINT or not COSMOS_KEY:
-    raise ValueError("COSMOS_ENDPOINT and COSMOS_KEY must be set in your .env")
+if COSMOS_STUB:
+    import stub_cosmos
+    container = stub_cosmos.InMemoryContainer(partition_key="session_id")
+else:
+    from azure.cosmos import CosmosClient, PartitionKey
 
-# Create client, database and container (idempotent)
-client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-database = client.create_database_if_not_exists(id=DATABASE_NAME)
-container = database.create_container_if_not_exists(
-    id=CONTAINER_NAME,
-    partition_key=PartitionKey(path="/session_id"),
-    offer_throughput=400
-)
+    if not COSMOS_ENDPOINT or not COSMOS_KEY:
+        raise ValueError("COSMOS_ENDPOINT and COSMOS_KEY must be set in your .env")
+
+    # Create client, database and container (idempotent)
+    client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+    database = client.create_database_if_not_exists(id=DATABASE_NAME)
+    container = database.create_container_if_not_exists(
+        id=CONTAINER_NAME,
+        partition_key=PartitionKey(path="/session_id"),
+        offer_throughput=400
+    )
 def save_result(final_result: dict):
     """
     Upsert the entire final_result JSON (persona, recommendations, inter_city_travel, etc.)
@@ -32,7 +39,10 @@ def get_result(session_id: str):
     """
     try:
         return container.read_item(item=session_id, partition_key=session_id)
-    except Exception:
+    except Exception as e:
+        # Documents are stored with id == session_id, so a clean 404 means there is nothing to find
+        if getattr(e, "status_code", None) == 404:
+            return None
         query = "SELECT * FROM c WHERE c.session_id=@session_id"
         items = list(container.query_items(
             query,
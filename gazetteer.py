@@ -0,0 +1,246 @@
+# gazetteer.py
+"""
+Local gazetteer of cities, airports and points of interest.
+
+Backed by an indexed SQLite file opened with a large mmap_size, so lookups read the
+memory-mapped pages instead of issuing file I/O. The first open loads
+gazetteer_seed.csv. Places the model resolves on a miss are written back through
+remember() and served locally from then on.
+"""
+
+import os
+import re
+import csv
+import time
+import difflib
+import sqlite3
+import threading
+import unicodedata
+from dotenv import load_dotenv
+load_dotenv()
+
+GAZETTEER_ENABLED = os.getenv("GAZETTEER_ENABLED", "true").lower() in ("1", "true", "yes")
+DB_PATH = os.getenv("GAZETTEER_PATH", "gazetteer.sqlite3")
+SEED_PATH = os.getenv("GAZETTEER_SEED", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer_seed.csv"))
+MMAP_BYTES = int(os.getenv("GAZETTEER_MMAP_BYTES", str(256 * 1024 * 1024)))
+FUZZY_CUTOFF = float(os.getenv("GAZETTEER_FUZZY_CUTOFF", "0.85"))
+# Bump when gazetteer_seed.csv changes so existing files pick up the new rows
+SEED_VERSION = 1
+# Longest place name, in words, that find_city() tries to match inside free text
+MAX_NAME_WORDS = 4
+DESTINATION_MARKERS = {"to", "in", "visiting", "visit"}
+# Words that describe a kind of place; a phrase made only of these never names one place
+CATEGORY_WORDS = {
+    "a", "an", "the", "some", "local", "good", "best", "nice", "new", "place", "spot",
+    "restaurant", "cafe", "bar", "pub", "food", "museum", "gallery", "park", "garden", "gardens",
+    "beach", "market", "mall", "shop", "store", "club", "hotel", "resort", "temple", "church", "tour"
+}
+
+
+def normalize(text):
+    # Accents, case and punctuation never distinguish two places
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def names_place(phrase, name):
+    """
+    True when `phrase` refers to this particular place rather than a kind of place: it is
+    the start of the name ("Frida's" for "Frida's Mexican Beach House") or contains the
+    whole name. "mexican restaurant" or "museum" never qualify.
+    """
+    phrase_norm, name_norm = normalize(phrase), normalize(name)
+    if not phrase_norm or not name_norm or set(phrase_norm.split()) <= CATEGORY_WORDS:
+        return False
+    return name_norm.startswith(phrase_norm + " ") or f" {name_norm} " in f" {phrase_norm} "
+
+
+class Gazetteer:
+    def __init__(self, path, seed_path):
+        self.path = path
+        self.seed_path = seed_path
+        self._local = threading.local()
+        self._cities = None
+        self.counters = {"hits": 0, "prefix_hits": 0, "fuzzy_hits": 0, "misses": 0, "learned": 0}
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS places ("
+            "id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, city TEXT NOT NULL, "
+            "country TEXT NOT NULL, address TEXT NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL, "
+            "source TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS names ("
+            "norm TEXT NOT NULL, place_id INTEGER NOT NULL, kind TEXT NOT NULL, city_norm TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS names_norm ON names(norm)")
+        conn.execute("CREATE INDEX IF NOT EXISTS names_city ON names(city_norm, kind)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SEED_VERSION:
+            self._seed(conn)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+    def _seed(self, conn):
+        # Learned rows survive a reseed; only the shipped rows are replaced
+        conn.execute("BEGIN IMMEDIATE")
+        # Another worker may have seeded while this one waited for the write lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SEED_VERSION:
+            conn.execute("COMMIT")
+            return
+        conn.execute("DELETE FROM names WHERE place_id IN (SELECT id FROM places WHERE source = 'seed')")
+        conn.execute("DELETE FROM places WHERE source = 'seed'")
+        if os.path.exists(self.seed_path):
+            with open(self.seed_path, encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    self._insert(conn, row["kind"], row["name"], row["aliases"].split("|"), row["city"],
+                                 row["country"], row["address"], float(row["latitude"]), float(row["longitude"]), "seed")
+        conn.execute(f"PRAGMA user_version={SEED_VERSION}")
+        conn.execute("COMMIT")
+
+    def _insert(self, conn, kind, name, aliases, city, country, address, lat, lon, source):
+        place_id = conn.execute(
+            "INSERT INTO places (kind, name, city, country, address, latitude, longitude, source, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, name, city, country, address, lat, lon, source, time.time())
+        ).lastrowid
+        city_norm = normalize(city)
+        for norm in {normalize(n) for n in [name, *aliases] if normalize(n)}:
+            conn.execute("INSERT INTO names (norm, place_id, kind, city_norm) VALUES (?, ?, ?, ?)", (norm, place_id, kind, city_norm))
+        return place_id
+
+    def _place(self, place_id):
+        row = self._conn().execute("SELECT * FROM places WHERE id = ?", (place_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _filters(self, city_norm, kinds):
+        clauses, params = [], []
+        if city_norm:
+            clauses.append("city_norm = ?")
+            params.append(city_norm)
+        if kinds:
+            clauses.append(f"kind IN ({', '.join('?' * len(kinds))})")
+            params.extend(kinds)
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def _city_norm(self, city):
+        # "Hawaii" resolves to the Honolulu entry, whose POIs are filed under "honolulu"
+        if not city:
+            return None
+        match = self.find_city(city)
+        return normalize(match["city"]) if match else normalize(city)
+
+    def lookup(self, query, city=None, kinds=None):
+        """
+        Best match for a place name: exact name or alias, then the shortest name starting
+        with the query, then a fuzzy match. `city` limits the search to one city's entries.
+        Returns the place dict or None.
+        """
+        norm = normalize(query)
+        if not norm:
+            return None
+        conn = self._conn()
+        where, params = self._filters(self._city_norm(city), kinds)
+        row = conn.execute(f"SELECT place_id FROM names WHERE norm = ?{where} LIMIT 1", (norm, *params)).fetchone()
+        if row:
+            self.counters["hits"] += 1
+            return self._place(row["place_id"])
+        row = conn.execute(
+            f"SELECT place_id FROM names WHERE norm > ? AND norm < ?{where} ORDER BY length(norm) LIMIT 1",
+            (norm + " ", norm + " \uffff", *params)
+        ).fetchone()
+        if row:
+            self.counters["prefix_hits"] += 1
+            return self._place(row["place_id"])
+        if where:
+            candidates = {r["norm"]: r["place_id"] for r in conn.execute(f"SELECT norm, place_id FROM names WHERE 1 = 1{where}", params)}
+            close = difflib.get_close_matches(norm, candidates, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                self.counters["fuzzy_hits"] += 1
+                return self._place(candidates[close[0]])
+        self.counters["misses"] += 1
+        return None
+
+    def complete(self, prefix, city=None, kinds=None, limit=10):
+        """
+        Autocomplete: places whose name or alias starts with `prefix`, shortest first.
+        """
+        norm = normalize(prefix)
+        if not norm:
+            return []
+        where, params = self._filters(self._city_norm(city), kinds)
+        rows = self._conn().execute(
+            f"SELECT DISTINCT place_id FROM names WHERE norm >= ? AND norm < ?{where} ORDER BY length(norm) LIMIT ?",
+            (norm, norm + "\uffff", *params, limit)
+        ).fetchall()
+        return [self._place(r["place_id"]) for r in rows]
+
+    def _city_names(self):
+        if self._cities is None:
+            rows = self._conn().execute("SELECT norm, place_id FROM names WHERE kind = 'city'").fetchall()
+            self._cities = {r["norm"]: r["place_id"] for r in rows}
+        return self._cities
+
+    def find_city(self, text):
+        """
+        Known city mentioned in free text ("bengaluru to hawaii for 2 days"). Words after
+        "to", "in" or "visiting" are searched first so the destination wins over the origin,
+        and longer names win over shorter ones ("new york" over "york"). Falls back to a
+        fuzzy match per phrase for typos. Returns the place dict or None.
+        """
+        words = normalize(text).split()
+        markers = [i for i, word in enumerate(words) if word in DESTINATION_MARKERS]
+        spans = [words[markers[-1] + 1:], words] if markers else [words]
+        cities = self._city_names()
+        for span in spans:
+            phrases = [" ".join(span[i:i + n]) for n in range(min(MAX_NAME_WORDS, len(span)), 0, -1) for i in range(len(span) - n + 1)]
+            for phrase in phrases:
+                if phrase in cities:
+                    return self._place(cities[phrase])
+            for phrase in phrases:
+                if len(phrase) >= 4:
+                    close = difflib.get_close_matches(phrase, cities, n=1, cutoff=FUZZY_CUTOFF)
+                    if close:
+                        return self._place(cities[close[0]])
+        return None
+
+    def remember(self, name, address, lat, lon, city="", kind="poi", country="", aliases=()):
+        """
+        Store a place the model resolved so the next lookup is local. Places without
+        coordinates and names already known in that city are skipped. Aliases are kept only
+        when they name this place (see names_place()), so a generic query such as "museum"
+        keeps going to the model instead of always resolving to the first museum it found.
+        """
+        aliases = [alias for alias in aliases if names_place(alias, name)]
+        if not name or not lat or not lon:
+            return None
+        match = self.find_city(city) if city else None
+        city_name = match["city"] if match else (city or "")
+        city_norm = normalize(city_name)
+        conn = self._conn()
+        existing = conn.execute("SELECT place_id FROM names WHERE norm = ? AND city_norm = ? LIMIT 1", (normalize(name), city_norm)).fetchone()
+        if existing:
+            return existing["place_id"]
+        conn.execute("BEGIN")
+        place_id = self._insert(conn, kind, name, list(aliases), city_name, country, address or "", float(lat), float(lon), "llm")
+        conn.execute("COMMIT")
+        self.counters["learned"] += 1
+        if kind == "city":
+            self._cities = None
+        return place_id
+
+    def stats(self):
+        conn = self._conn()
+        by_source = {r["source"]: r["count"] for r in conn.execute("SELECT source, COUNT(*) AS count FROM places GROUP BY source")}
+        return {**self.counters, "enabled": GAZETTEER_ENABLED, "places": by_source}
+
+
+gazetteer = Gazetteer(DB_PATH, SEED_PATH)
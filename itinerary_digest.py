@@ -0,0 +1,34 @@
+# itinerary_digest.py
+
+def activity_type(activity):
+    if activity.get("meal"):
+        return activity["meal"]
+    return activity.get("action") or "Activity"
+
+
+def build_digest(itinerary, city_idx=0):
+    """
+    Render the itinerary as a compact ID | Day | Time | Type | Name table for prompts.
+    IDs are the itinerary model's activity IDs ("A12"), which stay attached to their
+    activity when other activities are inserted or removed.
+    """
+    lines = ["ID | Day | Time | Type | Name"]
+    for day_idx, day in enumerate(itinerary.recommendations(city_idx)):
+        for activity in day.get("activities", []):
+            lines.append(" | ".join([
+                itinerary.id_of(activity) or "",
+                str(day_idx + 1),
+                str(activity.get("time", "")),
+                activity_type(activity),
+                str(activity.get("name", ""))
+            ]))
+    return "\n".join(lines)
+
+
+def resolve(itinerary, item_id):
+    """
+    Activity for an ID returned by the model, tolerant of case and stray whitespace.
+    """
+    if not item_id:
+        return None
+    return itinerary.get(str(item_id).strip().upper())
@@ -0,0 +1,304 @@
+# itinerary_engine.py
+
+import json
+import asyncio
+import llm_gateway
+
+# Calls per day before the whole plan is failed; transient API errors are already retried by the gateway
+DAY_ATTEMPTS = 2
+# Skeleton calls before a wrong day count is fixed up locally instead
+SKELETON_ATTEMPTS = 2
+
+ACTIVITY_RULES = """
+Every activity is a JSON object with these fields:
+  "time": "HH:MM AM/PM",
+  "action": only for Arrival, Transfer, Pre Check-in Activity, Hotel Check-in, Nightlife, Return to Hotel, Hotel Check-out, Departure,
+  "meal": only for restaurants, one of Breakfast/Lunch/Dinner,
+  "name", "address", "latitude", "longitude",
+  "travel_distance_from_previous": "X km",
+  "travel_time_from_previous": "X mins" (add "by taxi/metro" when not walking),
+  "highlights": 3-4 descriptive travel-guide sentences,
+  "carry": practical items to carry (sightseeing activities only),
+  "why_recommended": 1-2 sentences tied to the traveler's choices (activities, meals and hotel check-in),
+  "rating": decimal between 1.0 and 5.0,
+  "reviews": {"Review 1": "...", "Review 2": "...", "Review 3": "...", "Review 4": "...", "Review 5": "..."}
+Rules:
+- Activities are chronological with realistic travel times (1 km ≈ 10 mins walk, 5 km ≈ 15 mins by taxi).
+- Meals must only be: Breakfast (7–10 AM), Lunch (12–2 PM), Dinner (7–9 PM). Nightlife is never a meal.
+- Every day except the last ends with "action": "Return to Hotel" at "End of Day" using the hotel's name and address.
+- Hotel Check-in, Return to Hotel and Hotel Check-out use the hotel name and address exactly as given.
+- Transfers are named "Transfer from <A> to <B>" with address "A full address → B full address".
+- Always include latitude and longitude.
+"""
+
+
+def trip_profile(session, days):
+    return {
+        "travel_vibe": session.get("travel_vibe") or "Unknown",
+        "origin": session.get("origin") or "Unknown",
+        "destination": session.get("destination") or "Unknown",
+        "scene_prefs": ", ".join(session.get("scene_preferences", [])),
+        "trip_goals": ", ".join(session.get("trip_goals", [])),
+        "accommodation": session.get("accommodation_type") or "Unknown",
+        "movie_desc": session.get("movie_description") or "Adventure",
+        "days": days
+    }
+
+
+def profile_block(profile):
+    return f"""Travel Vibe: {profile['travel_vibe']}
+Origin: {profile['origin']}
+Destination: {profile['destination']}
+Scene Preferences: {profile['scene_prefs']}
+Trip Goals: {profile['trip_goals']}
+Accommodation Type: {profile['accommodation']}
+Movie Description: {profile['movie_desc']}
+Days: {profile['days']}"""
+
+
+def build_skeleton_prompt(profile):
+    return f"""
+You are a travel assistant. Based on this user profile:
+{profile_block(profile)}
+
+Plan the outline of a {profile['days']}-day trip. Do NOT generate activities yet.
+Return JSON in exactly this format:
+{{
+  "persona": "A short description of the traveler",
+  "cities": [
+    {{
+      "city_name": "City Name",
+      "hotel": {{
+        "name": "Hotel Name",
+        "address": "Full address",
+        "latitude": 0.0,
+        "longitude": 0.0,
+        "check_in": "HH:MM AM/PM",
+        "check_out": "HH:MM AM/PM",
+        "why_recommended": "1-2 sentences on why this hotel matches their {profile['travel_vibe']} vibe and {profile['accommodation']} preference"
+      }},
+      "days": [
+        {{
+          "day": "Day X - Title",
+          "arrival_time": "HH:MM AM/PM",
+          "theme": "One line describing the focus and neighbourhoods of this day"
+        }}
+      ]
+    }}
+  ],
+  "inter_city_travel": [
+    {{
+      "from_city": "Origin City",
+      "to_city": "Destination City",
+      "mode": "Flight/Train/Bus",
+      "departure_time": "HH:MM AM/PM",
+      "arrival_time": "HH:MM AM/PM",
+      "travel_duration": "Xh Ym",
+      "departure_point": {{"name": "Station or Airport Name", "address": "Full address", "latitude": 0.0, "longitude": 0.0}},
+      "arrival_point": {{"name": "Station or Airport Name", "address": "Full address", "latitude": 0.0, "longitude": 0.0}}
+    }}
+  ]
+}}
+Rules:
+- Output must be valid JSON only.
+- Include exactly {profile['days']} entries in "days" across all cities, in order.
+- Give every day a distinct theme and area so no place needs to be repeated.
+- inter_city_travel is a full round trip: origin to destination, then destination back to origin after the last day.
+"""
+
+
+def build_day_prompt(profile, skeleton, city, day_outline, day_number, total_days):
+    hotel = city.get("hotel", {})
+    other_days = [d.get("theme", "") for d in city.get("days", []) if d is not day_outline]
+    position = []
+    if day_number == 1:
+        inbound = (skeleton.get("inter_city_travel") or [{}])[0]
+        arrival_point = inbound.get("arrival_point", {}).get("name", "the airport")
+        position.append(
+            f"This is the arrival day. Start with \"action\": \"Arrival\" at {arrival_point} around {day_outline.get('arrival_time', inbound.get('arrival_time', ''))}, "
+            "then the airport-to-hotel Transfer, then Pre Check-in Activity entries if arrival is before check-in, "
+            f"then \"action\": \"Hotel Check-in\" at {hotel.get('check_in', '03:00 PM')}."
+        )
+    if day_number == total_days:
+        outbound = (skeleton.get("inter_city_travel") or [{}])[-1]
+        position.append(
+            f"This is the last day. End with \"action\": \"Hotel Check-out\" by {hotel.get('check_out', '11:00 AM')} or later in the day, "
+            f"then a Transfer to {outbound.get('departure_point', {}).get('name', 'the airport')} and \"action\": \"Departure\" before {outbound.get('departure_time', 'the flight')}."
+        )
+    return f"""
+You are a travel assistant. Based on this user profile:
+{profile_block(profile)}
+
+Traveler persona: {skeleton.get('persona', '')}
+City: {city.get('city_name', profile['destination'])}
+Hotel: {json.dumps(hotel, ensure_ascii=False)}
+Plan only {day_outline.get('day', f'Day {day_number}')} of {total_days}. Theme: {day_outline.get('theme', '')}
+Other days already cover: {'; '.join(other_days) or 'nothing else'}. Do not reuse places that fit those themes.
+{' '.join(position)}
+{ACTIVITY_RULES}
+Reference the user's Travel Vibe ({profile['travel_vibe']}), Scene Preferences ({profile['scene_prefs']}) and Trip Goals ({profile['trip_goals']}) in every "why_recommended".
+
+Return JSON: {{"day": "{day_outline.get('day', f'Day {day_number}')}", "arrival_time": "HH:MM AM/PM", "activities": [ ... ]}}
+"""
+
+
+async def generate_day(profile, skeleton, city, day_outline, day_number, total_days):
+    prompt = build_day_prompt(profile, skeleton, city, day_outline, day_number, total_days)
+    for attempt in range(1, DAY_ATTEMPTS + 1):
+        try:
+            day_resp = await llm_gateway.complete(
+                step="day_plan",
+                messages=[
+                    {"role": "system", "content": "You are a helpful travel assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+            day_json = json.loads(day_resp)
+            if not day_json.get("activities"):
+                raise ValueError("no activities in day plan")
+            break
+        except Exception as e:
+            print(f"Day {day_number} generation error (attempt {attempt}):", e)
+            # A plan with an empty day must not be saved as if it were complete
+            if attempt == DAY_ATTEMPTS:
+                raise
+    return {
+        "day": day_json.get("day") or day_outline.get("day", f"Day {day_number}"),
+        "arrival_time": day_json.get("arrival_time") or day_outline.get("arrival_time", ""),
+        "activities": day_json["activities"]
+    }
+
+
+def day_count(skeleton):
+    return sum(len(city.get("days", [])) for city in skeleton.get("cities") or [])
+
+
+def fit_days(skeleton, days):
+    """
+    Trim or pad the skeleton's day outlines to the requested trip length. Extra days come
+    off the end of the trip; missing days go to the last city with an open theme, so
+    generate_day() still plans them.
+    """
+    cities = skeleton.get("cities") or []
+    if not cities:
+        return skeleton
+    total = day_count(skeleton)
+    while total > days:
+        city = next(city for city in reversed(cities) if city.get("days"))
+        city["days"].pop()
+        total -= 1
+    last = cities[-1]
+    while total < days:
+        total += 1
+        last.setdefault("days", []).append({
+            "day": f"Day {total} - More of {last.get('city_name', 'the city')}",
+            "arrival_time": "",
+            "theme": "Neighbourhoods and places the other days do not cover"
+        })
+    # Cities left without days would show up as empty stops
+    skeleton["cities"] = [city for city in cities if city.get("days")]
+    return skeleton
+
+
+async def generate_skeleton(profile):
+    for attempt in range(1, SKELETON_ATTEMPTS + 1):
+        skeleton_resp = await llm_gateway.complete(
+            step="skeleton",
+            messages=[
+                {"role": "system", "content": "You are a helpful travel assistant."},
+                {"role": "user", "content": build_skeleton_prompt(profile)}
+            ],
+            response_format={"type": "json_object"}
+        )
+        skeleton = json.loads(skeleton_resp)
+        # The days are fanned out from the outline, so a wrong count means a wrong-length trip
+        if day_count(skeleton) == profile["days"]:
+            return skeleton
+        print(f"Skeleton has {day_count(skeleton)} days instead of {profile['days']} (attempt {attempt})")
+    return fit_days(skeleton, profile["days"])
+
+
+def start_days(profile, skeleton):
+    # task -> (city index, day index within the city), in plan order
+    outlines = [
+        (city_idx, day_idx, city, outline)
+        for city_idx, city in enumerate(skeleton.get("cities") or [])
+        for day_idx, outline in enumerate(city.get("days", []))
+    ]
+    return {
+        asyncio.ensure_future(generate_day(profile, skeleton, city, outline, day_number, len(outlines))): (city_idx, day_idx)
+        for day_number, (city_idx, day_idx, city, outline) in enumerate(outlines, start=1)
+    }
+
+
+def assemble(profile, skeleton, day_plans):
+    # day_plans: (city index, day index) -> day
+    return {
+        "persona": skeleton.get("persona", ""),
+        "cities": [
+            {
+                "city_name": city.get("city_name", profile["destination"]),
+                "hotel": city.get("hotel", {}),
+                "recommendations": [day_plans[(city_idx, day_idx)] for day_idx in range(len(city.get("days", [])))]
+            }
+            for city_idx, city in enumerate(skeleton.get("cities") or [])
+        ],
+        "inter_city_travel": skeleton.get("inter_city_travel", [])
+    }
+
+
+async def generate(session, days):
+    """
+    Two-phase itinerary generation. One quick call returns the persona, hotels,
+    inter_city_travel and one-line day themes; every day's activities are then
+    generated concurrently against that skeleton and merged into the usual
+    cities[].recommendations[] shape.
+    """
+    profile = trip_profile(session, days)
+    skeleton = await generate_skeleton(profile)
+    tasks = start_days(profile, skeleton)
+    try:
+        day_plans = await asyncio.gather(*tasks)
+    except Exception:
+        # One failed day fails the plan, so the others need not finish
+        for task in tasks:
+            task.cancel()
+        raise
+    return assemble(profile, skeleton, dict(zip(tasks.values(), day_plans)))
+
+
+async def stream(session, days):
+    """
+    Same plan as generate(), yielded piece by piece as (path, value) pairs using the
+    paths of the final document: persona, each inter_city_travel leg and hotel once the
+    skeleton is back, then each day's activities and the day itself as that day
+    finishes (days complete in any order). The last pair is ((), whole plan).
+    """
+    profile = trip_profile(session, days)
+    skeleton = await generate_skeleton(profile)
+    yield ("persona",), skeleton.get("persona", "")
+    for leg_idx, leg in enumerate(skeleton.get("inter_city_travel", [])):
+        yield ("inter_city_travel", leg_idx), leg
+    for city_idx, city in enumerate(skeleton.get("cities") or []):
+        if "hotel" in city:
+            yield ("cities", city_idx, "hotel"), city["hotel"]
+
+    tasks = start_days(profile, skeleton)
+    day_plans = {}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                city_idx, day_idx = tasks[task]
+                day = task.result()
+                day_plans[(city_idx, day_idx)] = day
+                for act_idx, activity in enumerate(day["activities"]):
+                    yield ("cities", city_idx, "recommendations", day_idx, "activities", act_idx), activity
+                yield ("cities", city_idx, "recommendations", day_idx), day
+    finally:
+        # Also reached when a day fails or the client goes away mid-stream
+        for task in tasks:
+            task.cancel()
+    yield (), assemble(profile, skeleton, day_plans)
@@ -0,0 +1,299 @@
+# itinerary_model.py
+"""
+Indexed model of a session's itinerary.
+
+The result dict stays the JSON that is saved and returned, so serializing the model
+is exact by construction. Alongside it every activity gets a small typed record
+(slots only, interned name and type) with a stable ID, and the model keeps indexes by
+normalized name, by type (meal or action) and by day, so edit paths find an activity
+in O(1) instead of scanning every day with substring matches.
+
+Each activity is also classified once when it enters the plan (transfer, meal,
+activity, or nothing for arrival/check-in style steps), and add, remove and replace
+adjust summary.counts directly instead of re-scanning the plan.
+
+Activities that point at the city's hotel (check-in/out, return to hotel, transfers to
+or from it, or any mention of its name) are kept in a reference index, so set_hotel()
+swaps the hotel by visiting only those activities.
+
+Edits that change an activity in place must call reindex() afterwards.
+"""
+
+import sys
+
+# Steps that are part of every plan and are not counted as activities
+UNCOUNTED_ACTIONS = {"Arrival", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"}
+MEAL_ACTIONS = {"Breakfast", "Lunch", "Dinner"}
+# classify() result -> summary counter
+COUNTERS = {"transfer": "transfers", "meal": "meals", "activity": "activities"}
+# Short values that repeat across every plan; interning keeps one copy per process
+HOTEL_ACTIONS = {"Hotel Check-in", "Hotel Check-out", "Return to Hotel"}
+INTERNED_FIELDS = ("time", "action", "meal", "travel_distance_from_previous", "travel_time_from_previous")
+
+
+def classify(activity):
+    action = activity.get("action", "")
+    if action == "Transfer" or "transfer" in activity.get("name", "").lower():
+        return "transfer"
+    if activity.get("meal") or action in MEAL_ACTIONS:
+        return "meal"
+    if action not in UNCOUNTED_ACTIONS:
+        return "activity"
+    return None
+
+
+def normalize_name(name):
+    return " ".join(str(name or "").lower().split())
+
+
+def type_of(activity):
+    # "breakfast"/"lunch"/"dinner" for meals, else the lowercased action ("visit", "transfer", ...)
+    if activity.get("meal"):
+        return sys.intern(activity["meal"].strip().lower())
+    return sys.intern((activity.get("action") or "activity").strip().lower())
+
+
+def hotel_role(activity, hotel_name):
+    """
+    How an activity refers to the hotel: "stay" (check-in/out, return), "transfer_to",
+    "transfer_from", "mention" (name contains the hotel's), or None.
+    """
+    action = activity.get("action", "")
+    if action in HOTEL_ACTIONS:
+        return "stay"
+    name = activity.get("name", "").lower()
+    hotel = hotel_name.lower()
+    if action == "Transfer":
+        # "Transfer from <origin> to <hotel>" / "Transfer from <hotel> to <destination>"
+        origin, _, target = name.partition(" to ")
+        if target and ((hotel and hotel in target) or "hotel" in target):
+            return "transfer_to"
+        if (hotel and hotel in origin) or "hotel" in origin:
+            return "transfer_from"
+        return None
+    if hotel and hotel in name:
+        return "mention"
+    return None
+
+
+def point_at_hotel(activity, role, old_name, hotel):
+    name = activity.get("name", "")
+    address = activity.get("address", "")
+    new_name = hotel.get("name", "")
+    new_address = hotel.get("address", "")
+    if role == "stay":
+        activity["name"] = new_name
+        activity["address"] = new_address
+    elif role == "transfer_to":
+        from_part = name.split(" to ")[0].replace("Transfer from ", "")
+        activity["name"] = f"Transfer from {from_part} to {new_name}"
+        activity["address"] = f"{address.split(' → ')[0]} → {new_address}" if " → " in address else new_address
+    elif role == "transfer_from":
+        to_part = name.split(" to ", 1)[1] if " to " in name else "Airport"
+        activity["name"] = f"Transfer from {new_name} to {to_part}"
+        activity["address"] = f"{new_address} → {address.split(' → ')[1]}" if " → " in address else f"{new_address} → {to_part}"
+        # The trip starts at the hotel, the activity itself stays where it ends
+        return
+    elif role == "mention":
+        activity["name"] = name.replace(old_name, new_name)
+        if old_name.lower() not in address.lower():
+            return
+        activity["address"] = new_address
+    activity["latitude"] = hotel.get("latitude", 0.0)
+    activity["longitude"] = hotel.get("longitude", 0.0)
+
+
+class ActivityRef:
+    __slots__ = ("id", "city", "day", "activity", "norm", "type", "kind", "hotel_role")
+
+    def __init__(self, activity_id, city, day, activity, hotel_name):
+        self.id = activity_id
+        self.city = city
+        self.day = day
+        self.activity = activity
+        self.norm = sys.intern(normalize_name(activity.get("name")))
+        self.type = type_of(activity)
+        self.kind = classify(activity)
+        self.hotel_role = hotel_role(activity, hotel_name)
+
+
+class Itinerary:
+    def __init__(self, result_json):
+        self.result = result_json
+        self.counts = {"flights": 0, "transfers": 0, "hotels": 0, "activities": 0, "meals": 0}
+        self._next_id = 1
+        self._by_id = {}
+        # id(activity dict) -> its record, valid while the dict is part of the plan
+        self._by_obj = {}
+        # normalized name / type -> {activity id: record}, in insertion order
+        self._by_name = {}
+        self._by_type = {}
+        # city index -> {activity id: record} of activities that refer to that city's hotel
+        self._hotel_refs = {}
+        self.counts["flights"] = len(result_json.get("inter_city_travel", []))
+        for city_idx, city in enumerate(result_json.get("cities", [])):
+            if "hotel" in city:
+                self.counts["hotels"] += 1
+            for day_idx, day in enumerate(city.get("recommendations", [])):
+                for activity in day.get("activities", []):
+                    self._track(activity, city_idx, day_idx)
+
+    def _track(self, activity, city_idx, day_idx):
+        for field in INTERNED_FIELDS:
+            if isinstance(activity.get(field), str):
+                activity[field] = sys.intern(activity[field])
+        ref = ActivityRef(f"A{self._next_id}", city_idx, day_idx, activity, self.hotel_name(city_idx))
+        self._next_id += 1
+        self._by_id[ref.id] = ref
+        self._by_obj[id(activity)] = ref
+        self._index(ref)
+        return ref
+
+    def _index(self, ref):
+        self._by_name.setdefault(ref.norm, {})[ref.id] = ref
+        self._by_type.setdefault(ref.type, {})[ref.id] = ref
+        if ref.hotel_role:
+            self._hotel_refs.setdefault(ref.city, {})[ref.id] = ref
+        if ref.kind:
+            self.counts[COUNTERS[ref.kind]] += 1
+
+    def _unindex(self, ref):
+        self._by_name[ref.norm].pop(ref.id, None)
+        self._by_type[ref.type].pop(ref.id, None)
+        self._hotel_refs.get(ref.city, {}).pop(ref.id, None)
+        if ref.kind:
+            self.counts[COUNTERS[ref.kind]] -= 1
+
+    def _untrack(self, activity):
+        ref = self._by_obj.pop(id(activity), None)
+        if ref is None:
+            return None
+        del self._by_id[ref.id]
+        self._unindex(ref)
+        return ref
+
+    def hotel_name(self, city_idx=0):
+        return (self.result["cities"][city_idx].get("hotel") or {}).get("name", "")
+
+    def set_hotel(self, hotel, city_idx=0):
+        """
+        Make `hotel` the city's hotel and repoint every activity that refers to the old one.
+        """
+        city = self.result["cities"][city_idx]
+        old_name = self.hotel_name(city_idx)
+        if "hotel" not in city:
+            self.counts["hotels"] += 1
+        city["hotel"] = hotel
+        for ref in list(self._hotel_refs.get(city_idx, {}).values()):
+            point_at_hotel(ref.activity, ref.hotel_role, old_name, hotel)
+            self.reindex(ref.activity)
+
+    def hotel_references(self, city_idx=0):
+        return [ref.activity for ref in self._plan_order(self._hotel_refs.get(city_idx, {}).values())]
+
+    def recommendations(self, city_idx=0):
+        return self.result["cities"][city_idx]["recommendations"]
+
+    def activities(self, day_idx, city_idx=0):
+        return self.recommendations(city_idx)[day_idx]["activities"]
+
+    def insert(self, day_idx, act_idx, activity, city_idx=0):
+        self.activities(day_idx, city_idx).insert(act_idx, activity)
+        return self._track(activity, city_idx, day_idx).id
+
+    def append(self, day_idx, activity, city_idx=0):
+        self.activities(day_idx, city_idx).append(activity)
+        return self._track(activity, city_idx, day_idx).id
+
+    def remove(self, day_idx, act_idx, city_idx=0):
+        activity = self.activities(day_idx, city_idx).pop(act_idx)
+        self._untrack(activity)
+        return activity
+
+    def replace(self, day_idx, act_idx, activity, city_idx=0):
+        activities = self.activities(day_idx, city_idx)
+        self._untrack(activities[act_idx])
+        activities[act_idx] = activity
+        return self._track(activity, city_idx, day_idx).id
+
+    def replace_day(self, day_idx, day, city_idx=0):
+        days = self.recommendations(city_idx)
+        for activity in days[day_idx].get("activities", []):
+            self._untrack(activity)
+        days[day_idx] = day
+        for activity in day.get("activities", []):
+            self._track(activity, city_idx, day_idx)
+
+    def reindex(self, activity):
+        """
+        Refresh the indexes and counts after an activity's name, action or meal changed in place.
+        The activity keeps its ID.
+        """
+        ref = self._by_obj.get(id(activity))
+        if ref is None:
+            return
+        self._unindex(ref)
+        ref.norm = sys.intern(normalize_name(activity.get("name")))
+        ref.type = type_of(activity)
+        ref.kind = classify(activity)
+        ref.hotel_role = hotel_role(activity, self.hotel_name(ref.city))
+        self._index(ref)
+
+    def _position(self, ref):
+        # Days hold a handful of activities, so a scan of one day is cheap
+        for idx, activity in enumerate(self.activities(ref.day, ref.city)):
+            if activity is ref.activity:
+                return idx
+        return -1
+
+    def _plan_order(self, refs):
+        return sorted(refs, key=lambda ref: (ref.city, ref.day, self._position(ref)))
+
+    def get(self, activity_id):
+        ref = self._by_id.get(activity_id)
+        return ref.activity if ref else None
+
+    def id_of(self, activity):
+        ref = self._by_obj.get(id(activity))
+        return ref.id if ref else None
+
+    def locate(self, activity):
+        """
+        (city_idx, day_idx, act_idx) of an activity in the plan, or None.
+        """
+        ref = self._by_obj.get(id(activity))
+        return (ref.city, ref.day, self._position(ref)) if ref else None
+
+    def find(self, name, day_idx=None, types=None):
+        """
+        First activity, in plan order, whose name matches: an exact (normalized) match wins,
+        otherwise any activity whose name contains `name`. Optionally limited to one day
+        and to some types ("lunch", "visit", ...). Returns the activity dict or None.
+        """
+        norm = normalize_name(name)
+        if not norm:
+            return None
+        refs = list(self._by_name.get(norm, {}).values())
+        if not refs:
+            refs = [ref for key, bucket in self._by_name.items() if norm in key for ref in bucket.values()]
+        if day_idx is not None:
+            refs = [ref for ref in refs if ref.day == day_idx]
+        if types is not None:
+            refs = [ref for ref in refs if ref.type in types]
+        return self._plan_order(refs)[0].activity if refs else None
+
+    def of_type(self, *types):
+        """
+        Activities of the given types ("breakfast", "transfer", ...) in plan order.
+        """
+        refs = [ref for t in types for ref in self._by_type.get(t, {}).values()]
+        return [ref.activity for ref in self._plan_order(refs)]
+
+    def names(self):
+        return [ref.activity.get("name", "") for ref in self._by_id.values()]
+
+    def summary(self):
+        return {"counts": dict(self.counts)}
+
+    def to_json(self):
+        return self.result
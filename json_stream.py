@@ -0,0 +1,91 @@
+# json_stream.py
+
+import json
+
+
+class JsonStreamParser:
+    """
+    Incremental scanner for a JSON document that arrives in chunks.
+    feed() returns (path, value) for every container or top-level scalar that
+    has just closed and whose path is accepted by the `wanted` predicate.
+    Paths are tuples of object keys and array indexes, e.g. ("cities", 0, "hotel").
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+
+    def feed(self, chunk):
+        events = []
+        self.buffer += chunk
+        text = self.buffer
+        while self.pos < len(text):
+            ch = text[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    self._close_string(events)
+            elif ch == '"':
+                self._start_value()
+                self.in_string = True
+                self.string_start = self.pos
+            elif ch in "{[":
+                self._start_value()
+                self.stack.append({
+                    "type": ch,
+                    "start": self.pos,
+                    "path": self._child_path(),
+                    "key": None,
+                    "expecting_key": ch == "{",
+                    "index": -1,
+                    "awaiting_value": ch == "["
+                })
+            elif ch in "}]":
+                frame = self.stack.pop()
+                if self.wanted(frame["path"]):
+                    events.append((frame["path"], json.loads(text[frame["start"]:self.pos + 1])))
+            elif ch == ",":
+                if self.stack:
+                    frame = self.stack[-1]
+                    if frame["type"] == "{":
+                        frame["expecting_key"] = True
+                    else:
+                        frame["awaiting_value"] = True
+            elif not ch.isspace() and ch != ":":
+                # First character of a number or literal
+                self._start_value()
+            self.pos += 1
+        return events
+
+    def _start_value(self):
+        if self.stack and self.stack[-1]["type"] == "[" and self.stack[-1]["awaiting_value"]:
+            self.stack[-1]["index"] += 1
+            self.stack[-1]["awaiting_value"] = False
+
+    def _child_path(self):
+        if not self.stack:
+            return ()
+        parent = self.stack[-1]
+        return parent["path"] + ((parent["key"] if parent["type"] == "{" else parent["index"]),)
+
+    def _close_string(self, events):
+        if not self.stack:
+            return
+        frame = self.stack[-1]
+        raw = self.buffer[self.string_start:self.pos + 1]
+        if frame["type"] == "{" and frame["expecting_key"]:
+            frame["key"] = json.loads(raw)
+            frame["expecting_key"] = False
+            return
+        path = self._child_path()
+        if len(self.stack) == 1 and self.wanted(path):
+            events.append((path, json.loads(raw)))
@@ -0,0 +1,223 @@
+# llm_cache.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+MEMORY_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "llm_cache.sqlite3")
+DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "50000"))
+# A disk hit refreshes the row's recency at most this often, so reads rarely write
+TOUCH_INTERVAL = float(os.getenv("LLM_CACHE_TOUCH_INTERVAL", "3600"))
+
+
+def normalize_messages(messages):
+    # Whitespace differences in the prompt templates should not split keys
+    return [
+        {**message, "content": " ".join(message["content"].split())}
+        if isinstance(message.get("content"), str) else message
+        for message in messages
+    ]
+
+
+def make_key(deployment, messages, response_format=None, **kwargs):
+    """
+    Stable hash of everything that determines a completion.
+    """
+    payload = {
+        "deployment": deployment,
+        "messages": normalize_messages(messages),
+        "response_format": response_format,
+        "params": kwargs
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """
+    Process-local LRU with per-entry expiry.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """
+    On-disk tier shared by every worker on the host. Rows past DB_MAX_ENTRIES are
+    evicted least-recently-used first, with recency kept to within TOUCH_INTERVAL.
+    Expired rows are left for evict().
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, last_used FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at, last_used = row
+        now = time.time()
+        if expires_at < now:
+            return None
+        if now - last_used > TOUCH_INTERVAL:
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, now + (ttl or self.ttl), now)
+        )
+        self._writes += 1
+        # Trim occasionally rather than on every insert
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM llm_cache")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class TieredCache:
+    """
+    Memory LRU in front of the shared SQLite tier. Disk hits are promoted to memory.
+    Disk reads and writes run in a worker thread, since they can wait on another
+    worker's write lock.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "errors": 0}
+
+    async def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+        if self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                print("LLM cache read error:", e)
+                self.counters["errors"] += 1
+                value = None
+            if value is not None:
+                self.counters["disk_hits"] += 1
+                self.memory.set(key, value)
+                return value
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key, value, ttl=None):
+        self.counters["sets"] += 1
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, ttl)
+            except sqlite3.Error as e:
+                print("LLM cache write error:", e)
+                self.counters["errors"] += 1
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "enabled": CACHE_ENABLED
+        }
+
+
+def _build_cache():
+    disk = None
+    if CACHE_ENABLED and DB_PATH:
+        try:
+            disk = SQLiteTier(DB_PATH, DB_MAX_ENTRIES, CACHE_TTL)
+        except sqlite3.Error as e:
+            print("LLM cache disk tier unavailable:", e)
+    return TieredCache(MemoryTier(MEMORY_MAX_ENTRIES, CACHE_TTL), disk)
+
+
+cache = _build_cache()
@@ -0,0 +1,203 @@
+# llm_gateway.py
+
+import os
+import json
+import time
+import asyncio
+import openai
+from openai import AsyncAzureOpenAI
+from dotenv import load_dotenv
+import llm_cache
+import llm_metrics
+import llm_scheduler
+from singleflight import SingleFlight
+load_dotenv()
+
+DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+# Upper bound on concurrent requests to Azure OpenAI from this worker
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+
+# Retries are handled here rather than inside the SDK so that they can be counted per call
+client = AsyncAzureOpenAI(
+    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+    timeout=REQUEST_TIMEOUT,
+    max_retries=0
+)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError
+)
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+_in_flight = 0
+flights = SingleFlight()
+
+
+def _retry_after(error, attempt):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return RETRY_BASE_DELAY * 2 ** attempt
+
+
+async def _create(step, **kwargs):
+    """
+    One API request with retries on throttling and transient failures.
+    Every attempt is admitted by the RPM/TPM scheduler first. Returns (response, retries).
+    """
+    global _in_flight
+    priority = llm_scheduler.priority_for(step)
+    estimate = llm_scheduler.estimate_tokens(step, kwargs["messages"])
+    retries = 0
+    while True:
+        await llm_scheduler.scheduler.acquire(estimate, priority)
+        async with _semaphore:
+            _in_flight += 1
+            try:
+                response = await client.chat.completions.create(model=DEPLOYMENT_NAME, **kwargs)
+                llm_scheduler.scheduler.settle(estimate, getattr(response.usage, "total_tokens", None))
+                return response, retries
+            except openai.RateLimitError as e:
+                llm_scheduler.scheduler.backoff(_retry_after(e, retries))
+                if retries >= MAX_RETRIES:
+                    raise
+            except RETRYABLE_ERRORS:
+                if retries >= MAX_RETRIES:
+                    raise
+            finally:
+                _in_flight -= 1
+        retries += 1
+        await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (retries - 1))
+
+
+async def _fetch(step, started, messages, **kwargs):
+    try:
+        response, retries = await _create(step, messages=messages, **kwargs)
+    except Exception as e:
+        llm_metrics.record(step, (time.perf_counter() - started) * 1000, error=e)
+        raise
+    llm_metrics.record(step, (time.perf_counter() - started) * 1000, usage=response.usage, retries=retries)
+    return response.choices[0].message.content, response.usage
+
+
+def _cacheable(content, response_format):
+    if not content:
+        return False
+    if (response_format or {}).get("type") != "json_object":
+        return True
+    # A malformed reply would otherwise keep failing for every worker until it expires
+    try:
+        json.loads(content)
+        return True
+    except ValueError:
+        return False
+
+
+async def complete(messages, step="unknown", response_format=None, cache=False, **kwargs):
+    """
+    Run one chat completion on the shared async client and return the message content.
+    Waits for a free slot when MAX_CONCURRENCY requests are already in flight.
+    `step` tags the call in llm_metrics. Pass cache=True for lookups whose answer does
+    not depend on the session (place details, geocoding, parsing): identical in-flight
+    requests are then coalesced and the answer is cached. Generative steps leave it off.
+    """
+    started = time.perf_counter()
+    if not cache:
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        content, _ = await _fetch(step, started, messages, **kwargs)
+        return content
+
+    key = llm_cache.make_key(DEPLOYMENT_NAME, messages, response_format, **kwargs)
+    if llm_cache.CACHE_ENABLED:
+        cached = await llm_cache.cache.get(key)
+        if cached is not None:
+            llm_metrics.record(step, (time.perf_counter() - started) * 1000, cached=True)
+            return cached
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    (content, usage), shared = await flights.do(key, lambda: _fetch(step, started, messages, **kwargs))
+    if shared:
+        flights.note_saved(usage)
+        llm_metrics.record(step, (time.perf_counter() - started) * 1000, coalesced=True)
+    elif llm_cache.CACHE_ENABLED and _cacheable(content, response_format):
+        await llm_cache.cache.set(key, content)
+    return content
+
+
+async def stream(messages, step="unknown", response_format=None, **kwargs):
+    """
+    Streaming variant of complete(): yields content deltas as the model emits them.
+    The concurrency slot is held until the stream is exhausted or closed. Throttling
+    and transient failures are retried like in _create() as long as nothing has been
+    yielded yet; after the first delta a failure is raised to the caller.
+    """
+    global _in_flight
+    started = time.perf_counter()
+    usage = None
+    error = None
+    retries = 0
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    priority = llm_scheduler.priority_for(step)
+    estimate = llm_scheduler.estimate_tokens(step, messages)
+    try:
+        while True:
+            await llm_scheduler.scheduler.acquire(estimate, priority)
+            yielded = False
+            async with _semaphore:
+                _in_flight += 1
+                try:
+                    response = await client.chat.completions.create(
+                        model=DEPLOYMENT_NAME,
+                        messages=messages,
+                        stream=True,
+                        **kwargs
+                    )
+                    async for chunk in response:
+                        # Usage only arrives on the final chunk, and only on API versions that send it
+                        usage = getattr(chunk, "usage", None) or usage
+                        # Azure sends content-filter chunks without choices
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yielded = True
+                            yield chunk.choices[0].delta.content
+                    return
+                except openai.RateLimitError as e:
+                    llm_scheduler.scheduler.backoff(_retry_after(e, retries))
+                    if yielded or retries >= MAX_RETRIES:
+                        raise
+                except RETRYABLE_ERRORS:
+                    if yielded or retries >= MAX_RETRIES:
+                        raise
+                finally:
+                    _in_flight -= 1
+                    llm_scheduler.scheduler.settle(estimate, getattr(usage, "total_tokens", None))
+            retries += 1
+            await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (retries - 1))
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        llm_metrics.record(step, (time.perf_counter() - started) * 1000, usage=usage, retries=retries, error=error)
+
+
+def stats():
+    """
+    Current concurrency usage, cache, coalescing and quota scheduler counters of the gateway.
+    """
+    return {
+        "max_concurrency": MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+        "cache": llm_cache.cache.stats(),
+        "single_flight": flights.stats(),
+        "scheduler": llm_scheduler.scheduler.stats()
+    }
@@ -0,0 +1,148 @@
+# llm_metrics.py
+
+import os
+import json
+import time
+import logging
+import contextvars
+from collections import OrderedDict, defaultdict, deque
+from logging.handlers import RotatingFileHandler
+from dotenv import load_dotenv
+load_dotenv()
+
+# USD per 1K tokens for the configured deployment
+PROMPT_PRICE_PER_1K = float(os.getenv("LLM_PROMPT_PRICE_PER_1K", "0.0025"))
+COMPLETION_PRICE_PER_1K = float(os.getenv("LLM_COMPLETION_PRICE_PER_1K", "0.01"))
+LOG_PATH = os.getenv("LLM_CALL_LOG", "llm_calls.log")
+RECENT_CALLS = int(os.getenv("LLM_RECENT_CALLS", "500"))
+MAX_TRACKED_SESSIONS = int(os.getenv("LLM_MAX_TRACKED_SESSIONS", "10000"))
+
+# Set once per /chat request so every call made while serving it is attributed to the session
+current_session = contextvars.ContextVar("llm_session_id", default=None)
+
+_logger = logging.getLogger("llm_calls")
+_logger.propagate = False
+if LOG_PATH:
+    _handler = RotatingFileHandler(LOG_PATH, maxBytes=10 * 1024 * 1024, backupCount=5)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+
+
+class Aggregate:
+    __slots__ = ("calls", "cache_hits", "coalesced", "errors", "retries", "prompt_tokens",
+                 "completion_tokens", "cost_usd", "wall_ms_total", "wall_ms_max")
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.wall_ms_total = 0.0
+        self.wall_ms_max = 0.0
+
+    def add(self, entry):
+        self.calls += 1
+        self.cache_hits += 1 if entry["cached"] else 0
+        self.coalesced += 1 if entry["coalesced"] else 0
+        self.errors += 1 if entry["error"] else 0
+        self.retries += entry["retries"]
+        self.prompt_tokens += entry["prompt_tokens"]
+        self.completion_tokens += entry["completion_tokens"]
+        self.cost_usd += entry["cost_usd"]
+        self.wall_ms_total += entry["wall_ms"]
+        self.wall_ms_max = max(self.wall_ms_max, entry["wall_ms"])
+
+    def merge(self, other):
+        for field in self.__slots__:
+            if field == "wall_ms_max":
+                self.wall_ms_max = max(self.wall_ms_max, other.wall_ms_max)
+            else:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "wall_ms_total": round(self.wall_ms_total, 1),
+            "wall_ms_avg": round(self.wall_ms_total / self.calls, 1) if self.calls else 0.0,
+            "wall_ms_max": round(self.wall_ms_max, 1)
+        }
+
+
+_totals = Aggregate()
+_by_step = defaultdict(Aggregate)
+_by_session = OrderedDict()
+_recent = deque(maxlen=RECENT_CALLS)
+
+
+def cost_of(prompt_tokens, completion_tokens):
+    return prompt_tokens / 1000 * PROMPT_PRICE_PER_1K + completion_tokens / 1000 * COMPLETION_PRICE_PER_1K
+
+
+def record(step, wall_ms, usage=None, retries=0, cached=False, coalesced=False, error=None):
+    """
+    Account one gateway call. `usage` is the API usage object (or None for cache hits,
+    coalesced calls and failures).
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    session_id = current_session.get()
+    entry = {
+        "ts": time.time(),
+        "session_id": session_id,
+        "step": step,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost_usd": cost_of(prompt_tokens, completion_tokens),
+        "wall_ms": round(wall_ms, 1),
+        "retries": retries,
+        "cached": cached,
+        "coalesced": coalesced,
+        "error": str(error) if error else None
+    }
+    _totals.add(entry)
+    _by_step[step].add(entry)
+    if session_id is not None:
+        if session_id not in _by_session:
+            _by_session[session_id] = defaultdict(Aggregate)
+            while len(_by_session) > MAX_TRACKED_SESSIONS:
+                _by_session.popitem(last=False)
+        _by_session.move_to_end(session_id)
+        _by_session[session_id][step].add(entry)
+    _recent.append(entry)
+    if _logger.handlers:
+        _logger.info(json.dumps(entry))
+    return entry
+
+
+def snapshot(recent=50):
+    steps = {step: agg.to_dict() for step, agg in _by_step.items()}
+    return {
+        "totals": _totals.to_dict(),
+        # Heaviest steps first so the dominant latency shows up at the top
+        "by_step": dict(sorted(steps.items(), key=lambda item: item[1]["wall_ms_total"], reverse=True)),
+        "tracked_sessions": len(_by_session),
+        "recent": list(_recent)[-recent:] if recent else []
+    }
+
+
+def session_snapshot(session_id):
+    steps = _by_session.get(session_id)
+    if steps is None:
+        return None
+    totals = Aggregate()
+    for agg in steps.values():
+        totals.merge(agg)
+    by_step = {step: agg.to_dict() for step, agg in steps.items()}
+    return {"session_id": session_id, "totals": totals.to_dict(), "by_step": by_step}
@@ -0,0 +1,218 @@
+# llm_scheduler.py
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from dotenv import load_dotenv
+load_dotenv()
+
+# Deployment quotas; 0 leaves that dimension unlimited
+RPM_LIMIT = int(os.getenv("AZURE_OPENAI_RPM", "0"))
+TPM_LIMIT = int(os.getenv("AZURE_OPENAI_TPM", "0"))
+# Every worker process has its own buckets, so each one admits only its share of the quota.
+# WEB_CONCURRENCY is the worker count uvicorn and gunicorn read too; LLM_WORKERS overrides it.
+WORKERS = max(int(os.getenv("LLM_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"), 1)
+
+
+def worker_share(limit):
+    return max(limit // WORKERS, 1) if limit else 0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STANDARD = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_STANDARD: "standard", PRIORITY_BULK: "bulk"}
+
+# Short replies the user is actively waiting on go first, long generations last
+STEP_PRIORITIES = {
+    "travel_vibe_ack": PRIORITY_INTERACTIVE,
+    "answer_ack": PRIORITY_INTERACTIVE,
+    "movie_genre": PRIORITY_INTERACTIVE,
+    "trip_goals": PRIORITY_INTERACTIVE,
+    "destination_suggestions": PRIORITY_INTERACTIVE,
+    "destination_parse": PRIORITY_INTERACTIVE,
+    "clarify": PRIORITY_INTERACTIVE,
+    "suggestion": PRIORITY_INTERACTIVE,
+    "suggestion_refresh": PRIORITY_INTERACTIVE,
+    "intent": PRIORITY_INTERACTIVE,
+    "plan": PRIORITY_BULK,
+    "day_plan": PRIORITY_BULK,
+    "day_regenerate": PRIORITY_BULK
+}
+
+# Expected completion size per step, used until the real usage is known
+COMPLETION_ESTIMATES = {
+    "plan": 8000,
+    "day_plan": 2500,
+    "day_regenerate": 2500,
+    "skeleton": 900,
+    "suggestion": 250,
+    "reviews": 400,
+    "place_details": 400,
+    "hotel_details": 250
+}
+DEFAULT_COMPLETION_ESTIMATE = 150
+
+
+def priority_for(step):
+    return STEP_PRIORITIES.get(step, PRIORITY_STANDARD)
+
+
+def estimate_tokens(step, messages):
+    # About four characters per token for English prompts
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + COMPLETION_ESTIMATES.get(step, DEFAULT_COMPLETION_ESTIMATE)
+
+
+class TokenBucket:
+    """
+    Refills continuously at limit/60 per second. Bursts are capped at a tenth of a
+    minute's quota, which is roughly the window Azure enforces limits over.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(per_minute / 6, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount):
+        # Requests larger than a full burst only wait for a full bucket and then run into debt
+        self.refill()
+        needed = min(amount, self.capacity) - self.tokens
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Scheduler:
+    """
+    Admits LLM calls against the RPM and TPM buckets, highest priority first.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self.waits = {name: {"admitted": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0} for name in PRIORITY_NAMES.values()}
+        self.counters = {"throttled": 0, "cancelled": 0, "backoffs": 0}
+
+    def _delay_for(self, estimate):
+        delay = max(0.0, self.paused_until - time.monotonic())
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay_for(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.delay_for(estimate))
+        return delay
+
+    def _consume(self, estimate):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(estimate)
+
+    async def acquire(self, estimate, priority=PRIORITY_STANDARD):
+        enqueued = time.monotonic()
+        if not self._queue and self._delay_for(estimate) <= 0:
+            self._consume(estimate)
+            self._record_wait(priority, enqueued)
+            return
+        self.counters["throttled"] += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), estimate, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        elif self._wakeup is not None:
+            # A new head of the queue may need a different wait
+            self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        self._record_wait(priority, enqueued)
+
+    async def _dispatch(self):
+        while self._queue:
+            priority, _, estimate, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = self._delay_for(estimate)
+            if delay <= 0:
+                heapq.heappop(self._queue)
+                self._consume(estimate)
+                future.set_result(None)
+                continue
+            self._wakeup = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup = None
+
+    def settle(self, estimate, actual):
+        """
+        Correct the TPM bucket once the real token count of a call is known.
+        """
+        if self.tokens is None or actual is None:
+            return
+        if actual < estimate:
+            self.tokens.give_back(estimate - actual)
+        else:
+            self.tokens.take(actual - estimate)
+
+    def backoff(self, seconds):
+        """
+        Hold every queued call after a 429 until the service's retry-after has passed.
+        """
+        self.counters["backoffs"] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _record_wait(self, priority, enqueued):
+        wait_ms = (time.monotonic() - enqueued) * 1000
+        waits = self.waits[PRIORITY_NAMES.get(priority, "standard")]
+        waits["admitted"] += 1
+        waits["wait_ms_total"] += wait_ms
+        waits["wait_ms_max"] = max(waits["wait_ms_max"], wait_ms)
+
+    def stats(self):
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                depth[PRIORITY_NAMES.get(priority, "standard")] += 1
+        waits = {}
+        for name, w in self.waits.items():
+            waits[name] = {
+                "admitted": w["admitted"],
+                "wait_ms_avg": round(w["wait_ms_total"] / w["admitted"], 1) if w["admitted"] else 0.0,
+                "wait_ms_max": round(w["wait_ms_max"], 1)
+            }
+        return {
+            "rpm_limit": self.rpm or None,
+            "tpm_limit": self.tpm or None,
+            "workers": WORKERS,
+            "queue_depth": depth,
+            "waits": waits,
+            "paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            **self.counters
+        }
+
+
+scheduler = Scheduler(worker_share(RPM_LIMIT), worker_share(TPM_LIMIT))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the /chat API.
+
+Drives many simulated users through the full conversation: greeting, Plan a Trip,
+vibe, scenes, goals, accommodation, destination, itinerary generation and a few
+edits. Writes per-step latency percentiles, throughput and error rates as JSON.
+Pair it with stub_llm_server.py and COSMOS_STUB=true for repeatable numbers:
+
+    python load_test.py --sessions 2000 --concurrency 200 --output load_report.json
+"""
+
+import sys
+import math
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+import httpx
+
+VIBES = ["Bro-cation", "Queens on Tour", "Love Escape", "Work & Wander", "Bonding Break", "Freedom Trip"]
+SCENES = ["🏖️ Beach", "🏔️ Mountains", "🏙️ City Life", "🌲 Nature & Forests", "🏜️ Desert", "❄️ Snow & Ski", "🏛️ Historical Sites"]
+GOALS = ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎶 Music & Festivals", "🏙️ City Tours", "🍸 Nightlife & Bars", "🚶 Walking Tours", "🖼️ Art Galleries"]
+STAYS = ["🏨 Luxury Hotel", "🏡 Homestay", "🛖 Eco Lodge", "🏥️ Camping", "🛌️ Budget Stay", "🏰 Unique Stays (castles, treehouses, etc.)"]
+ROUTES = [("Bengaluru", "Hawaii"), ("Mumbai", "Dubai"), ("Chennai", "Singapore"), ("Delhi", "London"), ("New York", "Paris"), ("Seattle", "Tokyo")]
+EDITS = ["replace the dinner on day 2", "suggest a different breakfast place", "I want a different hotel", "replace the lunch on day 1"]
+# Short direct commands go through intent parsing and edit the plan in one turn
+COMMANDS = ["add a museum", "regenerate day 2", "remove {place}", "replace {place} with a museum"]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.sessions = Counter()
+
+    def ok(self, step, ms):
+        self.latencies[step].append(ms)
+
+    def fail(self, step, ms, reason):
+        self.latencies[step].append(ms)
+        self.errors[step][reason] += 1
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile on an already sorted list
+    if not values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return round(values[rank - 1], 1)
+
+
+def plan_places(result):
+    # Two-word names keep "remove <name>" short enough to be read as a command
+    return [a["name"] for city in result.get("cities", []) for day in city.get("recommendations", [])
+            for a in day.get("activities", []) if not a.get("action") and len(a.get("name", "").split()) <= 2]
+
+
+class SimulatedUser:
+    def __init__(self, client, recorder, rng, args):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.session_id = f"load-{uuid.uuid4().hex[:12]}"
+
+    async def think(self):
+        if self.args.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+
+    async def send(self, step, answer, expect=None):
+        await self.think()
+        started = time.perf_counter()
+        try:
+            response = await self.client.post("/chat", json={"session_id": self.session_id, "answer": answer})
+            ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise StepFailed(f"HTTP {response.status_code}")
+            body = response.json()
+            if body.get("error"):
+                raise StepFailed(body["error"])
+            if expect and expect not in body:
+                raise StepFailed(f"missing {expect}")
+        except StepFailed as e:
+            self.recorder.fail(step, (time.perf_counter() - started) * 1000, str(e))
+            raise
+        except Exception as e:
+            self.recorder.fail(step, (time.perf_counter() - started) * 1000, type(e).__name__)
+            raise StepFailed(type(e).__name__)
+        self.recorder.ok(step, ms)
+        return body
+
+    async def send_stream(self, step, answer):
+        await self.think()
+        started = time.perf_counter()
+        first_event = None
+        event = None
+        try:
+            async with self.client.stream("POST", "/chat/stream", json={"session_id": self.session_id, "answer": answer}) as response:
+                if response.status_code != 200:
+                    raise StepFailed(f"HTTP {response.status_code}")
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                        if first_event is None:
+                            first_event = (time.perf_counter() - started) * 1000
+                    if event == "error" and line.startswith("data:"):
+                        raise StepFailed("stream error event")
+        except StepFailed as e:
+            self.recorder.fail(step, (time.perf_counter() - started) * 1000, str(e))
+            raise
+        except Exception as e:
+            self.recorder.fail(step, (time.perf_counter() - started) * 1000, type(e).__name__)
+            raise StepFailed(type(e).__name__)
+        if event != "done":
+            self.recorder.fail(step, (time.perf_counter() - started) * 1000, f"ended on {event}")
+            raise StepFailed(f"ended on {event}")
+        self.recorder.ok(step, (time.perf_counter() - started) * 1000)
+        self.recorder.ok(f"{step}_first_event", first_event)
+
+    async def run(self):
+        rng = self.rng
+        await self.send("greeting", "", expect="options")
+        await self.send("plan_a_trip", "Plan a Trip", expect="options")
+        await self.send("travel_vibe", rng.choice(VIBES), expect="options")
+        for scene in rng.sample(SCENES, rng.randint(1, 3)):
+            await self.send("scene_pick", scene, expect="options")
+        await self.send("scene_continue", "Continue", expect="options")
+        for goal in rng.sample(GOALS, rng.randint(1, 3)):
+            await self.send("goal_pick", goal, expect="options")
+        await self.send("goal_continue", "Continue", expect="options")
+        await self.send("accommodation", rng.choice(STAYS), expect="next_question")
+
+        origin, destination = rng.choice(ROUTES)
+        if rng.random() < self.args.suggest_share:
+            body = await self.send("destination_suggest", "Pick for me", expect="options")
+            await self.send("destination_pick", rng.choice(body["options"] or [destination]), expect="next_question")
+            await self.send("origin", origin, expect="options")
+        else:
+            await self.send("destination", f"{origin} to {destination} for {rng.randint(2, 5)} days", expect="options")
+
+        plan_names = []
+        if self.args.stream:
+            await self.send_stream("generate", "Generate your personalized itinerary")
+        else:
+            body = await self.send("generate", "Generate your personalized itinerary", expect="result")
+            plan_names = plan_places(body["result"])
+
+        for _ in range(rng.randint(0, self.args.edits)):
+            await self.send("edit_more_changes", "I Need more changes", expect="next_question")
+            if rng.random() < self.args.command_share:
+                command = rng.choice([c for c in COMMANDS if "{place}" not in c or plan_names])
+                body = await self.send("edit_command", command.format(place=rng.choice(plan_names) if plan_names else ""), expect="result")
+                plan_names = plan_places(body["result"])
+                continue
+            body = await self.send("edit_request", rng.choice(EDITS), expect="next_question")
+            places = [o for o in body.get("options", []) if o not in ("Keep current plan", "Ask for different suggestions")]
+            if places:
+                body = await self.send("edit_select", places[0])
+                if body.get("options") and "result" not in body:
+                    # Where the chosen place goes ("Replace ... on Day 2")
+                    body = await self.send("edit_place", body["options"][0])
+                if "result" in body:
+                    plan_names = plan_places(body["result"])
+
+
+async def run_user(client, recorder, rng, args, gate):
+    async with gate:
+        user = SimulatedUser(client, recorder, random.Random(rng.random()), args)
+        recorder.sessions["started"] += 1
+        try:
+            await user.run()
+            recorder.sessions["completed"] += 1
+        except StepFailed:
+            recorder.sessions["failed"] += 1
+
+
+async def main(args):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    gate = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = []
+        for i in range(args.sessions):
+            tasks.append(asyncio.ensure_future(run_user(client, recorder, rng, args, gate)))
+            if args.ramp and i < args.concurrency:
+                # Spread the first wave over the ramp so the server is not hit by a single burst
+                await asyncio.sleep(args.ramp / args.concurrency)
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started
+
+        server = None
+        try:
+            server = (await client.get("/admin/llm-stats")).json()
+        except Exception as e:
+            print("Could not fetch server stats:", e, file=sys.stderr)
+
+    steps = {}
+    total_requests = 0
+    total_errors = 0
+    for step, values in recorder.latencies.items():
+        values.sort()
+        errors = sum(recorder.errors[step].values())
+        if not step.endswith("_first_event"):
+            total_requests += len(values)
+            total_errors += errors
+        steps[step] = {
+            "count": len(values),
+            "errors": errors,
+            "error_rate": round(errors / len(values), 4) if values else 0.0,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": round(values[-1], 1) if values else None,
+            "mean_ms": round(sum(values) / len(values), 1) if values else None,
+            "error_reasons": dict(recorder.errors[step])
+        }
+
+    return {
+        "config": vars(args),
+        "duration_s": round(duration, 2),
+        "sessions": {"started": recorder.sessions["started"], "completed": recorder.sessions["completed"], "failed": recorder.sessions["failed"]},
+        "throughput": {
+            "requests_per_s": round(total_requests / duration, 2) if duration else 0.0,
+            "sessions_per_s": round(recorder.sessions["completed"] / duration, 3) if duration else 0.0
+        },
+        "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+        "steps": steps,
+        "server": server
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the /chat API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--sessions", type=int, default=1000, help="total simulated users")
+    parser.add_argument("--concurrency", type=int, default=100, help="users active at the same time")
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which the first wave starts")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between turns in seconds")
+    parser.add_argument("--edits", type=int, default=2, help="maximum edit rounds per user after generation")
+    parser.add_argument("--command-share", type=float, default=0.3, help="share of edits sent as direct remove/regenerate commands")
+    parser.add_argument("--suggest-share", type=float, default=0.2, help="share of users asking for destination ideas")
+    parser.add_argument("--stream", action="store_true", help="generate through /chat/stream")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="-", help="report path, '-' for stdout")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = json.dumps(asyncio.run(main(args)), indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"Report written to {args.output}")
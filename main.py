@@ -1,19 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from openai import AzureOpenAI
-import os, json, time, uuid, re
+import os, json, time, uuid, re, asyncio, hashlib, hmac
 from dotenv import load_dotenv
-import cosmos_helper
+import cosmos_async
+import write_behind
+import llm_gateway
+import llm_metrics
+import json_stream
+import itinerary_engine
+import itinerary_digest
+import itinerary_model
+import speculation
+import response_bank
+import travel_estimator
+import gazetteer
+import place_kb
+import spatial_index
+import session_store
+import session_rehydrate
 
 load_dotenv()
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-)
+# "parallel" plans a skeleton first and then every day concurrently, "single" uses one plan_prompt
+ITINERARY_ENGINE = os.getenv("ITINERARY_ENGINE", "parallel")
+# Per-session usage lists session IDs, which are all it takes to resume a session; unset disables it
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
-deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -23,7 +36,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-user_sessions = {}
+user_sessions = session_store.sessions
+GENERATE_CHOICES = ["1", "generate persona", "generate persona & recommendations", "persona", "generate an itinerary", "itinerary", "generate your personalized itinerary"]
+FOLLOWUP_OPTIONS = ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]
+
 class UserInput(BaseModel):
     session_id: str
     answer: str
@@ -46,959 +62,235 @@ def extract_days(answer: str) -> int:
         return int(match.group(1))
     return 3
 
-@app.post("/chat")
-async def chat(user_input: UserInput):
-    session_id = user_input.session_id
-    answer = (user_input.answer or "").strip()
+DEFAULT_TRIP_GOALS = ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎢 Theme Parks", "🧘 Wellness & Spa", "🚴 Adventure Sports", "📸 Photography", "🎶 Music & Festivals"]
 
-    # Step 1: Greeting
-    if session_id not in user_sessions:
-        user_sessions[session_id] = {
-            "mode": None,
-            "ready": False,
-            "history": [],
-            "asked_another": False,
-            "result": None,
-            "step": "initial",
-            "travel_vibe": None,
-            "destination_choice": None,
-            "origin": None,
-            "destination": None,
-            "scene_preferences": [],
-            "trip_goals": [],
-            "suggested_destinations": [],
-            "movie_description": None,
-            "accommodation_type": None,
-            "waiting_for_answer": False,
-            "pending_suggestion": None
-        }
-        greeting = (
-            "Hey there! Ready to plan your next adventure?\n"
-            "I'm your travel buddy, here to help you find the perfect trip. Just a few quick questions and we'll get you moving!"
-        )
-        return {
-            "next_question": greeting,
-            "options": ["Explore Destinations", "Plan a Trip", "Travel Deals", "Track my bookings", "Report an Issue"]
-        }
+async def timed(label, coro, latency):
+    # Record the wall time of one awaited step in milliseconds
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        latency[label] = round((time.perf_counter() - started) * 1000, 1)
 
-    session = user_sessions[session_id]
-    session["history"].append(answer)
-    
-    # Handle end chat options first
-    if session.get("result") and answer.lower() in ["looks good, proceed to booking", "save and arrange a call back"]:
-        session["show_followup"] = False
-        return {"done": True, "message": "Thank you for using Easy Trip! Your itinerary is ready.", "result": session["result"]}
-    
-    # Handle "I Need more changes" option
-    if session.get("result") and answer.lower() == "i need more changes":
-        session["show_followup"] = False
-        return {"next_question": "What would you like to change in your itinerary?"}
-    
-    # Check if we need to show follow-up question after result display
-    if session.get("show_followup"):
-        session["show_followup"] = False
-        return {"next_question": "Ready to take off or still tweaking the route?", "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-    
-    # Check if this is an update request for existing plan
-    if session.get("result") and answer.lower() not in ["i need more changes", "looks good, proceed to booking", "save and arrange a call back"]:
-        # User has a plan and is making an update request - handle it directly
-        current_result = session["result"]
-        cities = current_result.get("cities", [])
-        if not cities or "recommendations" not in cities[0]:
-            return {"next_question": "No recommendations found in your current plan to update."}
-        recommendations = cities[0]["recommendations"]
-        destination = cities[0].get("city_name", "Unknown")
-        
-        # Handle clarification responses for pending additions FIRST
-        if session.get("pending_addition"):
-            pending_add = session["pending_addition"]
-            selected_place = pending_add["selected_place"]
-            item_type = pending_add["item_type"]
-            
-            if "Replace" in answer:
-                # Extract the place name from the answer (e.g., "Replace Island Style (Lunch on Day 2)" or "Replace Waikiki Beach on Day 1")
-                import re
-                match = re.search(r'Replace (.+?)(?:\s*\(|\s*on|$)', answer)
-                target_place = match.group(1) if match else ""
-                
-                # Handle hotel replacement differently
-                if item_type == "hotel":
-                    # Get hotel details for the selected place
-                    hotel_detail_prompt = f"""
-Find complete hotel details for {selected_place} in {destination}:
-Return JSON: {{"name": "Official hotel name", "address": "Complete hotel address", "latitude": 0.0, "longitude": 0.0, "check_in": "03:00 PM", "check_out": "11:00 AM", "why_recommended": "Specific reasons why this hotel is recommended"}}
-"""
-                    
-                    try:
-                        hotel_detail_resp = client.chat.completions.create(
-                            model=deployment_name,
-                            messages=[{"role": "system", "content": "Provide real hotel information."}, {"role": "user", "content": hotel_detail_prompt}],
-                            response_format={"type": "json_object"}
-                        )
-                        hotel_detail_json = json.loads(hotel_detail_resp.choices[0].message.content)
-                    except:
-                        hotel_detail_json = {
-                            "name": selected_place, 
-                            "address": f"{selected_place} Address", 
-                            "latitude": 0.0, 
-                            "longitude": 0.0,
-                            "check_in": "03:00 PM",
-                            "check_out": "11:00 AM",
-                            "why_recommended": f"{selected_place} offers excellent accommodation."
-                        }
-                    
-                    # Replace hotel in the cities array
-                    if "cities" in current_result and current_result["cities"]:
-                        new_hotel_name = hotel_detail_json.get("name", selected_place)
-                        new_hotel_address = hotel_detail_json.get("address", f"{selected_place} Address")
-                        new_hotel_lat = hotel_detail_json.get("latitude", 0.0)
-                        new_hotel_lon = hotel_detail_json.get("longitude", 0.0)
-                        
-                        # Get old hotel name BEFORE replacing it
-                        old_hotel_name = current_result["cities"][0].get("hotel", {}).get("name", "")
-                        
-                        current_result["cities"][0]["hotel"] = {
-                            "name": new_hotel_name,
-                            "address": new_hotel_address,
-                            "latitude": new_hotel_lat,
-                            "longitude": new_hotel_lon,
-                            "check_in": hotel_detail_json.get("check_in", "03:00 PM"),
-                            "check_out": hotel_detail_json.get("check_out", "11:00 AM"),
-                            "why_recommended": hotel_detail_json.get("why_recommended", f"{selected_place} offers excellent accommodation.")
-                        }
-                        
-                        # Update all hotel-related activities throughout the itinerary
-                        
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                action = activity.get("action", "")
-                                name = activity.get("name", "")
-                                
-                                # Update Hotel Check-in activities
-                                if action == "Hotel Check-in":
-                                    activity["name"] = new_hotel_name
-                                    activity["address"] = new_hotel_address
-                                    activity["latitude"] = new_hotel_lat
-                                    activity["longitude"] = new_hotel_lon
-                                
-                                # Update Hotel Check-out activities
-                                elif action == "Hotel Check-out":
-                                    activity["name"] = new_hotel_name
-                                    activity["address"] = new_hotel_address
-                                    activity["latitude"] = new_hotel_lat
-                                    activity["longitude"] = new_hotel_lon
-                                
-                                # Update Return to Hotel activities
-                                elif action == "Return to Hotel":
-                                    activity["name"] = new_hotel_name
-                                    activity["address"] = new_hotel_address
-                                    activity["latitude"] = new_hotel_lat
-                                    activity["longitude"] = new_hotel_lon
-                                
-                                # Update Transfer activities
-                                elif action == "Transfer":
-                                    if "to" in name.lower() and (old_hotel_name.lower() in name.lower() or "hotel" in name.lower()):
-                                        # Transfer to hotel
-                                        activity["name"] = f"Transfer from {activity['name'].split(' to ')[0].replace('Transfer from ', '')} to {new_hotel_name}"
-                                        activity["address"] = new_hotel_address
-                                        activity["latitude"] = new_hotel_lat
-                                        activity["longitude"] = new_hotel_lon
-                                    elif "from" in name.lower() and (old_hotel_name.lower() in name.lower() or "hotel" in name.lower()):
-                                        # Transfer from hotel
-                                        destination_part = activity['name'].split(' to ')[1] if ' to ' in activity['name'] else "Airport"
-                                        activity["name"] = f"Transfer from {new_hotel_name} to {destination_part}"
-                                
-                                # Update any activity that references the old hotel name
-                                elif old_hotel_name and old_hotel_name.lower() in name.lower():
-                                    activity["name"] = name.replace(old_hotel_name, new_hotel_name)
-                                    if "address" in activity and old_hotel_name.lower() in activity["address"].lower():
-                                        activity["address"] = new_hotel_address
-                                        activity["latitude"] = new_hotel_lat
-                                        activity["longitude"] = new_hotel_lon
-                    
-                    session["pending_addition"] = None
-                    session["result"] = current_result
-                    try:
-                        cosmos_helper.save_result(current_result)
-                    except Exception as e:
-                        print("Cosmos DB save error:", e)
-                    return {"done": True, "feedback": [f"Perfect! Hotel changed to {selected_place}!"], "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-                
-                else:
-                    # Handle activity/meal replacement
-                    # Get comprehensive details for the selected place
-                    detail_prompt = f"""
-Find complete details for {selected_place} in {destination}:
-Return JSON: {{"name": "Official name", "address": "Complete address", "latitude": 0.0, "longitude": 0.0, "highlights": "Detailed description", "why_recommended": "Specific reasons", "carry": "Practical items", "rating": 4.5, "reviews": {{"Review 1": "text", "Review 2": "text"}}}}
-"""
-                    
-                    try:
-                        detail_resp = client.chat.completions.create(
-                            model=deployment_name,
-                            messages=[{"role": "system", "content": "Provide real travel information."}, {"role": "user", "content": detail_prompt}],
-                            response_format={"type": "json_object"}
-                        )
-                        detail_json = json.loads(detail_resp.choices[0].message.content)
-                    except:
-                        detail_json = {"name": selected_place, "highlights": f"{selected_place} offers great experience.", "why_recommended": f"{selected_place} is highly recommended."}
-                    
-                    # Find and replace the specific place mentioned in the answer
-                    for day in recommendations:
-                        for activity in day["activities"]:
-                            if target_place and target_place.lower() in activity.get("name", "").lower():
-                                # Preserve exact JSON structure
-                                activity["name"] = detail_json.get("name", selected_place)
-                                activity["address"] = detail_json.get("address", activity.get("address", "Address not available"))
-                                activity["latitude"] = detail_json.get("latitude", activity.get("latitude", 0.0))
-                                activity["longitude"] = detail_json.get("longitude", activity.get("longitude", 0.0))
-                                if "highlights" in activity:
-                                    activity["highlights"] = detail_json.get("highlights", activity["highlights"])
-                                if "why_recommended" in activity:
-                                    activity["why_recommended"] = detail_json.get("why_recommended", activity["why_recommended"])
-                                if "carry" in activity:
-                                    activity["carry"] = detail_json.get("carry", activity["carry"])
-                                if "rating" in activity:
-                                    activity["rating"] = detail_json.get("rating", activity["rating"])
-                                if "reviews" in activity:
-                                    activity["reviews"] = detail_json.get("reviews", activity["reviews"])
-                                break
-                    
-                    session["pending_addition"] = None
-                    session["result"] = current_result
-                    try:
-                        cosmos_helper.save_result(current_result)
-                    except Exception as e:
-                        print("Cosmos DB save error:", e)
-                    return {"done": True, "feedback": [f"Perfect! Replaced with {selected_place}!"], "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-        
-        # Check if user wants suggestions
-        suggestion_keywords = ["suggest", "recommend", "alternative", "instead", "different", "other", "replace", "change", "don't want", "not interested", "skip", "avoid", "hate", "dislike", "add some", "add other", "add another"]
-        wants_suggestions = any(keyword in answer.lower() for keyword in suggestion_keywords) or "?" in answer or len(answer.split()) > 3
-        
-        if wants_suggestions and not session.get("pending_suggestion"):
-            suggestion_prompt = f"""
-User request: "{answer}"
-Destination: {destination}
-Current itinerary: {json.dumps(recommendations, indent=2)}
+def default_reviews(name):
+    return {
+        "Review 1": f"Had an amazing time at {name}! The experience exceeded my expectations.",
+        "Review 2": "Definitely worth visiting. Great atmosphere and friendly staff.",
+        "Review 3": "Perfect spot for travelers. Loved every moment here!",
+        "Review 4": "Highly recommend this place. Great value and service.",
+        "Review 5": "One of the highlights of my trip. Will definitely come back!"
+    }
 
-Analyze the user's request:
-1. If they mention a SPECIFIC place from the itinerary to replace (like "replace Hau Tree Lanai" or "instead of Eggs 'n Things"), put that exact place name in current_item
-2. If they make a GENERAL request (like "add mexican restaurant", "add some activity", "suggest breakfast place"), leave current_item as empty string
-3. IMPORTANT: Determine if this is food-related, activity-related, or hotel-related:
-   - FOOD keywords: restaurant, food, eat, dining, meal, breakfast, lunch, dinner, cuisine, vegetarian, vegan, cafe, bar, snack
-   - ACTIVITY keywords: activity, attraction, sightseeing, tour, museum, beach, park, shopping, adventure
-   - HOTEL keywords: hotel, accommodation, stay, resort, lodge, inn, different hotel, another hotel, other hotel, new hotel
-4. For FOOD requests: item_type should be "breakfast", "lunch", or "dinner" (choose the most appropriate meal time)
-5. For ACTIVITY requests: item_type should be "activity"
-6. For HOTEL requests: item_type MUST be "hotel" (if user mentions hotel, accommodation, stay, resort, etc.)
-7. Provide 5 real place suggestions
+async def save_result(result_json):
+    session_rehydrate.forget_miss(result_json.get("session_id"))
+    # Every saved plan also feeds the place knowledge base; its SQLite write may wait on another worker's lock
+    if place_kb.KB_ENABLED:
+        try:
+            await asyncio.to_thread(place_kb.kb.ingest, result_json)
+        except Exception as e:
+            print("Place KB ingest error:", e)
+    if spatial_index.INDEX_ENABLED:
+        spatial_index.index.add_result(result_json)
+    # Written in the background; edits in quick succession collapse into one upsert
+    if write_behind.WRITE_BEHIND_ENABLED:
+        write_behind.queue.save(result_json)
+        return
+    return await cosmos_async.save_result(result_json)
 
-Return JSON: {{"understood_request": "what user wants", "current_item": "exact place name from itinerary OR empty string", "item_type": "breakfast/lunch/dinner/activity/hotel", "suggestions": ["Place1", "Place2", "Place3", "Place4", "Place5"], "reasoning": "why these fit"}}
-"""
-            
-            try:
-                suggestion_resp = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=[
-                        {"role": "system", "content": "You are an intelligent travel assistant. Provide real place names."},
-                        {"role": "user", "content": suggestion_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                suggestion_json = json.loads(suggestion_resp.choices[0].message.content)
-                
-                session["pending_suggestion"] = suggestion_json
-                understood = suggestion_json.get("understood_request", "your request")
-                suggestions = suggestion_json.get("suggestions", [])
-                
-                return {
-                    "next_question": f"{understood}. Here are some great alternatives:",
-                    "options": suggestions + ["Keep current plan"]
-                }
-            except:
-                return {"next_question": "Could you tell me more specifically what you'd like to change?"}
-        
-        # Handle selection from suggestions
-        if session.get("pending_suggestion"):
-            pending = session["pending_suggestion"]
-            if answer == "Keep current plan":
-                session["pending_suggestion"] = None
-                return {"next_question": "Your plan remains unchanged. Anything else?", "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-            elif answer in pending.get("suggestions", []):
-                selected_place = answer
-                current_item = pending.get("current_item", "")
-                item_type = pending.get("item_type", "")
-                
-                print(f"DEBUG: current_item='{current_item}', item_type='{item_type}', selected_place='{selected_place}'")
-                
-                # Check if we have a specific item to replace
-                if current_item and current_item.strip():
-                    # Direct replacement - we know what to replace
-                    detail_prompt = f"""
-Find complete details for {selected_place} in {destination}:
+async def fetch_place_details(place_name, destination):
+    known = place_kb.kb.details(place_name, destination, required=("address", "highlights")) if place_kb.KB_ENABLED else None
+    if known:
+        # The knowledge base does not keep reasons written for another traveler
+        known["why_recommended"] = await generate_why_recommended(known["name"])
+        return known
+    detail_prompt = f"""
+Find complete details for {place_name} in {destination}:
 Return JSON: {{"name": "Official name", "address": "Complete address", "latitude": 0.0, "longitude": 0.0, "highlights": "Detailed description", "why_recommended": "Specific reasons", "carry": "Practical items", "rating": 4.5, "reviews": {{"Review 1": "text", "Review 2": "text"}}}}
 """
-                    
-                    try:
-                        detail_resp = client.chat.completions.create(
-                            model=deployment_name,
-                            messages=[{"role": "system", "content": "Provide real travel information."}, {"role": "user", "content": detail_prompt}],
-                            response_format={"type": "json_object"}
-                        )
-                        detail_json = json.loads(detail_resp.choices[0].message.content)
-                        
-                        # Update activity preserving exact JSON structure
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if current_item.lower() in activity.get("name", "").lower():
-                                    activity["name"] = detail_json.get("name", selected_place)
-                                    activity["address"] = detail_json.get("address", activity.get("address", "Address not available"))
-                                    activity["latitude"] = detail_json.get("latitude", activity.get("latitude", 0.0))
-                                    activity["longitude"] = detail_json.get("longitude", activity.get("longitude", 0.0))
-                                    if "highlights" in activity:
-                                        activity["highlights"] = detail_json.get("highlights", activity["highlights"])
-                                    if "why_recommended" in activity:
-                                        activity["why_recommended"] = detail_json.get("why_recommended", activity["why_recommended"])
-                                    if "carry" in activity:
-                                        activity["carry"] = detail_json.get("carry", activity["carry"])
-                                    if "rating" in activity:
-                                        activity["rating"] = detail_json.get("rating", activity["rating"])
-                                    if "reviews" in activity:
-                                        activity["reviews"] = detail_json.get("reviews", activity["reviews"])
-                                    break
-                    except:
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if current_item.lower() in activity.get("name", "").lower():
-                                    activity["name"] = selected_place
-                                    break
-                    
-                    session["pending_suggestion"] = None
-                    session["result"] = current_result
-                    try:
-                        cosmos_helper.save_result(current_result)
-                    except Exception as e:
-                        print("Cosmos DB save error:", e)
-                    return {"done": True, "feedback": [f"Updated with {selected_place}!"], "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-                
-                else:
-                    # No specific item to replace - need clarification
-                    session["pending_addition"] = {
-                        "selected_place": selected_place,
-                        "item_type": item_type
-                    }
-                    session["pending_suggestion"] = None
-                    
-                    # Generate comprehensive clarifying options - HOTEL FIRST
-                    if item_type == "hotel":
-                        # For hotels, directly replace without asking for clarification
-                        hotel_detail_prompt = f"""
-Find complete hotel details for {selected_place} in {destination}:
+    detail_resp = await llm_gateway.complete(
+        step="place_details",
+        messages=[{"role": "system", "content": "Provide real travel information."}, {"role": "user", "content": detail_prompt}],
+        response_format={"type": "json_object"},
+        cache=True
+    )
+    return json.loads(detail_resp)
+
+async def fetch_hotel_details(hotel_name, destination):
+    known = place_kb.kb.details(hotel_name, destination, category="hotel", required=("address", "check_in")) if place_kb.KB_ENABLED else None
+    if known:
+        known["why_recommended"] = await generate_why_recommended(known["name"])
+        return known
+    hotel_detail_prompt = f"""
+Find complete hotel details for {hotel_name} in {destination}:
 Return JSON: {{"name": "Official hotel name", "address": "Complete hotel address", "latitude": 0.0, "longitude": 0.0, "check_in": "03:00 PM", "check_out": "11:00 AM", "why_recommended": "Specific reasons why this hotel is recommended"}}
 """
-                        
-                        try:
-                            hotel_detail_resp = client.chat.completions.create(
-                                model=deployment_name,
-                                messages=[{"role": "system", "content": "Provide real hotel information."}, {"role": "user", "content": hotel_detail_prompt}],
-                                response_format={"type": "json_object"}
-                            )
-                            hotel_detail_json = json.loads(hotel_detail_resp.choices[0].message.content)
-                        except:
-                            hotel_detail_json = {
-                                "name": selected_place, 
-                                "address": f"{selected_place} Address", 
-                                "latitude": 0.0, 
-                                "longitude": 0.0,
-                                "check_in": "03:00 PM",
-                                "check_out": "11:00 AM",
-                                "why_recommended": f"{selected_place} offers excellent accommodation."
-                            }
-                        
-                        # Replace hotel in the cities array
-                        if "cities" in current_result and current_result["cities"]:
-                            # Get old hotel name BEFORE replacing it
-                            old_hotel_name = current_result["cities"][0].get("hotel", {}).get("name", "")
-                            
-                            new_hotel_name = hotel_detail_json.get("name", selected_place)
-                            new_hotel_address = hotel_detail_json.get("address", f"{selected_place} Address")
-                            new_hotel_lat = hotel_detail_json.get("latitude", 0.0)
-                            new_hotel_lon = hotel_detail_json.get("longitude", 0.0)
-                            
-                            current_result["cities"][0]["hotel"] = {
-                                "name": new_hotel_name,
-                                "address": new_hotel_address,
-                                "latitude": new_hotel_lat,
-                                "longitude": new_hotel_lon,
-                                "check_in": hotel_detail_json.get("check_in", "03:00 PM"),
-                                "check_out": hotel_detail_json.get("check_out", "11:00 AM"),
-                                "why_recommended": hotel_detail_json.get("why_recommended", f"{selected_place} offers excellent accommodation.")
-                            }
-                            
-                            # Update all hotel-related activities throughout the itinerary
-                            for day in recommendations:
-                                for activity in day["activities"]:
-                                    action = activity.get("action", "")
-                                    name = activity.get("name", "")
-                                    
-                                    # Update Hotel Check-in activities
-                                    if action == "Hotel Check-in":
-                                        activity["name"] = new_hotel_name
-                                        activity["address"] = new_hotel_address
-                                        activity["latitude"] = new_hotel_lat
-                                        activity["longitude"] = new_hotel_lon
-                                    
-                                    # Update Hotel Check-out activities
-                                    elif action == "Hotel Check-out":
-                                        activity["name"] = new_hotel_name
-                                        activity["address"] = new_hotel_address
-                                        activity["latitude"] = new_hotel_lat
-                                        activity["longitude"] = new_hotel_lon
-                                    
-                                    # Update Return to Hotel activities
-                                    elif action == "Return to Hotel":
-                                        activity["name"] = new_hotel_name
-                                        activity["address"] = new_hotel_address
-                                        activity["latitude"] = new_hotel_lat
-                                        activity["longitude"] = new_hotel_lon
-                                    
-                                    # Update Transfer activities
-                                    elif action == "Transfer":
-                                        if "to" in name.lower() and (old_hotel_name.lower() in name.lower() or "hotel" in name.lower()):
-                                            # Transfer to hotel
-                                            from_part = name.split(" to ")[0].replace("Transfer from ", "")
-                                            activity["name"] = f"Transfer from {from_part} to {new_hotel_name}"
-                                            activity["address"] = f"{activity.get('address', '').split(' → ')[0]} → {new_hotel_address}" if " → " in activity.get('address', '') else new_hotel_address
-                                            activity["latitude"] = new_hotel_lat
-                                            activity["longitude"] = new_hotel_lon
-                                        elif "from" in name.lower() and (old_hotel_name.lower() in name.lower() or "hotel" in name.lower()):
-                                            # Transfer from hotel
-                                            to_part = name.split(" to ")[1] if " to " in name else "Airport"
-                                            activity["name"] = f"Transfer from {new_hotel_name} to {to_part}"
-                                            activity["address"] = f"{new_hotel_address} → {activity.get('address', '').split(' → ')[1]}" if " → " in activity.get('address', '') else f"{new_hotel_address} → {to_part}"
-                                    
-                                    # Update any activity that references the old hotel name
-                                    elif old_hotel_name and old_hotel_name.lower() in name.lower():
-                                        activity["name"] = name.replace(old_hotel_name, new_hotel_name)
-                                        if "address" in activity and old_hotel_name.lower() in activity["address"].lower():
-                                            activity["address"] = new_hotel_address
-                                            activity["latitude"] = new_hotel_lat
-                                            activity["longitude"] = new_hotel_lon
-                        
-                        session["pending_addition"] = None
-                        session["result"] = current_result
-                        try:
-                            cosmos_helper.save_result(current_result)
-                        except Exception as e:
-                            print("Cosmos DB save error:", e)
-                        return {"done": True, "feedback": [f"Perfect! Hotel changed to {selected_place}!"], "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-                    elif item_type in ["breakfast", "lunch", "dinner"]:
-                        # Show all meal options across all days
-                        meal_options = []
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if activity.get("meal"):
-                                    meal_options.append(f"Replace {activity['name']} ({activity['meal']} on {day['day']})")
-                        
-                        return {
-                            "next_question": f"Where would you like to add {selected_place}?",
-                            "options": meal_options
-                        }
-                    
-                    else:
-                        # For activities, show all non-meal activities
-                        activity_options = []
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if not activity.get("meal") and activity.get("action") not in ["Arrival", "Transfer", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"]:
-                                    activity_options.append(f"Replace {activity['name']} on {day['day']}")
-                        
-                        return {
-                            "next_question": f"Which activity would you like to replace with {selected_place}?",
-                            "options": activity_options
-                        }
-        
+    hotel_detail_resp = await llm_gateway.complete(
+        step="hotel_details",
+        messages=[{"role": "system", "content": "Provide real hotel information."}, {"role": "user", "content": hotel_detail_prompt}],
+        response_format={"type": "json_object"},
+        cache=True
+    )
+    return json.loads(hotel_detail_resp)
 
-        
-        return {"next_question": "Could you rephrase what you'd like to change?"}
+def recompute_travel(result_json):
+    """
+    Refresh distance and travel time of every activity from coordinates after an edit.
+    """
+    for city in result_json.get("cities", []):
+        travel_estimator.recompute(city.get("recommendations", []), hotel=city.get("hotel"), city=city.get("city_name"))
 
-    # Step 2: Handle option selection
-    if session["mode"] is None:
-        if "plan a trip" in answer.lower():
-            session["mode"] = "plan_trip"
-            session["step"] = "travel_vibe"
-            return {
-                "next_question": "First things first, What's your travel vibe? Solo or traveling with company?",
-                "options": ["Bro-cation", "Queens on Tour", "Love Escape", "Work & Wander", "Bonding Break", "Freedom Trip"]
-            }
-        elif "explore destinations" in answer.lower():
-            session["mode"] = "destinations"
-            return {"next_question": "Sure! Tell me which destinations you're interested in and I can share details."}
-        elif "travel deals" in answer.lower():
-            session["mode"] = "deals"
-            return {"next_question": "Great! I'll help you find the best travel deals. What type of deals are you looking for?"}
-        elif "track my bookings" in answer.lower():
-            session["mode"] = "tracking"
-            return {"next_question": "I'll help you track your bookings. Please provide your booking reference number."}
-        elif "report an issue" in answer.lower():
-            session["mode"] = "support"
-            return {"next_question": "I'm here to help! Please describe the issue you're experiencing."}
-        else:
-            return {"next_question": "Please select one of the available options."}
+SUGGESTION_MEALS = ("breakfast", "lunch", "dinner")
+HOTEL_WORDS = ("hotel", "accommodation", "stay", "resort", "lodge", "inn")
+ACTIVITY_WORDS = ("activity", "attraction", "sightseeing", "tour", "museum", "beach", "park", "shopping", "adventure")
 
-    # New conversation flow
-    if session["step"] == "travel_vibe":
-        session["travel_vibe"] = answer
-        session["step"] = "scene_preferences"
-        # Generate dynamic response
-        try:
-            response_resp = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are Laura, an enthusiastic travel assistant."},
-                    {"role": "user", "content": f"User selected '{answer}' as their travel vibe. Generate one enthusiastic sentence acknowledging this choice."}
-                ]
-            )
-            dynamic_response = response_resp.choices[0].message.content.strip()
-        except:
-            dynamic_response = f"Awesome! {answer} sounds amazing!"
-        
-        return {
-            "next_question": "Tap everything that gets your heart racing or your soul relaxing. I'll craft a trip that fits your vibe perfectly!\nYour Kind of Scene",
-            "options": ["🏖️ Beach", "🏔️ Mountains", "🏙️ City Life", "🌲 Nature & Forests", "🏜️ Desert", "❄️ Snow & Ski", "🏛️ Historical Sites", "Continue"]
-        }
-    
+def guess_suggestion_target(answer, recommendations):
+    """
+    Local first guess of (item_type, activity being replaced) for a suggestion request, so
+    nearby candidates can go into the prompt. item_type is None when it cannot be told.
+    """
+    text = answer.lower()
+    if any(word in text for word in HOTEL_WORDS):
+        return "hotel", None
+    for day in recommendations:
+        for activity in day["activities"]:
+            if activity.get("name") and activity["name"].lower() in text:
+                return place_kb.category_of(activity) or "activity", activity
+    meal = next((m for m in SUGGESTION_MEALS if m in text), None)
+    if meal:
+        match = re.search(r"day\s*(\d+)", text)
+        day_idx = int(match.group(1)) - 1 if match else -1
+        if 0 <= day_idx < len(recommendations):
+            for activity in recommendations[day_idx]["activities"]:
+                if (activity.get("meal") or "").lower() == meal:
+                    return meal, activity
+        return meal, None
+    if any(word in text for word in ACTIVITY_WORDS):
+        return "activity", None
+    return None, None
 
-    
-    elif session["step"] == "manual_destination":
-        # Parse origin and destination from user input
-        session["step"] = "movie_description"
-        
-        # Extract origin and destination from user input
-        parts = answer.lower().split(' to ')
-        if len(parts) == 2:
-            session["origin"] = parts[0].strip().title()
-            session["destination"] = parts[1].strip().title()
-        else:
-            # Try other patterns like "from X to Y"
-            words = answer.split()
-            if 'from' in answer.lower() and 'to' in answer.lower():
-                from_idx = next(i for i, word in enumerate(words) if word.lower() == 'from')
-                to_idx = next(i for i, word in enumerate(words) if word.lower() == 'to')
-                session["origin"] = ' '.join(words[from_idx+1:to_idx]).title()
-                session["destination"] = ' '.join(words[to_idx+1:]).title()
-            else:
-                # If no clear origin-destination pattern, assume destination only and ask for origin
-                session["destination"] = answer.title()
-                session["step"] = "origin_input"
-                return {
-                    "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
-                }
-        
-        # Generate movie description based on all preferences
-        try:
-            movie_prompt = f"""
-Based on these travel preferences:
-- Travel Vibe: {session.get('travel_vibe', '')}
-- Scene Preferences: {', '.join(session.get('scene_preferences', []))}
-- Trip Goals: {', '.join(session.get('trip_goals', []))}
-- Accommodation: {session.get('accommodation_type', '')}
-- Origin: {session.get('origin', '')}
-- Destination: {session.get('destination', '')}
+# "replace X with Y", "instead of X add Y", "remove X", "regenerate day 2"
+REPLACE_COMMAND = re.compile(r"^\s*(?:replace|swap)\s+(.+?)\s+(?:with|for)\s+(.+)$", re.IGNORECASE)
+INSTEAD_COMMAND = re.compile(r"^\s*instead of\s+(.+?),?\s+add\s+(.+)$", re.IGNORECASE)
+REMOVE_COMMAND = re.compile(r"^\s*(?:remove|delete|drop)\s+(.+)$", re.IGNORECASE)
+REGENERATE_COMMAND = re.compile(r"^\s*(?:regenerate|redo|refresh)\b.*\bday\s*\d+", re.IGNORECASE)
 
-Generate ONE word that describes this trip like a movie genre/title. Examples: Hangover, Adventure, Romance, Discovery, Escape, etc.
-Return only the single word.
-"""
-            
-            movie_resp = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "Generate a single descriptive word for the trip."},
-                    {"role": "user", "content": movie_prompt}
-                ]
-            )
-            movie_word = movie_resp.choices[0].message.content.strip().replace('"', '')
-        except:
-            movie_word = "Adventure"
-        
-        session["movie_description"] = movie_word
-        session["step"] = "ready_to_generate"
-        
-        return {
-            "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
-            "options": ["Generate your personalized itinerary", "Keep editing"]
-        }
-    
-    elif session["step"] == "ai_destination":
-        # Check if user selected from suggestions or typed their own
-        if answer in session.get("suggested_destinations", []):
-            # User selected a suggested destination
-            session["destination"] = answer
-            session["step"] = "origin_input"
-            return {
-                "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
-            }
-        elif answer.lower() == "choose an option (or type your own):":
-            return {
-                "next_question": "Please type your preferred destination:"
-            }
-        else:
-            # User typed their own destination
-            session["destination"] = answer.title()
-            session["step"] = "origin_input"
-            return {
-                "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
-            }
-    
-    elif session["step"] == "origin_input":
-        session["origin"] = answer.title()
-        session["step"] = "movie_description"
-        
-        # Generate movie description based on all preferences
-        try:
-            movie_prompt = f"""
-Based on these travel preferences:
-- Travel Vibe: {session.get('travel_vibe', '')}
-- Scene Preferences: {', '.join(session.get('scene_preferences', []))}
-- Trip Goals: {', '.join(session.get('trip_goals', []))}
-- Accommodation: {session.get('accommodation_type', '')}
-- Origin: {session.get('origin', '')}
-- Destination: {session.get('destination', '')}
+def is_edit_command(answer, itinerary):
+    """
+    True when the answer already names the whole change, so it can be applied by
+    apply_edit_commands() without offering suggestions first. The place being replaced
+    or removed has to be a planned visit or meal; hotel, arrival and transfer rows have
+    their own flows.
+    """
+    if REGENERATE_COMMAND.match(answer):
+        return True
+    match = REPLACE_COMMAND.match(answer) or INSTEAD_COMMAND.match(answer) or REMOVE_COMMAND.match(answer)
+    if not match:
+        return False
+    target = itinerary.find(match.group(1))
+    return target is not None and not target.get("action")
 
-Generate ONE word that describes this trip like a movie genre/title. Examples: Hangover, Adventure, Romance, Discovery, Escape, etc.
-Return only the single word.
-"""
-            
-            movie_resp = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "Generate a single descriptive word for the trip."},
-                    {"role": "user", "content": movie_prompt}
-                ]
-            )
-            movie_word = movie_resp.choices[0].message.content.strip().replace('"', '')
-        except:
-            movie_word = "Adventure"
-        
-        session["movie_description"] = movie_word
-        session["step"] = "ready_to_generate"
-        
-        return {
-            "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
-            "options": ["Generate your personalized itinerary", "Keep editing"]
-        }
-    
-    elif session["step"] == "scene_preferences":
-        # Handle multiple selections (comma-separated like "1,2,8" or "Continue")
-        if answer.lower() == "continue" or "8" in answer or "continue" in answer.lower():
-            # Move to next step
-            session["step"] = "trip_goals"
-            # Generate dynamic trip goals based on scene preferences
-            try:
-                goals_prompt = f"""
-Based on these scene preferences: {', '.join(session['scene_preferences'])}
-Generate 8 relevant trip goals/activities. Format as emoji + activity name.
+def suggestion_anchors(recommendations, hotel, current_activity=None):
+    """
+    Coordinates a replacement should stay close to: the activities either side of the one
+    being replaced, else the activity itself, else the hotel.
+    """
+    if current_activity is not None:
+        for day in recommendations:
+            activities = day["activities"]
+            for idx, activity in enumerate(activities):
+                if activity is current_activity:
+                    neighbours = activities[max(0, idx - 1):idx] + activities[idx + 1:idx + 2]
+                    anchors = [c for c in map(travel_estimator.coordinates, neighbours) if c]
+                    own = travel_estimator.coordinates(activity)
+                    if anchors or own:
+                        return anchors or [own]
+    own = travel_estimator.coordinates(hotel)
+    return [own] if own else []
 
-Examples:
-- Beach → 🍽️ Food & Culinary, 🛍️ Shopping, 🏄 Water Sports, 🌅 Sunset Tours
-- Mountains → 🥾 Hiking, 📸 Photography, 🧘 Wellness & Spa, 🎿 Adventure Sports
-- City Life → 🛍️ Shopping, 🎭 Culture & Museums, 🍽️ Food & Culinary, 🎶 Music & Festivals
+def apply_place_details(activity, detail_json, fallback_name):
+    # Swap in the new place but keep the activity's own set and order of fields
+    activity["name"] = detail_json.get("name", fallback_name)
+    activity["address"] = detail_json.get("address", activity.get("address", "Address not available"))
+    activity["latitude"] = detail_json.get("latitude", activity.get("latitude", 0.0))
+    activity["longitude"] = detail_json.get("longitude", activity.get("longitude", 0.0))
+    for field in ("highlights", "why_recommended", "carry", "rating", "reviews"):
+        if field in activity:
+            activity[field] = detail_json.get(field, activity[field])
 
-Return JSON: {{"goals": ["🍽️ Food & Culinary", "🛍️ Shopping", ...]}}
-"""
-                
-                goals_resp = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=[
-                        {"role": "system", "content": "Generate relevant trip goals based on scene preferences."},
-                        {"role": "user", "content": goals_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                goals_json = json.loads(goals_resp.choices[0].message.content)
-                trip_goals = goals_json.get("goals", ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎢 Theme Parks", "🧘 Wellness & Spa", "🚴 Adventure Sports", "📸 Photography", "🎶 Music & Festivals"])
-            except:
-                trip_goals = ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎢 Theme Parks", "🧘 Wellness & Spa", "🚴 Adventure Sports", "📸 Photography", "🎶 Music & Festivals"]
-            
-            return {
-                "next_question": "Trip Goals & Fun Stuff:",
-                "options": trip_goals + ["Continue"]
-            }
-        else:
-            # Parse multiple selections (e.g., "1,2,3" or single selection)
-            scene_options = ["🏖️ Beach", "🏔️ Mountains", "🏙️ City Life", "🌲 Nature & Forests", "🏜️ Desert", "❄️ Snow & Ski", "🏛️ Historical Sites"]
-            
-            # Handle comma-separated input
-            if "," in answer:
-                selections = [s.strip() for s in answer.split(",")]
-                for sel in selections:
-                    if sel.isdigit():
-                        idx = int(sel) - 1
-                        if 0 <= idx < len(scene_options):
-                            option = scene_options[idx]
-                            if option not in session["scene_preferences"]:
-                                session["scene_preferences"].append(option)
-            else:
-                # Single selection
-                if answer.isdigit():
-                    idx = int(answer) - 1
-                    if 0 <= idx < len(scene_options):
-                        option = scene_options[idx]
-                        if option not in session["scene_preferences"]:
-                            session["scene_preferences"].append(option)
-                elif answer not in session["scene_preferences"] and answer in scene_options:
-                    session["scene_preferences"].append(answer)
-            
-            return {
-                "next_question": f"Selected: {', '.join(session['scene_preferences'])}. Choose more or continue:",
-                "options": scene_options + ["Continue"]
-            }
-    
-    elif session["step"] == "trip_goals":
-        # Handle multiple selections for trip goals (comma-separated like "1,2,9" or "Continue")
-        if answer.lower() == "continue" or "9" in answer or "continue" in answer.lower():
-            # Move to next step
-            session["step"] = "accommodation"
-            return {
-                "next_question": "Stay in Style or Explore?",
-                "options": ["🏨 Luxury Hotel", "🏡 Homestay", "🛖 Eco Lodge", "🏥️ Camping", "🛌️ Budget Stay", "🏰 Unique Stays (castles, treehouses, etc.)"]
-            }
-        else:
-            # Parse multiple selections (e.g., "1,2,3" or single selection)
-            goal_options = ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎶 Music & Festivals", "🏙️ City Tours", "🍸 Nightlife & Bars", "🚶 Walking Tours", "🖼️ Art Galleries"]
-            
-            # Handle comma-separated input
-            if "," in answer:
-                selections = [s.strip() for s in answer.split(",")]
-                for sel in selections:
-                    if sel.isdigit():
-                        idx = int(sel) - 1
-                        if 0 <= idx < len(goal_options):
-                            option = goal_options[idx]
-                            if option not in session["trip_goals"]:
-                                session["trip_goals"].append(option)
-            else:
-                # Single selection
-                if answer.isdigit():
-                    idx = int(answer) - 1
-                    if 0 <= idx < len(goal_options):
-                        option = goal_options[idx]
-                        if option not in session["trip_goals"]:
-                            session["trip_goals"].append(option)
-                elif answer not in session["trip_goals"] and answer in goal_options:
-                    session["trip_goals"].append(answer)
-            
-            return {
-                "next_question": f"Selected: {', '.join(session['trip_goals'])}. Choose more or continue:",
-                "options": goal_options + ["Continue"]
-            }
-    
-    elif session["step"] == "accommodation":
-        session["accommodation_type"] = answer
-        session["step"] = "destination_choice"
-        
-        return {
-            "next_question": "Got a destination in mind or you want me to pick for you?"
-        }
-    
-    elif session["step"] == "destination_choice":
-        user_input = answer.lower().strip()
-        suggestion_keywords = ["no", "suggest", "recommend", "pick for me", "pick me one", "choose for me", "don't know", "help me choose", "you pick", "surprise me"]
-        wants_suggestions = any(keyword in user_input for keyword in suggestion_keywords)
-        
-        if wants_suggestions:
-            session["step"] = "ai_destination"
-            try:
-                dest_resp = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=[
-                        {"role": "system", "content": "You are a travel assistant. Suggest only destinations within the United States."},
-                        {"role": "user", "content": f"Based on travel vibe '{session['travel_vibe']}', suggest 5 popular US destinations. Return only destination names."}
-                    ]
-                )
-                destinations_text = dest_resp.choices[0].message.content.strip()
-                destinations = []
-                for dest in destinations_text.split('\n'):
-                    if dest.strip():
-                        clean_dest = dest.strip()
-                        clean_dest = re.sub(r'^\d+\.\s*', '', clean_dest)
-                        clean_dest = re.sub(r'^\d+\)\s*', '', clean_dest)
-                        clean_dest = clean_dest.replace('- ', '').replace('• ', '')
-                        if clean_dest:
-                            destinations.append(clean_dest)
-                destinations = destinations[:5]
-            except:
-                destinations = ["Las Vegas, Nevada", "Miami, Florida", "New Orleans, Louisiana", "Austin, Texas", "Nashville, Tennessee"]
-            
-            session["suggested_destinations"] = destinations
-            return {
-                "next_question": "Here are some amazing US destinations perfect for your vibe! Pick one that calls to you:",
-                "options": destinations
-            }
-        else:
-            # Use AI to parse any dynamic user input
-            parse_prompt = f"""
-User said: "{answer}"
+def nearby_places(destination, item_type, anchors, exclude=(), k=5):
+    if not spatial_index.INDEX_ENABLED or not item_type or not anchors:
+        return []
+    return spatial_index.index.nearest(destination, place_kb.category_for(item_type), anchors, k=k, exclude=exclude)
 
-Analyze this input and extract travel information. The user might mention:
-- Origin city/location (where they're traveling FROM)
-- Destination city/location (where they're traveling TO)
-- Duration (like "2 days", "1 week")
-- Any other travel details
+async def generate_highlights(name):
+    highlight_prompt = f"Write exactly 2-3 sentences about {name} describing what makes it special and what visitors can do there. Keep it concise and similar to this style: 'Waimea Bay is famous for its breathtaking beauty and excellent swimming and surfing spots. The crystal-clear waters and scenic surroundings provide an exhilarating backdrop for sunbathing or enjoying water activities.'"
+    try:
+        highlight_resp = await llm_gateway.complete(
+            step="highlights",
+            messages=[
+                {"role": "system", "content": "You are a concise travel writer."},
+                {"role": "user", "content": highlight_prompt}
+            ]
+        )
+        return highlight_resp.strip()
+    except:
+        return f"{name} offers unique attractions and scenic views for visitors to enjoy."
 
-Return JSON format:
-{{
-  "has_origin": true/false,
-  "has_destination": true/false,
-  "origin": "city name or empty string",
-  "destination": "city name or empty string",
-  "interpretation": "what the user meant"
-}}
+async def generate_carry(name):
+    carry_prompt = f"List 2-4 essential items to carry when visiting {name}. Keep it short like 'Swimsuit, towel, refreshments.' or 'Camera, comfortable shoes, water bottle.'"
+    try:
+        carry_resp = await llm_gateway.complete(
+            step="carry",
+            messages=[
+                {"role": "system", "content": "You are a concise travel advisor."},
+                {"role": "user", "content": carry_prompt}
+            ]
+        )
+        return carry_resp.strip()
+    except:
+        return "Camera, comfortable shoes, water bottle."
 
-Examples:
-- "bengaluru to hawaii for 2 days" → {{"has_origin": true, "has_destination": true, "origin": "Bengaluru", "destination": "Hawaii", "interpretation": "User wants to travel from Bengaluru to Hawaii"}}
-- "I want to visit Paris" → {{"has_origin": false, "has_destination": true, "origin": "", "destination": "Paris", "interpretation": "User wants to visit Paris but didn't mention origin"}}
-- "Going to New York from Mumbai" → {{"has_origin": true, "has_destination": true, "origin": "Mumbai", "destination": "New York", "interpretation": "User wants to travel from Mumbai to New York"}}
-"""
-            
-            try:
-                parse_resp = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=[
-                        {"role": "system", "content": "You are an intelligent travel input parser. Extract origin and destination from any user input."},
-                        {"role": "user", "content": parse_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                parse_json = json.loads(parse_resp.choices[0].message.content)
-                
-                has_origin = parse_json.get("has_origin", False)
-                has_destination = parse_json.get("has_destination", False)
-                origin_found = parse_json.get("origin", "").strip()
-                destination_found = parse_json.get("destination", "").strip()
-                
-                if has_origin and has_destination and origin_found and destination_found:
-                    # Both origin and destination provided
-                    session["origin"] = origin_found.title()
-                    session["destination"] = destination_found.title()
-                    
-                    try:
-                        movie_prompt = f"""
-Based on these travel preferences:
-- Travel Vibe: {session.get('travel_vibe', '')}
-- Scene Preferences: {', '.join(session.get('scene_preferences', []))}
-- Trip Goals: {', '.join(session.get('trip_goals', []))}
-- Accommodation: {session.get('accommodation_type', '')}
-- Origin: {session.get('origin', '')}
-- Destination: {session.get('destination', '')}
+async def generate_why_recommended(name):
+    why_prompt = f"Write 1-2 short sentences explaining why {name} is recommended. Keep it concise like 'A must-visit for authentic Hawaiian food. It's budget-friendly and loved by locals.'"
+    try:
+        why_resp = await llm_gateway.complete(
+            step="why_recommended",
+            messages=[
+                {"role": "system", "content": "You are a travel recommendation expert."},
+                {"role": "user", "content": why_prompt}
+            ]
+        )
+        return why_resp.strip()
+    except:
+        return "A popular destination loved by travelers."
 
-Generate ONE word that describes this trip like a movie genre/title. Examples: Hangover, Adventure, Romance, Discovery, Escape, etc.
-Return only the single word.
-"""
-                        
-                        movie_resp = client.chat.completions.create(
-                            model=deployment_name,
-                            messages=[
-                                {"role": "system", "content": "Generate a single descriptive word for the trip."},
-                                {"role": "user", "content": movie_prompt}
-                            ]
-                        )
-                        movie_word = movie_resp.choices[0].message.content.strip().replace('"', '')
-                    except:
-                        movie_word = "Adventure"
-                    
-                    session["movie_description"] = movie_word
-                    session["step"] = "ready_to_generate"
-                    
-                    return {
-                        "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
-                        "options": ["Generate your personalized itinerary", "Keep editing"]
-                    }
-                elif has_destination and destination_found:
-                    # Only destination provided, ask for origin
-                    session["destination"] = destination_found.title()
-                    session["step"] = "origin_input"
-                    return {
-                        "next_question": f"Excellent choice! {destination_found} is going to be amazing! Where are you traveling from?"
-                    }
-                else:
-                    # Couldn't parse clearly, ask for clarification
-                    return {
-                        "next_question": "I'd love to help you plan your trip! Could you tell me your starting point and destination? For example: 'from Mumbai to Dubai' or 'Chennai to Singapore'"
-                    }
-            except:
-                # Fallback to treating entire input as destination
-                session["destination"] = answer.title()
-                session["step"] = "origin_input"
-                return {
-                    "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
-                }
-    
-    user_choice = answer.lower()
-    
-    # Handle Keep editing flow
-    if session["step"] == "ready_to_generate" and "keep editing" in user_choice:
-        session["waiting_for_answer"] = True
-        # Ask a clarifying question
-        clarify_prompt = f"""
-The user's travel preferences so far:
-Travel Vibe: {session.get('travel_vibe', 'Not specified')}
-Origin: {session.get('origin', 'Not specified')}
-Destination: {session.get('destination', 'Not specified')}
-Scene Preferences: {', '.join(session.get('scene_preferences', []))}
-Trip Goals: {', '.join(session.get('trip_goals', []))}
-Accommodation: {session.get('accommodation_type', 'Not specified')}
+async def generate_reviews(name):
+    review_prompt = f"Write 5 realistic, natural human reviews for {name}. Make them sound like real travelers who actually experienced this place - include specific details, emotions, personal stories, and varied writing styles. Each review should feel authentic and different. Format as: Review 1: [text] | Review 2: [text] | Review 3: [text] | Review 4: [text] | Review 5: [text]"
+    try:
+        review_resp = await llm_gateway.complete(
+            step="reviews",
+            messages=[
+                {"role": "system", "content": "You are a travel review generator. Write authentic, varied reviews that sound like real people who have personally experienced the place. Include specific details, emotions, and personal touches."},
+                {"role": "user", "content": review_prompt}
+            ]
+        )
+        reviews = review_resp.strip().split(" | ")
+        if len(reviews) >= 5:
+            return {f"Review {i}": reviews[i - 1].replace(f"Review {i}: ", "") for i in range(1, 6)}
+    except:
+        pass
+    return default_reviews(name)
 
-Ask ONE more clarifying question about their trip to refine their preferences.
-Make it conversational and friendly.
-"""
-        try:
-            clarify_resp = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are Laura, a helpful travel assistant."},
-                    {"role": "user", "content": clarify_prompt}
-                ]
-            )
-            next_q = clarify_resp.choices[0].message.content.strip()
-        except:
-            next_q = "Tell me more about what you're looking for in this trip!"
-        
-        return {"next_question": next_q}
-    
-    # Handle user's answer to the clarifying question
-    elif session.get("waiting_for_answer"):
-        session["waiting_for_answer"] = False
-        # Generate dynamic response to user's answer
-        try:
-            response_resp = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are Laura, an enthusiastic travel assistant."},
-                    {"role": "user", "content": f"User answered: '{answer}'. Generate one enthusiastic sentence acknowledging their response."}
-                ]
-            )
-            dynamic_response = response_resp.choices[0].message.content.strip()
-        except:
-            dynamic_response = "Great! That helps me understand your preferences better!"
-        
-        return {
-            "next_question": dynamic_response,
-            "options": ["Generate your personalized itinerary", "Keep editing"]
-        }
+def build_plan_prompt(session):
+    days = extract_days(" ".join(session["history"]))
+    # Get user preferences for contextual recommendations
+    travel_vibe = session.get('travel_vibe', 'Unknown')
+    scene_prefs = ', '.join(session.get('scene_preferences', []))
+    trip_goals = ', '.join(session.get('trip_goals', []))
+    accommodation = session.get('accommodation_type', 'Unknown')
+    movie_desc = session.get('movie_description', 'Adventure')
 
-    # ✅ Generate Persona + Itinerary
-    if user_choice in ["1", "generate persona", "generate persona & recommendations", "persona", "generate an itinerary", "itinerary", "generate your personalized itinerary"]:
-        session["ready"] = True
-        days = extract_days(" ".join(session["history"]))
-        # Get user preferences for contextual recommendations
-        travel_vibe = session.get('travel_vibe', 'Unknown')
-        scene_prefs = ', '.join(session.get('scene_preferences', []))
-        trip_goals = ', '.join(session.get('trip_goals', []))
-        accommodation = session.get('accommodation_type', 'Unknown')
-        movie_desc = session.get('movie_description', 'Adventure')
-        
-        plan_prompt = f"""
+    return f"""
 You are a travel assistant. Based on this user profile:
 Travel Vibe: {travel_vibe}
 Origin: {session.get('origin', 'Unknown')}
@@ -1217,101 +509,1026 @@ Generate a travel itinerary in the following exact JSON format:
     }}
   ]
 }}
-Rules:
-- Output must be valid JSON only.
-- Always include latitude and longitude.
-- Always include hotel details inside each city.
-- Always split airport arrival, airport-to-hotel transfer, and hotel check-in into separate activities.
-- Hotel check-in must happen at the official time (usually 3:00 PM or hotel's stated check-in time).
-- If arrival is before check-in, the traveler **must have planned activities between airport transfer and official check-in** (e.g., sightseeing, brunch, local market, park visit). Do not leave gaps in the itinerary.
-- After check-in, continue with afternoon/evening activities.
-- Each day must end with the traveler **returning to their hotel** or a nightlife spot that is near the hotel, never stranded outside.
-- If the user moves to a new city or checks into a new hotel, **include that hotel check-in explicitly** in the new city's activities (with full address, latitude, longitude, check-in/out time).
-- Always make activities chronological with realistic travel times and meal breaks.
-- Always include both "travel_distance_from_previous" (in km) and "travel_time_from_previous".
-- Meals must only be: Breakfast (7–10 AM), Lunch (12–2 PM), Dinner (7–9 PM).
-- Do not mark nightlife or clubs as meals. Nightlife should be its own activity with "action": "Nightlife".
-- Avoid repeating the same place (except hotel check-in/check-out).
-- Keep travel times consistent with distances (e.g., 1 km ≈ 10 mins walk, 5 km ≈ 15 mins by taxi).
-- For each activity, always include a "highlights" field with 3–4 descriptive sentences (travel-guide style).
-- For each activity, always include a "carry" field listing practical items (if applicable).
-- For each activity, always include a "why_recommended" field with 1-2 sentences explaining why it's recommended based on the user's specific choices: Travel Vibe ({travel_vibe}), Scene Preferences ({scene_prefs}), Trip Goals ({trip_goals}), and Accommodation Type ({accommodation}). Make it personal and contextual.
-- For each activity, always include a "rating" (decimal between 1.0 and 5.0).
-- For each activity, always include a "reviews" field as an object with "Review 1" through "Review 5" as keys with natural user reviews.
-- For hotels, always include a "why_recommended" field explaining why this hotel perfectly matches their {travel_vibe} vibe and {accommodation} preference.
-- Always include a full round trip:
-  - One inter_city_travel leg from the origin city (e.g., Bengaluru) to the destination city.
-  - One inter_city_travel leg returning from the destination city back to the origin city.
-  - The return journey must happen after the last day of the trip.
-- Day 1 must always start with airport arrival, then transfer, then **pre-check-in activities**, then official hotel check-in.
-- Day N (last day) must always end with **hotel check-out and return to airport/train station**.
-- Create a {days}-day plan.
-"""
+Rules:
+- Output must be valid JSON only.
+- Always include latitude and longitude.
+- Always include hotel details inside each city.
+- Always split airport arrival, airport-to-hotel transfer, and hotel check-in into separate activities.
+- Hotel check-in must happen at the official time (usually 3:00 PM or hotel's stated check-in time).
+- If arrival is before check-in, the traveler **must have planned activities between airport transfer and official check-in** (e.g., sightseeing, brunch, local market, park visit). Do not leave gaps in the itinerary.
+- After check-in, continue with afternoon/evening activities.
+- Each day must end with the traveler **returning to their hotel** or a nightlife spot that is near the hotel, never stranded outside.
+- If the user moves to a new city or checks into a new hotel, **include that hotel check-in explicitly** in the new city's activities (with full address, latitude, longitude, check-in/out time).
+- Always make activities chronological with realistic travel times and meal breaks.
+- Always include both "travel_distance_from_previous" (in km) and "travel_time_from_previous".
+- Meals must only be: Breakfast (7–10 AM), Lunch (12–2 PM), Dinner (7–9 PM).
+- Do not mark nightlife or clubs as meals. Nightlife should be its own activity with "action": "Nightlife".
+- Avoid repeating the same place (except hotel check-in/check-out).
+- Keep travel times consistent with distances (e.g., 1 km ≈ 10 mins walk, 5 km ≈ 15 mins by taxi).
+- For each activity, always include a "highlights" field with 3–4 descriptive sentences (travel-guide style).
+- For each activity, always include a "carry" field listing practical items (if applicable).
+- For each activity, always include a "why_recommended" field with 1-2 sentences explaining why it's recommended based on the user's specific choices: Travel Vibe ({travel_vibe}), Scene Preferences ({scene_prefs}), Trip Goals ({trip_goals}), and Accommodation Type ({accommodation}). Make it personal and contextual.
+- For each activity, always include a "rating" (decimal between 1.0 and 5.0).
+- For each activity, always include a "reviews" field as an object with "Review 1" through "Review 5" as keys with natural user reviews.
+- For hotels, always include a "why_recommended" field explaining why this hotel perfectly matches their {travel_vibe} vibe and {accommodation} preference.
+- Always include a full round trip:
+  - One inter_city_travel leg from the origin city (e.g., Bengaluru) to the destination city.
+  - One inter_city_travel leg returning from the destination city back to the origin city.
+  - The return journey must happen after the last day of the trip.
+- Day 1 must always start with airport arrival, then transfer, then **pre-check-in activities**, then official hotel check-in.
+- Day N (last day) must always end with **hotel check-out and return to airport/train station**.
+- Create a {days}-day plan.
+"""
+
+def pending_target(itinerary, pending):
+    """
+    The activity a pending suggestion replaces. Its ID survives edits to the plan, but
+    IDs are reassigned when the model is rebuilt (another worker, a restored session),
+    so the remembered name decides when the two disagree.
+    """
+    target = itinerary.get(pending.get("current_item_id"))
+    if target is not None and target.get("name") == pending.get("current_item"):
+        return target
+    return itinerary.find(pending.get("current_item", ""))
+
+async def different_suggestions(pending, itinerary, destination):
+    """
+    Five new places of the pending suggestion's type, none of them already offered or
+    planned. Known places from earlier plans answer without a model call when there are enough:
+    the nearest to the spot being changed first, then the most popular in the city.
+    """
+    item_type = pending.get("item_type") or "activity"
+    excluded = pending.get("suggestions", []) + itinerary.names()
+    known = [place["name"] for place in nearby_places(
+        destination, item_type, [tuple(a) for a in pending.get("anchors", [])], exclude=excluded
+    )]
+    if len(known) < 5 and place_kb.KB_ENABLED:
+        known = [place["name"] for place in place_kb.kb.popular(
+            destination, place_kb.category_for(item_type), exclude=excluded
+        )]
+    if len(known) >= 5:
+        return known
+    new_suggestion_prompt = f"""
+Generate 5 different {item_type} suggestions in {destination} that are completely different from these previous suggestions: {pending.get('suggestions', [])}
+
+Return JSON format:
+{{
+  "suggestions": ["New Place 1", "New Place 2", "New Place 3", "New Place 4", "New Place 5"]
+}}
+"""
+    new_resp = await llm_gateway.complete(
+        step="suggestion_refresh",
+        messages=[
+            {"role": "system", "content": "You provide diverse travel suggestions."},
+            {"role": "user", "content": new_suggestion_prompt}
+        ],
+        response_format={"type": "json_object"}
+    )
+    return json.loads(new_resp).get("suggestions", [])
+
+def session_itinerary(session):
+    """
+    Counting model of the session's plan, rebuilt only when the plan itself was replaced.
+    """
+    itinerary = session.get("itinerary")
+    if itinerary is None or itinerary.result is not session.get("result"):
+        itinerary = itinerary_model.Itinerary(session["result"])
+        session["itinerary"] = itinerary
+    return itinerary
+
+async def generate_trip_goals(scene_preferences):
+    try:
+        goals_prompt = f"""
+Based on these scene preferences: {', '.join(scene_preferences)}
+Generate 8 relevant trip goals/activities. Format as emoji + activity name.
+
+Examples:
+- Beach → 🍽️ Food & Culinary, 🛍️ Shopping, 🏄 Water Sports, 🌅 Sunset Tours
+- Mountains → 🥾 Hiking, 📸 Photography, 🧘 Wellness & Spa, 🎿 Adventure Sports
+- City Life → 🛍️ Shopping, 🎭 Culture & Museums, 🍽️ Food & Culinary, 🎶 Music & Festivals
+
+Return JSON: {{"goals": ["🍽️ Food & Culinary", "🛍️ Shopping", ...]}}
+"""
+        
+        goals_resp = await llm_gateway.complete(
+            step="trip_goals",
+            messages=[
+                {"role": "system", "content": "Generate relevant trip goals based on scene preferences."},
+                {"role": "user", "content": goals_prompt}
+            ],
+            response_format={"type": "json_object"},
+            cache=True
+        )
+        goals_json = json.loads(goals_resp)
+        return goals_json.get("goals", DEFAULT_TRIP_GOALS)
+    except:
+        return DEFAULT_TRIP_GOALS
+
+async def describe_trip(session):
+    # Listed vibes come from the precomputed bank; only free-text vibes need the model
+    movie_word = response_bank.pick("movie_genre", session.get("travel_vibe"))
+    if movie_word is not None:
+        return movie_word
+    try:
+        movie_prompt = f"""
+Based on these travel preferences:
+- Travel Vibe: {session.get('travel_vibe', '')}
+- Scene Preferences: {', '.join(session.get('scene_preferences', []))}
+- Trip Goals: {', '.join(session.get('trip_goals', []))}
+- Accommodation: {session.get('accommodation_type', '')}
+- Origin: {session.get('origin', '')}
+- Destination: {session.get('destination', '')}
+
+Generate ONE word that describes this trip like a movie genre/title. Examples: Hangover, Adventure, Romance, Discovery, Escape, etc.
+Return only the single word.
+"""
+        movie_resp = await llm_gateway.complete(
+            step="movie_genre",
+            messages=[
+                {"role": "system", "content": "Generate a single descriptive word for the trip."},
+                {"role": "user", "content": movie_prompt}
+            ]
+        )
+        return movie_resp.strip().replace('"', '')
+    except:
+        return "Adventure"
+
+class InvalidPlanError(Exception):
+    def __init__(self, raw):
+        super().__init__("Invalid JSON from AI")
+        self.raw = raw
+
+async def generate_itinerary(session):
+    if ITINERARY_ENGINE == "parallel":
+        result_json = await itinerary_engine.generate(session, extract_days(" ".join(session["history"])))
+        if not result_json["cities"]:
+            raise InvalidPlanError("")
+        return result_json
+
+    raw_content = await llm_gateway.complete(
+        step="plan",
+        messages=[
+            {"role": "system", "content": "You are a helpful travel assistant."},
+            {"role": "user", "content": build_plan_prompt(session)}
+        ],
+        response_format={"type": "json_object"}
+    )
+    try:
+        return json.loads(raw_content)
+    except Exception:
+        raise InvalidPlanError(raw_content)
+
+def plan_key(session):
+    # The plan prompt captures every preference the itinerary depends on
+    return hashlib.sha256(f"{ITINERARY_ENGINE}\n{build_plan_prompt(session)}".encode("utf-8")).hexdigest()
+
+def prefetch_itinerary(session_id, session):
+    # Most users accept "Generate your personalized itinerary", so start on it now
+    snapshot = {**session, "history": list(session["history"])}
+    speculation.start(session_id, "itinerary", plan_key(snapshot), lambda: generate_itinerary(snapshot))
+
+# Generated fields of a replacement activity, keyed by activity field name
+ACTIVITY_FIELD_GENERATORS = {
+    "highlights": generate_highlights,
+    "carry": generate_carry,
+    "why_recommended": generate_why_recommended,
+    "reviews": generate_reviews
+}
+
+@app.on_event("shutdown")
+async def close_storage():
+    await write_behind.queue.flush()
+    await cosmos_async.close()
+
+@app.get("/admin/llm-stats")
+async def llm_stats():
+    return {
+        **llm_gateway.stats(),
+        "speculation": speculation.stats(),
+        "response_bank": response_bank.stats(),
+        "gazetteer": gazetteer.gazetteer.stats(),
+        "place_kb": place_kb.kb.stats(),
+        "spatial_index": spatial_index.index.stats(),
+        "sessions": user_sessions.stats(),
+        "rehydrate": session_rehydrate.stats(),
+        "cosmos": cosmos_async.stats(),
+        "write_behind": write_behind.queue.stats()
+    }
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+@app.get("/admin/llm-usage", dependencies=[Depends(require_admin)])
+async def llm_usage(recent: int = 50):
+    return llm_metrics.snapshot(recent)
+
+@app.get("/admin/llm-usage/{session_id}", dependencies=[Depends(require_admin)])
+async def llm_session_usage(session_id: str):
+    usage = llm_metrics.session_snapshot(session_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="No LLM calls recorded for this session")
+    return usage
+
+def new_session():
+    return {
+        "mode": None,
+        "ready": False,
+        "history": [],
+        "asked_another": False,
+        "result": None,
+        "step": "initial",
+        "travel_vibe": None,
+        "destination_choice": None,
+        "origin": None,
+        "destination": None,
+        "scene_preferences": [],
+        "trip_goals": [],
+        "suggested_destinations": [],
+        "movie_description": None,
+        "accommodation_type": None,
+        "waiting_for_answer": False,
+        "pending_suggestion": None
+    }
+
+def resume_session(result_json):
+    # Enough state for the edit handlers, which only need the plan and its destination
+    session = new_session()
+    cities = result_json.get("cities") or [{}]
+    session.update({
+        "mode": "plan_trip",
+        "ready": True,
+        "result": result_json,
+        "step": "ready_to_generate",
+        "destination": cities[0].get("city_name")
+    })
+    return session
+
+@app.exception_handler(session_store.SessionBusy)
+async def session_busy(request, exc):
+    # Another turn of this session is still running; the client may retry once it is done
+    return JSONResponse(status_code=409, content={"detail": "Session is busy with another request"}, headers={"Retry-After": "5"})
+
+@app.post("/chat")
+async def chat(user_input: UserInput):
+    # The session cannot be evicted (or, with a shared backend, changed by another worker)
+    # mid-turn and is re-measured and saved once the turn is done
+    async with user_sessions.in_use(user_input.session_id):
+        return await chat_turn(user_input)
+
+async def chat_turn(user_input: UserInput):
+    session_id = user_input.session_id
+    answer = (user_input.answer or "").strip()
+    llm_metrics.current_session.set(session_id)
+
+    # A session lost to a restart or eviction picks up its saved itinerary and goes on editing
+    if session_id not in user_sessions:
+        saved = await session_rehydrate.load_result(session_id)
+        if saved is not None and session_id not in user_sessions:
+            user_sessions[session_id] = resume_session(saved)
+
+    # Step 1: Greeting
+    if session_id not in user_sessions:
+        user_sessions[session_id] = new_session()
+        greeting = (
+            "Hey there! Ready to plan your next adventure?\n"
+            "I'm your travel buddy, here to help you find the perfect trip. Just a few quick questions and we'll get you moving!"
+        )
+        return {
+            "next_question": greeting,
+            "options": ["Explore Destinations", "Plan a Trip", "Travel Deals", "Track my bookings", "Report an Issue"]
+        }
+
+    session = user_sessions[session_id]
+    session["history"].append(answer)
+    
+    # Handle end chat options first
+    if session.get("result") and answer.lower() in ["looks good, proceed to booking", "save and arrange a call back"]:
+        session["show_followup"] = False
+        return {"done": True, "message": "Thank you for using Easy Trip! Your itinerary is ready.", "result": session["result"]}
+    
+    # Handle "I Need more changes" option
+    if session.get("result") and answer.lower() == "i need more changes":
+        session["show_followup"] = False
+        return {"next_question": "What would you like to change in your itinerary?"}
+    
+    # Check if we need to show follow-up question after result display
+    if session.get("show_followup"):
+        session["show_followup"] = False
+        return {"next_question": "Ready to take off or still tweaking the route?", "options": FOLLOWUP_OPTIONS}
+    
+    # Check if this is an update request for existing plan
+    if session.get("result") and answer.lower() not in ["i need more changes", "looks good, proceed to booking", "save and arrange a call back"]:
+        # User has a plan and is making an update request - handle it directly
+        current_result = session["result"]
+        cities = current_result.get("cities", [])
+        if not cities or "recommendations" not in cities[0]:
+            return {"next_question": "No recommendations found in your current plan to update."}
+        recommendations = cities[0]["recommendations"]
+        destination = cities[0].get("city_name", "Unknown")
+        itinerary = session_itinerary(session)
+        
+        # Handle clarification responses for pending additions FIRST
+        if session.get("pending_addition"):
+            pending_add = session["pending_addition"]
+            selected_place = pending_add["selected_place"]
+            item_type = pending_add["item_type"]
+            
+            if "Replace" in answer:
+                # Extract the place name from the answer (e.g., "Replace Island Style (Lunch on Day 2)" or "Replace Waikiki Beach on Day 1")
+                import re
+                match = re.search(r'Replace (.+?)(?:\s*\(|\s*on|$)', answer)
+                target_place = match.group(1) if match else ""
+                
+                # Handle hotel replacement differently
+                if item_type == "hotel":
+                    # Get hotel details for the selected place
+                    try:
+                        hotel_detail_json = await fetch_hotel_details(selected_place, destination)
+                    except:
+                        hotel_detail_json = {
+                            "name": selected_place, 
+                            "address": f"{selected_place} Address", 
+                            "latitude": 0.0, 
+                            "longitude": 0.0,
+                            "check_in": "03:00 PM",
+                            "check_out": "11:00 AM",
+                            "why_recommended": f"{selected_place} offers excellent accommodation."
+                        }
+                    
+                    # Replace hotel in the cities array
+                    if "cities" in current_result and current_result["cities"]:
+                        new_hotel_name = hotel_detail_json.get("name", selected_place)
+                        new_hotel_address = hotel_detail_json.get("address", f"{selected_place} Address")
+                        new_hotel_lat = hotel_detail_json.get("latitude", 0.0)
+                        new_hotel_lon = hotel_detail_json.get("longitude", 0.0)
+                        
+                        new_hotel = {
+                            "name": new_hotel_name,
+                            "address": new_hotel_address,
+                            "latitude": new_hotel_lat,
+                            "longitude": new_hotel_lon,
+                            "check_in": hotel_detail_json.get("check_in", "03:00 PM"),
+                            "check_out": hotel_detail_json.get("check_out", "11:00 AM"),
+                            "why_recommended": hotel_detail_json.get("why_recommended", f"{selected_place} offers excellent accommodation.")
+                        }
+                        
+                        # Check-in/out, returns, transfers and mentions of the old hotel follow the swap
+                        itinerary.set_hotel(new_hotel)
+                    
+                    session["pending_addition"] = None
+                    recompute_travel(current_result)
+                    session["result"] = current_result
+                    try:
+                        await save_result(current_result)
+                    except Exception as e:
+                        print("Cosmos DB save error:", e)
+                    return {"done": True, "feedback": [f"Perfect! Hotel changed to {selected_place}!"], "result": current_result, "options": FOLLOWUP_OPTIONS}
+                
+                else:
+                    # Handle activity/meal replacement
+                    # Get comprehensive details for the selected place
+                    try:
+                        detail_json = await fetch_place_details(selected_place, destination)
+                    except:
+                        detail_json = {"name": selected_place, "highlights": f"{selected_place} offers great experience.", "why_recommended": f"{selected_place} is highly recommended."}
+                    
+                    # Find and replace the specific place mentioned in the answer
+                    target = itinerary.find(target_place)
+                    if target is not None:
+                        # Preserve exact JSON structure
+                        apply_place_details(target, detail_json, selected_place)
+                        itinerary.reindex(target)
+                    
+                    session["pending_addition"] = None
+                    recompute_travel(current_result)
+                    session["result"] = current_result
+                    try:
+                        await save_result(current_result)
+                    except Exception as e:
+                        print("Cosmos DB save error:", e)
+                    return {"done": True, "feedback": [f"Perfect! Replaced with {selected_place}!"], "result": current_result, "options": FOLLOWUP_OPTIONS}
+        
+        # A change that names both sides is applied right away; the replacement's fields are fetched concurrently
+        if not session.get("pending_suggestion") and not session.get("pending_addition") and is_edit_command(answer, itinerary):
+            return await apply_edit_commands(session, answer)
+        
+        # Check if user wants suggestions
+        suggestion_keywords = ["suggest", "recommend", "alternative", "instead", "different", "other", "replace", "change", "don't want", "not interested", "skip", "avoid", "hate", "dislike", "add some", "add other", "add another"]
+        wants_suggestions = any(keyword in answer.lower() for keyword in suggestion_keywords) or "?" in answer or len(answer.split()) > 3
+        
+        if wants_suggestions and not session.get("pending_suggestion"):
+            digest = itinerary_digest.build_digest(itinerary)
+            # Known places close to where the change goes; the model picks and ranks among them
+            hotel = cities[0].get("hotel")
+            guessed_type, guessed_activity = guess_suggestion_target(answer, recommendations)
+            planned = itinerary.names()
+            nearby = nearby_places(destination, guessed_type, suggestion_anchors(recommendations, hotel, guessed_activity), exclude=planned, k=8)
+            nearby_block = ""
+            if len(nearby) >= 5:
+                nearby_block = " (prefer these known places near that part of the itinerary, closest first, when they fit the request: " + "; ".join(
+                    f"{place['name']} ({place['distance_km']} km)" for place in nearby
+                ) + ")"
+            suggestion_prompt = f"""
+User request: "{answer}"
+Destination: {destination}
+Current itinerary (one row per activity):
+{digest}
+
+Analyze the user's request:
+1. If they mention a SPECIFIC place from the itinerary to replace (like "replace Hau Tree Lanai" or "instead of Eggs 'n Things"), put that row's ID (e.g. "A12") in current_item_id
+2. If they make a GENERAL request (like "add mexican restaurant", "add some activity", "suggest breakfast place"), leave current_item_id as empty string
+3. IMPORTANT: Determine if this is food-related, activity-related, or hotel-related:
+   - FOOD keywords: restaurant, food, eat, dining, meal, breakfast, lunch, dinner, cuisine, vegetarian, vegan, cafe, bar, snack
+   - ACTIVITY keywords: activity, attraction, sightseeing, tour, museum, beach, park, shopping, adventure
+   - HOTEL keywords: hotel, accommodation, stay, resort, lodge, inn, different hotel, another hotel, other hotel, new hotel
+4. For FOOD requests: item_type should be "breakfast", "lunch", or "dinner" (choose the most appropriate meal time)
+5. For ACTIVITY requests: item_type should be "activity"
+6. For HOTEL requests: item_type MUST be "hotel" (if user mentions hotel, accommodation, stay, resort, etc.)
+7. Provide 5 real place suggestions{nearby_block}
+
+Return JSON: {{"understood_request": "what user wants", "current_item_id": "ID from the itinerary table OR empty string", "item_type": "breakfast/lunch/dinner/activity/hotel", "suggestions": ["Place1", "Place2", "Place3", "Place4", "Place5"], "reasoning": "why these fit"}}
+"""
+            
+            try:
+                suggestion_resp = await llm_gateway.complete(
+                    step="suggestion",
+                    messages=[
+                        {"role": "system", "content": "You are an intelligent travel assistant. Provide real place names."},
+                        {"role": "user", "content": suggestion_prompt}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+                suggestion_json = json.loads(suggestion_resp)
+                current_activity = itinerary_digest.resolve(itinerary, suggestion_json.get("current_item_id"))
+                suggestion_json["current_item"] = current_activity.get("name", "") if current_activity else ""
+                suggestion_json["current_item_id"] = itinerary.id_of(current_activity) if current_activity else None
+                # Kept so "different suggestions" can search around the same spot
+                suggestion_json["anchors"] = [list(a) for a in suggestion_anchors(recommendations, hotel, current_activity)]
+                
+                session["pending_suggestion"] = suggestion_json
+                understood = suggestion_json.get("understood_request", "your request")
+                suggestions = suggestion_json.get("suggestions", [])
+                
+                return {
+                    "next_question": f"{understood}. Here are some great alternatives:",
+                    "options": suggestions + ["Keep current plan", "Ask for different suggestions"]
+                }
+            except:
+                return {"next_question": "Could you tell me more specifically what you'd like to change?"}
+        
+        # Handle selection from suggestions
+        if session.get("pending_suggestion"):
+            pending = session["pending_suggestion"]
+            if answer == "Keep current plan":
+                session["pending_suggestion"] = None
+                return {"next_question": "Your plan remains unchanged. Anything else?", "options": FOLLOWUP_OPTIONS}
+            elif answer == "Ask for different suggestions":
+                item_type = pending.get("item_type") or "activity"
+                try:
+                    new_suggestions = await different_suggestions(pending, itinerary, destination)
+                except Exception as e:
+                    print("Suggestion refresh error:", e)
+                    return {"next_question": "Let me know what specific type of place you're looking for and I'll suggest alternatives!"}
+                pending["suggestions"] = new_suggestions
+                return {
+                    "next_question": f"Here are some different {item_type} options for you:",
+                    "options": new_suggestions + ["Keep current plan", "Ask for different suggestions"]
+                }
+            elif answer in pending.get("suggestions", []):
+                selected_place = answer
+                current_item = pending.get("current_item", "")
+                item_type = pending.get("item_type", "")
+                
+                print(f"DEBUG: current_item='{current_item}', item_type='{item_type}', selected_place='{selected_place}'")
+                
+                # Check if we have a specific item to replace
+                if current_item and current_item.strip():
+                    # Direct replacement - we know what to replace
+                    target = pending_target(itinerary, pending)
+                    try:
+                        detail_json = await fetch_place_details(selected_place, destination)
+                        
+                        # Update activity preserving exact JSON structure
+                        if target is not None:
+                            apply_place_details(target, detail_json, selected_place)
+                    except:
+                        if target is not None:
+                            target["name"] = selected_place
+                    if target is not None:
+                        itinerary.reindex(target)
+                    
+                    session["pending_suggestion"] = None
+                    recompute_travel(current_result)
+                    session["result"] = current_result
+                    try:
+                        await save_result(current_result)
+                    except Exception as e:
+                        print("Cosmos DB save error:", e)
+                    return {"done": True, "feedback": [f"Updated with {selected_place}!"], "result": current_result, "options": FOLLOWUP_OPTIONS}
+                
+                else:
+                    # No specific item to replace - need clarification
+                    session["pending_addition"] = {
+                        "selected_place": selected_place,
+                        "item_type": item_type
+                    }
+                    session["pending_suggestion"] = None
+                    
+                    # Generate comprehensive clarifying options - HOTEL FIRST
+                    if item_type == "hotel":
+                        # For hotels, directly replace without asking for clarification
+                        try:
+                            hotel_detail_json = await fetch_hotel_details(selected_place, destination)
+                        except:
+                            hotel_detail_json = {
+                                "name": selected_place, 
+                                "address": f"{selected_place} Address", 
+                                "latitude": 0.0, 
+                                "longitude": 0.0,
+                                "check_in": "03:00 PM",
+                                "check_out": "11:00 AM",
+                                "why_recommended": f"{selected_place} offers excellent accommodation."
+                            }
+                        
+                        # Replace hotel in the cities array
+                        if "cities" in current_result and current_result["cities"]:
+                            new_hotel_name = hotel_detail_json.get("name", selected_place)
+                            new_hotel_address = hotel_detail_json.get("address", f"{selected_place} Address")
+                            new_hotel_lat = hotel_detail_json.get("latitude", 0.0)
+                            new_hotel_lon = hotel_detail_json.get("longitude", 0.0)
+                            
+                            new_hotel = {
+                                "name": new_hotel_name,
+                                "address": new_hotel_address,
+                                "latitude": new_hotel_lat,
+                                "longitude": new_hotel_lon,
+                                "check_in": hotel_detail_json.get("check_in", "03:00 PM"),
+                                "check_out": hotel_detail_json.get("check_out", "11:00 AM"),
+                                "why_recommended": hotel_detail_json.get("why_recommended", f"{selected_place} offers excellent accommodation.")
+                            }
+                            
+                            # Check-in/out, returns, transfers and mentions of the old hotel follow the swap
+                            itinerary.set_hotel(new_hotel)
+                        
+                        session["pending_addition"] = None
+                        recompute_travel(current_result)
+                        session["result"] = current_result
+                        try:
+                            await save_result(current_result)
+                        except Exception as e:
+                            print("Cosmos DB save error:", e)
+                        return {"done": True, "feedback": [f"Perfect! Hotel changed to {selected_place}!"], "result": current_result, "options": FOLLOWUP_OPTIONS}
+                    elif item_type in ["breakfast", "lunch", "dinner"]:
+                        # Show all meal options across all days
+                        meal_options = []
+                        for day in recommendations:
+                            for activity in day["activities"]:
+                                if activity.get("meal"):
+                                    meal_options.append(f"Replace {activity['name']} ({activity['meal']} on {day['day']})")
+                        
+                        return {
+                            "next_question": f"Where would you like to add {selected_place}?",
+                            "options": meal_options
+                        }
+                    
+                    else:
+                        # For activities, show all non-meal activities
+                        activity_options = []
+                        for day in recommendations:
+                            for activity in day["activities"]:
+                                if not activity.get("meal") and activity.get("action") not in ["Arrival", "Transfer", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"]:
+                                    activity_options.append(f"Replace {activity['name']} on {day['day']}")
+                        
+                        return {
+                            "next_question": f"Which activity would you like to replace with {selected_place}?",
+                            "options": activity_options
+                        }
+        
+
+        
+        if session.get("pending_suggestion") or session.get("pending_addition"):
+            return {"next_question": "Could you rephrase what you'd like to change?"}
+        # Anything else is a direct command such as "remove X" or "regenerate day 2"
+        return await apply_edit_commands(session, answer)
+
+    # Step 2: Handle option selection
+    if session["mode"] is None:
+        if "plan a trip" in answer.lower():
+            session["mode"] = "plan_trip"
+            session["step"] = "travel_vibe"
+            return {
+                "next_question": "First things first, What's your travel vibe? Solo or traveling with company?",
+                "options": ["Bro-cation", "Queens on Tour", "Love Escape", "Work & Wander", "Bonding Break", "Freedom Trip"]
+            }
+        elif "explore destinations" in answer.lower():
+            session["mode"] = "destinations"
+            return {"next_question": "Sure! Tell me which destinations you're interested in and I can share details."}
+        elif "travel deals" in answer.lower():
+            session["mode"] = "deals"
+            return {"next_question": "Great! I'll help you find the best travel deals. What type of deals are you looking for?"}
+        elif "track my bookings" in answer.lower():
+            session["mode"] = "tracking"
+            return {"next_question": "I'll help you track your bookings. Please provide your booking reference number."}
+        elif "report an issue" in answer.lower():
+            session["mode"] = "support"
+            return {"next_question": "I'm here to help! Please describe the issue you're experiencing."}
+        else:
+            return {"next_question": "Please select one of the available options."}
+
+    # New conversation flow
+    if session["step"] == "travel_vibe":
+        session["travel_vibe"] = answer
+        session["step"] = "scene_preferences"
+        # Generate dynamic response
+        dynamic_response = response_bank.pick("travel_vibe", answer)
+        if dynamic_response is None:
+            try:
+                response_resp = await llm_gateway.complete(
+                    step="travel_vibe_ack",
+                    messages=[
+                        {"role": "system", "content": "You are Laura, an enthusiastic travel assistant."},
+                        {"role": "user", "content": f"User selected '{answer}' as their travel vibe. Generate one enthusiastic sentence acknowledging this choice."}
+                    ]
+                )
+                dynamic_response = response_resp.strip()
+            except:
+                dynamic_response = f"Awesome! {answer} sounds amazing!"
+        
+        return {
+            "next_question": "Tap everything that gets your heart racing or your soul relaxing. I'll craft a trip that fits your vibe perfectly!\nYour Kind of Scene",
+            "options": ["🏖️ Beach", "🏔️ Mountains", "🏙️ City Life", "🌲 Nature & Forests", "🏜️ Desert", "❄️ Snow & Ski", "🏛️ Historical Sites", "Continue"]
+        }
+    
+
+    
+    elif session["step"] == "manual_destination":
+        # Parse origin and destination from user input
+        session["step"] = "movie_description"
+        
+        # Extract origin and destination from user input
+        parts = answer.lower().split(' to ')
+        if len(parts) == 2:
+            session["origin"] = parts[0].strip().title()
+            session["destination"] = parts[1].strip().title()
+        else:
+            # Try other patterns like "from X to Y"
+            words = answer.split()
+            if 'from' in answer.lower() and 'to' in answer.lower():
+                from_idx = next(i for i, word in enumerate(words) if word.lower() == 'from')
+                to_idx = next(i for i, word in enumerate(words) if word.lower() == 'to')
+                session["origin"] = ' '.join(words[from_idx+1:to_idx]).title()
+                session["destination"] = ' '.join(words[to_idx+1:]).title()
+            else:
+                # If no clear origin-destination pattern, assume destination only and ask for origin
+                session["destination"] = answer.title()
+                session["step"] = "origin_input"
+                return {
+                    "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
+                }
+        
+        # Generate movie description based on all preferences
+        movie_word = await describe_trip(session)
+        
+        session["movie_description"] = movie_word
+        session["step"] = "ready_to_generate"
+        prefetch_itinerary(session_id, session)
+        
+        return {
+            "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
+            "options": ["Generate your personalized itinerary", "Keep editing"]
+        }
+    
+    elif session["step"] == "ai_destination":
+        # Check if user selected from suggestions or typed their own
+        if answer in session.get("suggested_destinations", []):
+            # User selected a suggested destination
+            session["destination"] = answer
+            session["step"] = "origin_input"
+            return {
+                "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
+            }
+        elif answer.lower() == "choose an option (or type your own):":
+            return {
+                "next_question": "Please type your preferred destination:"
+            }
+        else:
+            # User typed their own destination
+            session["destination"] = answer.title()
+            session["step"] = "origin_input"
+            return {
+                "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
+            }
+    
+    elif session["step"] == "origin_input":
+        session["origin"] = answer.title()
+        session["step"] = "movie_description"
+        
+        # Generate movie description based on all preferences
+        movie_word = await describe_trip(session)
+        
+        session["movie_description"] = movie_word
+        session["step"] = "ready_to_generate"
+        prefetch_itinerary(session_id, session)
+        
+        return {
+            "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
+            "options": ["Generate your personalized itinerary", "Keep editing"]
+        }
+    
+    elif session["step"] == "scene_preferences":
+        # Handle multiple selections (comma-separated like "1,2,8" or "Continue")
+        if answer.lower() == "continue" or "8" in answer or "continue" in answer.lower():
+            # Move to next step
+            session["step"] = "trip_goals"
+            # Generate dynamic trip goals based on scene preferences
+            scene_preferences = list(session["scene_preferences"])
+            trip_goals = await speculation.take(session_id, "trip_goals", tuple(scene_preferences))
+            if trip_goals is None:
+                trip_goals = await generate_trip_goals(scene_preferences)
+            
+            return {
+                "next_question": "Trip Goals & Fun Stuff:",
+                "options": trip_goals + ["Continue"]
+            }
+        else:
+            # Parse multiple selections (e.g., "1,2,3" or single selection)
+            scene_options = ["🏖️ Beach", "🏔️ Mountains", "🏙️ City Life", "🌲 Nature & Forests", "🏜️ Desert", "❄️ Snow & Ski", "🏛️ Historical Sites"]
+            
+            # Handle comma-separated input
+            if "," in answer:
+                selections = [s.strip() for s in answer.split(",")]
+                for sel in selections:
+                    if sel.isdigit():
+                        idx = int(sel) - 1
+                        if 0 <= idx < len(scene_options):
+                            option = scene_options[idx]
+                            if option not in session["scene_preferences"]:
+                                session["scene_preferences"].append(option)
+            else:
+                # Single selection
+                if answer.isdigit():
+                    idx = int(answer) - 1
+                    if 0 <= idx < len(scene_options):
+                        option = scene_options[idx]
+                        if option not in session["scene_preferences"]:
+                            session["scene_preferences"].append(option)
+                elif answer not in session["scene_preferences"] and answer in scene_options:
+                    session["scene_preferences"].append(answer)
+            
+            # Trip goals only depend on the scenes, so start on them while the user keeps picking
+            scene_preferences = list(session["scene_preferences"])
+            if scene_preferences:
+                speculation.start(session_id, "trip_goals", tuple(scene_preferences), lambda: generate_trip_goals(scene_preferences))
+            
+            return {
+                "next_question": f"Selected: {', '.join(session['scene_preferences'])}. Choose more or continue:",
+                "options": scene_options + ["Continue"]
+            }
+    
+    elif session["step"] == "trip_goals":
+        # Handle multiple selections for trip goals (comma-separated like "1,2,9" or "Continue")
+        if answer.lower() == "continue" or "9" in answer or "continue" in answer.lower():
+            # Move to next step
+            session["step"] = "accommodation"
+            return {
+                "next_question": "Stay in Style or Explore?",
+                "options": ["🏨 Luxury Hotel", "🏡 Homestay", "🛖 Eco Lodge", "🏥️ Camping", "🛌️ Budget Stay", "🏰 Unique Stays (castles, treehouses, etc.)"]
+            }
+        else:
+            # Parse multiple selections (e.g., "1,2,3" or single selection)
+            goal_options = ["🍽️ Food & Culinary", "🛍️ Shopping", "🎭 Culture & Museums", "🎶 Music & Festivals", "🏙️ City Tours", "🍸 Nightlife & Bars", "🚶 Walking Tours", "🖼️ Art Galleries"]
+            
+            # Handle comma-separated input
+            if "," in answer:
+                selections = [s.strip() for s in answer.split(",")]
+                for sel in selections:
+                    if sel.isdigit():
+                        idx = int(sel) - 1
+                        if 0 <= idx < len(goal_options):
+                            option = goal_options[idx]
+                            if option not in session["trip_goals"]:
+                                session["trip_goals"].append(option)
+            else:
+                # Single selection
+                if answer.isdigit():
+                    idx = int(answer) - 1
+                    if 0 <= idx < len(goal_options):
+                        option = goal_options[idx]
+                        if option not in session["trip_goals"]:
+                            session["trip_goals"].append(option)
+                elif answer not in session["trip_goals"] and answer in goal_options:
+                    session["trip_goals"].append(answer)
+            
+            return {
+                "next_question": f"Selected: {', '.join(session['trip_goals'])}. Choose more or continue:",
+                "options": goal_options + ["Continue"]
+            }
+    
+    elif session["step"] == "accommodation":
+        session["accommodation_type"] = answer
+        session["step"] = "destination_choice"
+        
+        return {
+            "next_question": "Got a destination in mind or you want me to pick for you?"
+        }
+    
+    elif session["step"] == "destination_choice":
+        user_input = answer.lower().strip()
+        suggestion_keywords = ["no", "suggest", "recommend", "pick for me", "pick me one", "choose for me", "don't know", "help me choose", "you pick", "surprise me"]
+        wants_suggestions = any(keyword in user_input for keyword in suggestion_keywords)
+        
+        if wants_suggestions:
+            session["step"] = "ai_destination"
+            try:
+                dest_resp = await llm_gateway.complete(
+                    step="destination_suggestions",
+                    messages=[
+                        {"role": "system", "content": "You are a travel assistant. Suggest only destinations within the United States."},
+                        {"role": "user", "content": f"Based on travel vibe '{session['travel_vibe']}', suggest 5 popular US destinations. Return only destination names."}
+                    ]
+                )
+                destinations_text = dest_resp.strip()
+                destinations = []
+                for dest in destinations_text.split('\n'):
+                    if dest.strip():
+                        clean_dest = dest.strip()
+                        clean_dest = re.sub(r'^\d+\.\s*', '', clean_dest)
+                        clean_dest = re.sub(r'^\d+\)\s*', '', clean_dest)
+                        clean_dest = clean_dest.replace('- ', '').replace('• ', '')
+                        if clean_dest:
+                            destinations.append(clean_dest)
+                destinations = destinations[:5]
+            except:
+                destinations = ["Las Vegas, Nevada", "Miami, Florida", "New Orleans, Louisiana", "Austin, Texas", "Nashville, Tennessee"]
+            
+            session["suggested_destinations"] = destinations
+            return {
+                "next_question": "Here are some amazing US destinations perfect for your vibe! Pick one that calls to you:",
+                "options": destinations
+            }
+        else:
+            # Use AI to parse any dynamic user input
+            parse_prompt = f"""
+User said: "{answer}"
+
+Analyze this input and extract travel information. The user might mention:
+- Origin city/location (where they're traveling FROM)
+- Destination city/location (where they're traveling TO)
+- Duration (like "2 days", "1 week")
+- Any other travel details
+
+Return JSON format:
+{{
+  "has_origin": true/false,
+  "has_destination": true/false,
+  "origin": "city name or empty string",
+  "destination": "city name or empty string",
+  "interpretation": "what the user meant"
+}}
 
-        response = client.chat.completions.create(
-            model=deployment_name,
-            messages=[
-                {"role": "system", "content": "You are a helpful travel assistant."},
-                {"role": "user", "content": plan_prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+Examples:
+- "bengaluru to hawaii for 2 days" → {{"has_origin": true, "has_destination": true, "origin": "Bengaluru", "destination": "Hawaii", "interpretation": "User wants to travel from Bengaluru to Hawaii"}}
+- "I want to visit Paris" → {{"has_origin": false, "has_destination": true, "origin": "", "destination": "Paris", "interpretation": "User wants to visit Paris but didn't mention origin"}}
+- "Going to New York from Mumbai" → {{"has_origin": true, "has_destination": true, "origin": "Mumbai", "destination": "New York", "interpretation": "User wants to travel from Mumbai to New York"}}
+"""
+            
+            try:
+                parse_resp = await llm_gateway.complete(
+                    step="destination_parse",
+                    messages=[
+                        {"role": "system", "content": "You are an intelligent travel input parser. Extract origin and destination from any user input."},
+                        {"role": "user", "content": parse_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    cache=True
+                )
+                parse_json = json.loads(parse_resp)
+                
+                has_origin = parse_json.get("has_origin", False)
+                has_destination = parse_json.get("has_destination", False)
+                origin_found = parse_json.get("origin", "").strip()
+                destination_found = parse_json.get("destination", "").strip()
+                
+                if has_origin and has_destination and origin_found and destination_found:
+                    # Both origin and destination provided
+                    session["origin"] = origin_found.title()
+                    session["destination"] = destination_found.title()
+                    
+                    movie_word = await describe_trip(session)
+                    
+                    session["movie_description"] = movie_word
+                    session["step"] = "ready_to_generate"
+                    prefetch_itinerary(session_id, session)
+                    
+                    return {
+                        "next_question": "Wow! Your trip ideas sound great. Shall I go ahead and generate an itinerary for you?",
+                        "options": ["Generate your personalized itinerary", "Keep editing"]
+                    }
+                elif has_destination and destination_found:
+                    # Only destination provided, ask for origin
+                    session["destination"] = destination_found.title()
+                    session["step"] = "origin_input"
+                    return {
+                        "next_question": f"Excellent choice! {destination_found} is going to be amazing! Where are you traveling from?"
+                    }
+                else:
+                    # Couldn't parse clearly, ask for clarification
+                    return {
+                        "next_question": "I'd love to help you plan your trip! Could you tell me your starting point and destination? For example: 'from Mumbai to Dubai' or 'Chennai to Singapore'"
+                    }
+            except:
+                # Fallback to treating entire input as destination
+                session["destination"] = answer.title()
+                session["step"] = "origin_input"
+                return {
+                    "next_question": f"Excellent choice! {answer} is going to be amazing! Where are you traveling from?"
+                }
+    
+    user_choice = answer.lower()
+    
+    # Handle Keep editing flow
+    if session["step"] == "ready_to_generate" and "keep editing" in user_choice:
+        session["waiting_for_answer"] = True
+        # Ask a clarifying question
+        clarify_prompt = f"""
+The user's travel preferences so far:
+Travel Vibe: {session.get('travel_vibe', 'Not specified')}
+Origin: {session.get('origin', 'Not specified')}
+Destination: {session.get('destination', 'Not specified')}
+Scene Preferences: {', '.join(session.get('scene_preferences', []))}
+Trip Goals: {', '.join(session.get('trip_goals', []))}
+Accommodation: {session.get('accommodation_type', 'Not specified')}
 
-        raw_content = response.choices[0].message.content
+Ask ONE more clarifying question about their trip to refine their preferences.
+Make it conversational and friendly.
+"""
         try:
-            result_json = json.loads(raw_content)
-        except Exception:
-            return {"done": False, "error": "Invalid JSON from AI", "raw": raw_content}
-
-        # Add summary section with counts only
-        summary = {
-            "counts": {
-                "flights": 0,
-                "transfers": 0,
-                "hotels": 0,
-                "activities": 0,
-                "meals": 0
-            }
-        }
-        
-        # Count inter-city travel (flights)
-        if "inter_city_travel" in result_json:
-            summary["counts"]["flights"] = len(result_json["inter_city_travel"])
+            clarify_resp = await llm_gateway.complete(
+                step="clarify",
+                messages=[
+                    {"role": "system", "content": "You are Laura, a helpful travel assistant."},
+                    {"role": "user", "content": clarify_prompt}
+                ]
+            )
+            next_q = clarify_resp.strip()
+        except:
+            next_q = "Tell me more about what you're looking for in this trip!"
         
-        # Count hotels, activities, meals, transfers from cities
-        if "cities" in result_json:
-            for city in result_json["cities"]:
-                # Count hotels
-                if "hotel" in city:
-                    summary["counts"]["hotels"] += 1
-                
-                # Count activities, meals, transfers from recommendations
-                if "recommendations" in city:
-                    for day in city["recommendations"]:
-                        if "activities" in day:
-                            for activity in day["activities"]:
-                                action = activity.get("action", "")
-                                name = activity.get("name", "")
-                                
-                                if action == "Transfer" or "transfer" in name.lower():
-                                    summary["counts"]["transfers"] += 1
-                                elif activity.get("meal") or action in ["Breakfast", "Lunch", "Dinner"]:
-                                    summary["counts"]["meals"] += 1
-                                elif action not in ["Arrival", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"]:
-                                    summary["counts"]["activities"] += 1
+        return {"next_question": next_q}
+    
+    # Handle user's answer to the clarifying question
+    elif session.get("waiting_for_answer"):
+        session["waiting_for_answer"] = False
+        # Generate dynamic response to user's answer
+        try:
+            response_resp = await llm_gateway.complete(
+                step="answer_ack",
+                messages=[
+                    {"role": "system", "content": "You are Laura, an enthusiastic travel assistant."},
+                    {"role": "user", "content": f"User answered: '{answer}'. Generate one enthusiastic sentence acknowledging their response."}
+                ]
+            )
+            dynamic_response = response_resp.strip()
+        except:
+            dynamic_response = "Great! That helps me understand your preferences better!"
         
-        result_json["summary"] = summary
+        # The answer may change the plan inputs, which replaces any stale prefetch
+        prefetch_itinerary(session_id, session)
+        return {
+            "next_question": dynamic_response,
+            "options": ["Generate your personalized itinerary", "Keep editing"]
+        }
+
+    # ✅ Generate Persona + Itinerary
+    if user_choice in GENERATE_CHOICES:
+        session["ready"] = True
+        result_json = await speculation.take(session_id, "itinerary", plan_key(session))
+        if result_json is None:
+            try:
+                result_json = await generate_itinerary(session)
+            except InvalidPlanError as e:
+                return {"done": False, "error": "Invalid JSON from AI", "raw": e.raw}
+            except Exception as e:
+                print("Itinerary generation error:", e)
+                return {"done": False, "error": "Itinerary generation failed"}
+
+        itinerary = itinerary_model.Itinerary(result_json)
+        result_json["summary"] = itinerary.summary()
         final_result = finalize_result(result_json, session_id)
         session["result"] = final_result
+        session["itinerary"] = itinerary
 
         try:
-            cosmos_helper.save_result(final_result)
+            await save_result(final_result)
         except Exception as e:
             print("Cosmos DB error:", e)
 
         # Set flag to show follow-up question after result is displayed
         session["show_followup"] = True
-        return {"done": True, "feedback": [], "result": final_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
+        return {"done": True, "feedback": [], "result": final_result, "options": FOLLOWUP_OPTIONS}
 
     # ✅ Ask Another Question (legacy support)
     if user_choice in ["2", "ask another", "ask another question", "add more preferences", "preferences", "more preferences"]:
@@ -1327,14 +1544,14 @@ Accommodation: {session.get('accommodation_type', 'Not specified')}
 Ask ONE more clarifying question about their trip.
 Make it conversational and friendly.
 """
-        clarify_resp = client.chat.completions.create(
-            model=deployment_name,
+        clarify_resp = await llm_gateway.complete(
+            step="clarify",
             messages=[
                 {"role": "system", "content": "You are a helpful travel assistant."},
                 {"role": "user", "content": clarify_prompt}
             ]
         )
-        next_q = clarify_resp.choices[0].message.content.strip()
+        next_q = clarify_resp.strip()
         if session["asked_another"]:
             session["asked_another"] = False
             return {"next_question": next_q}
@@ -1348,14 +1565,13 @@ Make it conversational and friendly.
     # Handle the actual update request after user enters text
     if session.get("result") and answer.lower() not in ["i need more changes", "looks good, proceed to booking", "save and arrange a call back"]:
         current_result = session["result"]
-        updated = False
-        feedback_msgs = []
  
         # --- Make sure we work inside cities[0]["recommendations"] ---
         cities = current_result.get("cities", [])
         if not cities or "recommendations" not in cities[0]:
             return {"next_question": "No recommendations found in your current plan to update."}
         recommendations = cities[0]["recommendations"]
+        itinerary = session_itinerary(session)
         
         # Enhanced intelligent suggestion system - handles any natural language request
         suggestion_keywords = ["suggest", "recommend", "alternative", "instead", "different", "other", "replace", "change", "don't want", "not interested", "skip", "avoid", "hate", "dislike"]
@@ -1405,15 +1621,17 @@ Make it conversational and friendly.
                 }
             else:
                 # Enhanced AI analysis of user request
+                digest = itinerary_digest.build_digest(itinerary)
                 suggestion_prompt = f"""
 User request: "{answer}"
 Destination: {destination}
-Current itinerary: {json.dumps(recommendations, indent=2)}
+Current itinerary (one row per activity):
+{digest}
 
 Analyze the user's natural language request and:
 1. Understand what they want to change/replace/avoid
 2. Identify the type of place (breakfast, lunch, dinner, activity, attraction, hotel, etc.)
-3. Find the specific current item they're referring to (if any)
+3. Find the specific current item they're referring to (if any) and use its ID from the itinerary table
 4. Generate 5 contextual alternatives of the same type in {destination}
 
 CRITICAL: The suggestions array must contain ONLY simple restaurant/place names as strings. Do NOT include addresses, descriptions, or any other data.
@@ -1427,7 +1645,7 @@ Example of WRONG format (do not do this):
 Return JSON format:
 {{
   "understood_request": "Clear description of what user wants",
-  "current_item": "Exact place name from itinerary if mentioned, otherwise empty string",
+  "current_item_id": "ID of the itinerary row if mentioned (e.g. \"A12\"), otherwise empty string",
   "item_type": "breakfast/lunch/dinner/activity/attraction/hotel",
   "suggestions": ["Place Name 1", "Place Name 2", "Place Name 3", "Place Name 4", "Place Name 5"],
   "reasoning": "Why these suggestions fit their request"
@@ -1435,15 +1653,15 @@ Return JSON format:
 """
             
             try:
-                suggestion_resp = client.chat.completions.create(
-                    model=deployment_name,
+                suggestion_resp = await llm_gateway.complete(
+                    step="suggestion",
                     messages=[
                         {"role": "system", "content": "You are an intelligent travel assistant that understands natural language requests and provides contextual suggestions. Always provide real, specific place names in the destination city."},
                         {"role": "user", "content": suggestion_prompt}
                     ],
                     response_format={"type": "json_object"}
                 )
-                suggestion_json = json.loads(suggestion_resp.choices[0].message.content)
+                suggestion_json = json.loads(suggestion_resp)
                 
                 # Ensure suggestions are simple strings
                 suggestions = suggestion_json.get("suggestions", [])
@@ -1465,16 +1683,17 @@ Return JSON format:
                 clean_suggestions = [s for s in clean_suggestions if s and s.strip()]
                 
                 # Store suggestion context for next interaction
-                current_item_detected = suggestion_json.get("current_item", "")
-                # If current_item is empty, None, or generic, treat as no specific item
-                if not current_item_detected or current_item_detected.lower() in ["none", "not identified", "unknown", "n/a", "not specified", "general request"]:
-                    current_item_detected = ""
+                # Unknown or generic IDs resolve to nothing, which means no specific item
+                current_activity = itinerary_digest.resolve(itinerary, suggestion_json.get("current_item_id"))
+                current_item_detected = current_activity.get("name", "") if current_activity else ""
                 
                 session["pending_suggestion"] = {
                     "current_item": current_item_detected,
+                    "current_item_id": itinerary.id_of(current_activity) if current_activity else None,
                     "item_type": suggestion_json.get("item_type", ""),
                     "suggestions": clean_suggestions,
-                    "reasoning": suggestion_json.get("reasoning", "")
+                    "reasoning": suggestion_json.get("reasoning", ""),
+                    "anchors": [list(a) for a in suggestion_anchors(recommendations, cities[0].get("hotel"), current_activity)]
                 }
                 
                 print(f"DEBUG SUGGESTION: item_type='{suggestion_json.get('item_type', '')}', understood='{suggestion_json.get('understood_request', '')}'")
@@ -1503,32 +1722,14 @@ Return JSON format:
             
             if answer == "Keep current plan":
                 session["pending_suggestion"] = None
-                return {"next_question": "No problem! Your current plan remains unchanged. Anything else you'd like to update?", "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
+                return {"next_question": "No problem! Your current plan remains unchanged. Anything else you'd like to update?", "options": FOLLOWUP_OPTIONS}
             
             elif answer == "Ask for different suggestions":
                 # Generate new suggestions of the same type
                 destination = cities[0].get("city_name", "Unknown")
                 item_type = pending.get("item_type", "activity")
-                
-                new_suggestion_prompt = f"""
-Generate 5 different {item_type} suggestions in {destination} that are completely different from these previous suggestions: {pending.get('suggestions', [])}
-
-Return JSON format:
-{{
-  "suggestions": ["New Place 1", "New Place 2", "New Place 3", "New Place 4", "New Place 5"]
-}}
-"""
                 try:
-                    new_resp = client.chat.completions.create(
-                        model=deployment_name,
-                        messages=[
-                            {"role": "system", "content": "You provide diverse travel suggestions."},
-                            {"role": "user", "content": new_suggestion_prompt}
-                        ],
-                        response_format={"type": "json_object"}
-                    )
-                    new_json = json.loads(new_resp.choices[0].message.content)
-                    new_suggestions = new_json.get("suggestions", [])
+                    new_suggestions = await different_suggestions(pending, itinerary, destination)
                     
                     # Update pending suggestions
                     session["pending_suggestion"]["suggestions"] = new_suggestions
@@ -1552,52 +1753,27 @@ Return JSON format:
                 # Check if we have a specific item to replace
                 if current_item and current_item.strip():
                     # Direct replacement - we know what to replace
-                    detail_prompt = f"""
-Find complete details for {selected_place} in {destination}:
-Return JSON: {{"name": "Official name", "address": "Complete address", "latitude": 0.0, "longitude": 0.0, "highlights": "Detailed description", "why_recommended": "Specific reasons", "carry": "Practical items", "rating": 4.5, "reviews": {{"Review 1": "text", "Review 2": "text"}}}}
-"""
-                    
+                    target = pending_target(itinerary, pending)
                     try:
-                        detail_resp = client.chat.completions.create(
-                            model=deployment_name,
-                            messages=[{"role": "system", "content": "Provide real travel information."}, {"role": "user", "content": detail_prompt}],
-                            response_format={"type": "json_object"}
-                        )
-                        detail_json = json.loads(detail_resp.choices[0].message.content)
+                        detail_json = await fetch_place_details(selected_place, destination)
                         
                         # Update activity preserving exact JSON structure
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if current_item.lower() in activity.get("name", "").lower():
-                                    activity["name"] = detail_json.get("name", selected_place)
-                                    activity["address"] = detail_json.get("address", activity.get("address", "Address not available"))
-                                    activity["latitude"] = detail_json.get("latitude", activity.get("latitude", 0.0))
-                                    activity["longitude"] = detail_json.get("longitude", activity.get("longitude", 0.0))
-                                    if "highlights" in activity:
-                                        activity["highlights"] = detail_json.get("highlights", activity["highlights"])
-                                    if "why_recommended" in activity:
-                                        activity["why_recommended"] = detail_json.get("why_recommended", activity["why_recommended"])
-                                    if "carry" in activity:
-                                        activity["carry"] = detail_json.get("carry", activity["carry"])
-                                    if "rating" in activity:
-                                        activity["rating"] = detail_json.get("rating", activity["rating"])
-                                    if "reviews" in activity:
-                                        activity["reviews"] = detail_json.get("reviews", activity["reviews"])
-                                    break
+                        if target is not None:
+                            apply_place_details(target, detail_json, selected_place)
                     except:
-                        for day in recommendations:
-                            for activity in day["activities"]:
-                                if current_item.lower() in activity.get("name", "").lower():
-                                    activity["name"] = selected_place
-                                    break
+                        if target is not None:
+                            target["name"] = selected_place
+                    if target is not None:
+                        itinerary.reindex(target)
                     
                     session["pending_suggestion"] = None
+                    recompute_travel(current_result)
                     session["result"] = current_result
                     try:
-                        cosmos_helper.save_result(current_result)
+                        await save_result(current_result)
                     except Exception as e:
                         print("Cosmos DB save error:", e)
-                    return {"done": True, "feedback": [f"Updated with {selected_place}!"], "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
+                    return {"done": True, "feedback": [f"Updated with {selected_place}!"], "result": current_result, "options": FOLLOWUP_OPTIONS}
                 
                 else:
                     # No specific item to replace - need clarification
@@ -1650,11 +1826,24 @@ Return JSON: {{"name": "Official name", "address": "Complete address", "latitude
                             "next_question": f"Which activity would you like to replace with {selected_place}?",
                             "options": activity_options
                         }
-                
-        
-        else:
-            # Original intent parsing for direct commands
-            intent_prompt = f"""
+
+        # Direct commands such as "remove X" or "regenerate day 2"
+        return await apply_edit_commands(session, answer)
+
+
+async def apply_edit_commands(session, answer):
+    """
+    Parse a direct edit command ("remove X", "add Y", "regenerate day 2") into actions,
+    apply them to the session's plan and save it.
+    """
+    current_result = session["result"]
+    updated = False
+    feedback_msgs = []
+    recommendations = current_result["cities"][0]["recommendations"]
+    itinerary = session_itinerary(session)
+
+    # Original intent parsing for direct commands
+    intent_prompt = f"""
 You are an intent parser for a travel itinerary assistant.
 The user said: "{answer}".
 Return a JSON object with a list of actions. Each action must be one of:
@@ -1667,59 +1856,56 @@ Rules:
 - If no clear action, return {{ "actions": [] }}.
 Return valid JSON only.
 """
-            try:
-                intent_resp = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=[
-                        {"role": "system", "content": "You are a precise intent-to-JSON parser."},
-                        {"role": "user", "content": intent_prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                actions_json = json.loads(intent_resp.choices[0].message.content)
-                actions = actions_json.get("actions", [])
-            except Exception as e:
-                print("Intent parsing error:", e)
-                actions = []
+    try:
+        intent_resp = await llm_gateway.complete(
+            step="intent",
+            messages=[
+                {"role": "system", "content": "You are a precise intent-to-JSON parser."},
+                {"role": "user", "content": intent_prompt}
+            ],
+            response_format={"type": "json_object"},
+            cache=True
+        )
+        actions_json = json.loads(intent_resp)
+        actions = actions_json.get("actions", [])
+    except Exception as e:
+        print("Intent parsing error:", e)
+        actions = []
 
-        # --- Track removed positions and activities for replacements ---
-        removed_positions = []
-        removed_activities = []
-        
-        # --- Apply all actions ---
-        for act in actions:
-            if act["action"] == "remove":
-                target = act["activity"].lower()
-                for day_idx, day in enumerate(recommendations):
-                    for act_idx, activity in enumerate(day["activities"]):
-                        if target in activity.get("name", "").lower():
-                            removed_positions.append((day_idx, act_idx))
-                            removed_activities.append(activity.copy())
-                            day["activities"].pop(act_idx)
-                            updated = True
-                            feedback_msgs.append(f"Okay, I've removed {act['activity']} from your plan ✂️")
-                            break
-            elif act["action"] == "add":
-                name = act["activity"]
-                addr_hint = act.get("address", "")
-                # Extract destination from user's travel history
-                destination = "Unknown"
-                for msg in session['history']:
-                    if any(place in msg.lower() for place in ['hawaii', 'new york', 'paris', 'london', 'tokyo', 'dubai', 'singapore', 'bangkok', 'mumbai', 'delhi', 'goa', 'kerala', 'rajasthan', 'agra', 'jaipur', 'udaipur']):
-                        # Extract likely destination
-                        words = msg.split()
-                        for i, word in enumerate(words):
-                            if word.lower() in ['to', 'in', 'visiting', 'going']:
-                                if i + 1 < len(words):
-                                    destination = words[i + 1].title()
-                                    break
-                        if destination == "Unknown":
-                            for word in words:
-                                if word.lower() in ['hawaii', 'newyork', 'paris', 'london', 'tokyo', 'dubai', 'singapore', 'bangkok', 'mumbai', 'delhi', 'goa', 'kerala', 'rajasthan', 'agra', 'jaipur', 'udaipur']:
-                                    destination = word.title()
-                                    break
-                        break
-                
+    # --- Track removed positions and activities for replacements ---
+    removed_positions = []
+    removed_activities = []
+    hydration_latency = []
+    
+    # --- Apply all actions ---
+    for act in actions:
+        if act["action"] == "remove":
+            target = itinerary.find(act["activity"])
+            if target is not None:
+                _, day_idx, act_idx = itinerary.locate(target)
+                removed_positions.append((day_idx, act_idx))
+                removed_activities.append(target.copy())
+                itinerary.remove(day_idx, act_idx)
+                updated = True
+                feedback_msgs.append(f"Okay, I've removed {act['activity']} from your plan ✂️")
+        elif act["action"] == "add":
+            name = act["activity"]
+            addr_hint = act.get("address", "")
+            # First known city in the session destination or the user's messages
+            destination = session.get("destination") or "Unknown"
+            for msg in [session.get("destination") or ""] + session['history']:
+                city = gazetteer.gazetteer.find_city(msg)
+                if city:
+                    destination = city["name"]
+                    break
+            
+            latency = {}
+            add_started = time.perf_counter()
+            place = gazetteer.gazetteer.lookup(name, city=destination) if gazetteer.GAZETTEER_ENABLED else None
+            if place:
+                name, address, lat, lon = place["name"], place["address"], place["latitude"], place["longitude"]
+                latency["geocode"] = round((time.perf_counter() - add_started) * 1000, 1)
+            else:
                 # 🔹 Ask Azure OpenAI to find real place in destination city
                 geo_prompt = f"""
 You are a travel assistant with knowledge of places worldwide.
@@ -1727,258 +1913,291 @@ Find a real, specific, highly-rated {name} in {destination}.
 Do not create generic names - find an actual establishment that exists.
 Return JSON only in this format:
 {{
-  "name": "Actual restaurant/place name",
-  "address": "Full address in {destination}",
-  "latitude": 12.34,
-  "longitude": 56.78
+"name": "Actual restaurant/place name",
+"address": "Full address in {destination}",
+"latitude": 12.34,
+"longitude": 56.78
 }}
 Example: If user asks for "Mexican restaurant" in Hawaii, find a real Mexican restaurant like "Frida's Mexican Beach House" with its actual address.
 """
                 try:
-                    geo_resp = client.chat.completions.create(
-                        model=deployment_name,
+                    geo_resp = await timed("geocode", llm_gateway.complete(
+                        step="geo",
                         messages=[
                             {"role": "system", "content": "You are a precise place geocoder."},
                             {"role": "user", "content": geo_prompt}
                         ],
-                        response_format={"type": "json_object"}
-                    )
-                    geo_json = json.loads(geo_resp.choices[0].message.content)
+                        response_format={"type": "json_object"},
+                        cache=True
+                    ), latency)
+                    geo_json = json.loads(geo_resp)
                     name = geo_json.get("name", name)  # Use real place name if found
                     address = geo_json.get("address", addr_hint or "Unknown")
                     lat = geo_json.get("latitude", 0.0)
                     lon = geo_json.get("longitude", 0.0)
+                    # Grow the gazetteer so the next request for this place stays local
+                    gazetteer.gazetteer.remember(name, address, lat, lon, city=destination, aliases=[act["activity"]])
                 except Exception as e:
                     print("Geocoding via AI failed:", e)
                     address, lat, lon = addr_hint or "Unknown", 0.0, 0.0
+            
+            # Insert at removed position if available, otherwise append
+            if removed_positions:
+                day_idx, act_idx = removed_positions.pop(0)
+                removed_activity = removed_activities.pop(0)
                 
-                # Insert at removed position if available, otherwise append
-                if removed_positions:
-                    day_idx, act_idx = removed_positions.pop(0)
-                    removed_activity = removed_activities.pop(0)
-                    
-                    # Get previous activity for distance calculation
-                    prev_activity = recommendations[day_idx]["activities"][act_idx-1] if act_idx > 0 else None
-                    
-                    # Calculate distance and time from previous location
-                    if prev_activity and prev_activity.get("latitude") and prev_activity.get("longitude"):
-                        distance_calc_prompt = f"""
-Calculate travel distance and time between:
-From: {prev_activity.get('name', 'Previous location')} at {prev_activity.get('latitude')}, {prev_activity.get('longitude')}
-To: {name} at {lat}, {lon}
-Return JSON: {{"distance": "X km", "time": "X mins by taxi"}}
-"""
-                        try:
-                            calc_resp = client.chat.completions.create(
-                                model=deployment_name,
-                                messages=[
-                                    {"role": "system", "content": "You are a travel distance calculator."},
-                                    {"role": "user", "content": distance_calc_prompt}
-                                ],
-                                response_format={"type": "json_object"}
-                            )
-                            calc_json = json.loads(calc_resp.choices[0].message.content)
-                            travel_distance = calc_json.get("distance", "2 km")
-                            travel_time = calc_json.get("time", "10 mins by taxi")
-                        except:
-                            travel_distance = "2 km"
-                            travel_time = "10 mins by taxi"
+                # Descriptive fields only depend on the geocoded place, so fetch them all at once
+                pending = {}
+                for key in removed_activity.keys():
+                    if key in ACTIVITY_FIELD_GENERATORS:
+                        pending[key] = ACTIVITY_FIELD_GENERATORS[key](name)
+                hydrated = dict(zip(pending.keys(), await asyncio.gather(
+                    *(timed(label, coro, latency) for label, coro in pending.items())
+                )))
+                
+                # Placeholders until recompute_travel() runs over the whole plan before saving
+                travel_distance = removed_activity.get("travel_distance_from_previous", "2 km")
+                travel_time = removed_activity.get("travel_time_from_previous", "10 mins by taxi")
+                
+                # Create new activity with exact same field order as removed one
+                new_activity = {}
+                for key in removed_activity.keys():
+                    if key == "name":
+                        new_activity[key] = name
+                    elif key == "address":
+                        new_activity[key] = address
+                    elif key == "latitude":
+                        new_activity[key] = lat
+                    elif key == "longitude":
+                        new_activity[key] = lon
+                    elif key == "travel_distance_from_previous":
+                        new_activity[key] = travel_distance
+                    elif key == "travel_time_from_previous":
+                        new_activity[key] = travel_time
+                    elif key in hydrated:
+                        new_activity[key] = hydrated[key]
                     else:
-                        travel_distance = removed_activity.get("travel_distance_from_previous", "2 km")
-                        travel_time = removed_activity.get("travel_time_from_previous", "10 mins by taxi")
-                    
-                    # Create new activity with exact same field order as removed one
-                    new_activity = {}
-                    for key in removed_activity.keys():
-                        if key == "name":
-                            new_activity[key] = name
-                        elif key == "address":
-                            new_activity[key] = address
-                        elif key == "latitude":
-                            new_activity[key] = lat
-                        elif key == "longitude":
-                            new_activity[key] = lon
-                        elif key == "travel_distance_from_previous":
-                            new_activity[key] = travel_distance
-                        elif key == "travel_time_from_previous":
-                            new_activity[key] = travel_time
-                        elif key == "highlights":
-                            highlight_prompt = f"Write exactly 2-3 sentences about {name} describing what makes it special and what visitors can do there. Keep it concise and similar to this style: 'Waimea Bay is famous for its breathtaking beauty and excellent swimming and surfing spots. The crystal-clear waters and scenic surroundings provide an exhilarating backdrop for sunbathing or enjoying water activities.'"
-                            try:
-                                highlight_resp = client.chat.completions.create(
-                                    model=deployment_name,
-                                    messages=[
-                                        {"role": "system", "content": "You are a concise travel writer."},
-                                        {"role": "user", "content": highlight_prompt}
-                                    ]
-                                )
-                                new_activity[key] = highlight_resp.choices[0].message.content.strip()
-                            except:
-                                new_activity[key] = f"{name} offers unique attractions and scenic views for visitors to enjoy."
-                        elif key == "carry":
-                            carry_prompt = f"List 2-4 essential items to carry when visiting {name}. Keep it short like 'Swimsuit, towel, refreshments.' or 'Camera, comfortable shoes, water bottle.'"
-                            try:
-                                carry_resp = client.chat.completions.create(
-                                    model=deployment_name,
-                                    messages=[
-                                        {"role": "system", "content": "You are a concise travel advisor."},
-                                        {"role": "user", "content": carry_prompt}
-                                    ]
-                                )
-                                new_activity[key] = carry_resp.choices[0].message.content.strip()
-                            except:
-                                new_activity[key] = "Camera, comfortable shoes, water bottle."
-                        elif key == "why_recommended":
-                            why_prompt = f"Write 1-2 short sentences explaining why {name} is recommended. Keep it concise like 'A must-visit for authentic Hawaiian food. It's budget-friendly and loved by locals.'"
-                            try:
-                                why_resp = client.chat.completions.create(
-                                    model=deployment_name,
-                                    messages=[
-                                        {"role": "system", "content": "You are a travel recommendation expert."},
-                                        {"role": "user", "content": why_prompt}
-                                    ]
-                                )
-                                new_activity[key] = why_resp.choices[0].message.content.strip()
-                            except:
-                                new_activity[key] = "A popular destination loved by travelers."
-                        elif key == "reviews":
-                            review_prompt = f"Write 5 realistic, natural human reviews for {name}. Make them sound like real travelers who actually experienced this place - include specific details, emotions, personal stories, and varied writing styles. Each review should feel authentic and different. Format as: Review 1: [text] | Review 2: [text] | Review 3: [text] | Review 4: [text] | Review 5: [text]"
-                            try:
-                                review_resp = client.chat.completions.create(
-                                    model=deployment_name,
-                                    messages=[
-                                        {"role": "system", "content": "You are a travel review generator. Write authentic, varied reviews that sound like real people who have personally experienced the place. Include specific details, emotions, and personal touches."},
-                                        {"role": "user", "content": review_prompt}
-                                    ]
-                                )
-                                review_text = review_resp.choices[0].message.content.strip()
-                                reviews = review_text.split(" | ")
-                                if len(reviews) >= 5:
-                                    new_activity[key] = {
-                                        "Review 1": reviews[0].replace("Review 1: ", ""),
-                                        "Review 2": reviews[1].replace("Review 2: ", ""),
-                                        "Review 3": reviews[2].replace("Review 3: ", ""),
-                                        "Review 4": reviews[3].replace("Review 4: ", ""),
-                                        "Review 5": reviews[4].replace("Review 5: ", "")
-                                    }
-                                else:
-                                    new_activity[key] = {
-                                        "Review 1": f"Had an amazing time at {name}! The experience exceeded my expectations.",
-                                        "Review 2": "Definitely worth visiting. Great atmosphere and friendly staff.",
-                                        "Review 3": "Perfect spot for travelers. Loved every moment here!",
-                                        "Review 4": "Highly recommend this place. Great value and service.",
-                                        "Review 5": "One of the highlights of my trip. Will definitely come back!"
-                                    }
-                            except:
-                                new_activity[key] = {
-                                    "Review 1": f"Had an amazing time at {name}! The experience exceeded my expectations.",
-                                    "Review 2": "Definitely worth visiting. Great atmosphere and friendly staff.",
-                                    "Review 3": "Perfect spot for travelers. Loved every moment here!",
-                                    "Review 4": "Highly recommend this place. Great value and service.",
-                                    "Review 5": "One of the highlights of my trip. Will definitely come back!"
-                                }
-                        else:
-                            new_activity[key] = removed_activity[key]
-                    
-                    recommendations[day_idx]["activities"].insert(act_idx, new_activity)
-                    feedback_msgs.append(f"Perfect! I've replaced the removed activity with {name} 🔄")
-                else:
-                    # For new additions, use similar structure to existing activities
-                    prev_activity = recommendations[-1]["activities"][-1] if recommendations and recommendations[-1]["activities"] else None
-                    
-                    new_activity = {
-                        "time": "2:00 PM",
-                        "name": name,
-                        "address": address,
-                        "latitude": lat,
-                        "longitude": lon,
-                        "travel_distance_from_previous": "3 km",
-                        "travel_time_from_previous": "15 mins by taxi",
-                        "highlights": f"Explore {name} and enjoy its unique attractions and scenic views.",
-                        "carry": "Camera, comfortable shoes, water bottle",
-                        "why_recommended": "A popular destination loved by travelers.",
-                        "rating": 4.5,
-                        "reviews": {
-                            "Review 1": f"Had an amazing time at {name}! The experience exceeded my expectations.",
-                            "Review 2": "Definitely worth visiting. Great atmosphere and friendly staff.",
-                            "Review 3": "Perfect spot for travelers. Loved every moment here!",
-                            "Review 4": "Highly recommend this place. Great value and service.",
-                            "Review 5": "One of the highlights of my trip. Will definitely come back!"
-                        }
-                    }
-                    
-                    if recommendations:
-                        recommendations[-1]["activities"].append(new_activity)
-                        feedback_msgs.append(f"Got it! I've added {name} to your plan 🗺️")
-                updated = True
-            elif act["action"] == "regenerate":
-                day_str = act["day"]
-                regen_prompt = f"Regenerate a new plan for {day_str} for: {' '.join(session['history'])}.\nInclude full address, latitude, longitude, travel distance and travel time for each activity."
-                try:
-                    regen_resp = client.chat.completions.create(
-                        model=deployment_name,
-                        messages=[
-                            {"role": "system", "content": "You are a helpful travel assistant."},
-                            {"role": "user", "content": regen_prompt}
-                        ],
-                        response_format={"type": "json_object"}
-                    )
-                    regen_json = json.loads(regen_resp.choices[0].message.content)
-                    if regen_json.get("recommendations"):
-                        idx = int(re.findall(r'\d+', day_str)[0]) - 1
-                        if 0 <= idx < len(recommendations):
-                            recommendations[idx] = regen_json["recommendations"][0]
-                            updated = True
-                            feedback_msgs.append(f"Sure! I've refreshed {day_str} with new ideas 🔄")
-                except Exception as e:
-                    feedback_msgs.append(f"Sorry, I couldn't regenerate {day_str}: {e}")
-        
-        # --- Save updates or fallback ---
-        if updated:
-            # Regenerate summary after updates
-            summary = {
-                "counts": {
-                    "flights": 0,
-                    "transfers": 0,
-                    "hotels": 0,
-                    "activities": 0,
-                    "meals": 0
+                        new_activity[key] = removed_activity[key]
+                
+                latency["total"] = round((time.perf_counter() - add_started) * 1000, 1)
+                hydration_latency.append({"activity": name, "latency_ms": latency})
+                itinerary.insert(day_idx, act_idx, new_activity)
+                feedback_msgs.append(f"Perfect! I've replaced the removed activity with {name} 🔄")
+            else:
+                # For new additions, use similar structure to existing activities
+                new_activity = {
+                    "time": "2:00 PM",
+                    "name": name,
+                    "address": address,
+                    "latitude": lat,
+                    "longitude": lon,
+                    "travel_distance_from_previous": "3 km",
+                    "travel_time_from_previous": "15 mins by taxi",
+                    "highlights": f"Explore {name} and enjoy its unique attractions and scenic views.",
+                    "carry": "Camera, comfortable shoes, water bottle",
+                    "why_recommended": "A popular destination loved by travelers.",
+                    "rating": 4.5,
+                    "reviews": default_reviews(name)
                 }
-            }
-            
-            # Count inter-city travel (flights)
-            if "inter_city_travel" in current_result:
-                summary["counts"]["flights"] = len(current_result["inter_city_travel"])
-            
-            # Count hotels, activities, meals, transfers from cities
-            if "cities" in current_result:
-                for city in current_result["cities"]:
-                    # Count hotels
-                    if "hotel" in city:
-                        summary["counts"]["hotels"] += 1
-                    
-                    # Count activities, meals, transfers from recommendations
-                    if "recommendations" in city:
-                        for day in city["recommendations"]:
-                            if "activities" in day:
-                                for activity in day["activities"]:
-                                    action = activity.get("action", "")
-                                    name = activity.get("name", "")
-                                    
-                                    if action == "Transfer" or "transfer" in name.lower():
-                                        summary["counts"]["transfers"] += 1
-                                    elif activity.get("meal") or action in ["Breakfast", "Lunch", "Dinner"]:
-                                        summary["counts"]["meals"] += 1
-                                    elif action not in ["Arrival", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"]:
-                                        summary["counts"]["activities"] += 1
-            
-            current_result["summary"] = summary
-            session["result"] = current_result
+                
+                if recommendations:
+                    itinerary.append(len(recommendations) - 1, new_activity)
+                    feedback_msgs.append(f"Got it! I've added {name} to your plan 🗺️")
+            updated = True
+        elif act["action"] == "regenerate":
+            day_str = act["day"]
+            regen_prompt = f"Regenerate a new plan for {day_str} for: {' '.join(session['history'])}.\nInclude full address, latitude, longitude, travel distance and travel time for each activity."
             try:
-                cosmos_helper.save_result(current_result)
+                regen_resp = await llm_gateway.complete(
+                    step="day_regenerate",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful travel assistant."},
+                        {"role": "user", "content": regen_prompt}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+                regen_json = json.loads(regen_resp)
+                if regen_json.get("recommendations"):
+                    idx = int(re.findall(r'\d+', day_str)[0]) - 1
+                    if 0 <= idx < len(recommendations):
+                        itinerary.replace_day(idx, regen_json["recommendations"][0])
+                        updated = True
+                        feedback_msgs.append(f"Sure! I've refreshed {day_str} with new ideas 🔄")
             except Exception as e:
-                print("Cosmos DB save error:", e)
-            return {"done": True, "feedback": feedback_msgs, "result": current_result, "options": ["I Need more changes", "Looks Good, Proceed to booking", "Save and arrange a call back"]}
-        else:
-            return {"next_question": "I couldn't understand your request. Could you rephrase what to update in your plan?"}
+                feedback_msgs.append(f"Sorry, I couldn't regenerate {day_str}: {e}")
+    
+    # --- Save updates or fallback ---
+    if updated:
+        # Regenerate summary after updates
+        recompute_travel(current_result)
+        current_result["summary"] = itinerary.summary()
+        session["result"] = current_result
+        try:
+            await save_result(current_result)
+        except Exception as e:
+            print("Cosmos DB save error:", e)
+        response = {"done": True, "feedback": feedback_msgs, "result": current_result, "options": FOLLOWUP_OPTIONS}
+        if hydration_latency:
+            response["metadata"] = {"replacements": hydration_latency}
+        return response
+    else:
+        return {"next_question": "I couldn't understand your request. Could you rephrase what to update in your plan?"}
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_event(path, value):
+    # Map a closed JSON path of the plan document to a client event
+    if path == ("persona",):
+        return "persona", {"persona": value}
+    if len(path) == 2 and path[0] == "inter_city_travel":
+        return "inter_city_travel", {"index": path[1], "data": value}
+    if len(path) == 3 and path[0] == "cities" and path[2] == "hotel":
+        return "hotel", {"city": path[1], "data": value}
+    if len(path) == 4 and path[0] == "cities" and path[2] == "recommendations":
+        # Activities were already sent one by one, so only the day header goes out here
+        day = {k: v for k, v in value.items() if k != "activities"}
+        day["activity_count"] = len(value.get("activities", []))
+        return "day", {"city": path[1], "day": path[3], "data": day}
+    if len(path) == 6 and path[0] == "cities" and path[2] == "recommendations" and path[4] == "activities":
+        return "activity", {"city": path[1], "day": path[3], "index": path[5], "data": value}
+    return None
+
+def is_stream_path(path):
+    return stream_event(path, {}) is not None
+
+def plan_paths(result_json):
+    # A finished plan as the (path, value) pairs it would have streamed, in document order
+    yield ("persona",), result_json.get("persona", "")
+    for leg_idx, leg in enumerate(result_json.get("inter_city_travel", [])):
+        yield ("inter_city_travel", leg_idx), leg
+    for city_idx, city in enumerate(result_json.get("cities", [])):
+        if "hotel" in city:
+            yield ("cities", city_idx, "hotel"), city["hotel"]
+        for day_idx, day in enumerate(city.get("recommendations", [])):
+            for act_idx, activity in enumerate(day.get("activities", [])):
+                yield ("cities", city_idx, "recommendations", day_idx, "activities", act_idx), activity
+            yield ("cities", city_idx, "recommendations", day_idx), day
 
+async def plan_stream(session_id, session):
+    """
+    The itinerary as (path, value) pairs as each piece completes, from the same engine
+    as generate_itinerary(). The last pair is ((), whole plan). A plan prefetched for
+    these preferences is replayed instead of generated again.
+    """
+    prefetched = await speculation.take(session_id, "itinerary", plan_key(session))
+    if prefetched is not None:
+        for path, value in plan_paths(prefetched):
+            yield path, value
+        yield (), prefetched
+        return
+
+    if ITINERARY_ENGINE == "parallel":
+        async for path, value in itinerary_engine.stream(session, extract_days(" ".join(session["history"]))):
+            if path == () and not value["cities"]:
+                raise InvalidPlanError("")
+            yield path, value
+        return
+
+    parser = json_stream.JsonStreamParser(is_stream_path)
+    chunks = []
+    async for delta in llm_gateway.stream(
+        step="plan",
+        messages=[
+            {"role": "system", "content": "You are a helpful travel assistant."},
+            {"role": "user", "content": build_plan_prompt(session)}
+        ],
+        response_format={"type": "json_object"}
+    ):
+        chunks.append(delta)
+        for path, value in parser.feed(delta):
+            yield path, value
+    raw_content = "".join(chunks)
+    try:
+        result_json = json.loads(raw_content)
+    except ValueError:
+        raise InvalidPlanError(raw_content)
+    yield (), result_json
+
+async def stream_itinerary(session_id, session):
+    llm_metrics.current_session.set(session_id)
+    session["ready"] = True
+    result_json = None
+    try:
+        async for path, value in plan_stream(session_id, session):
+            if path == ():
+                result_json = value
+                continue
+            event, data = stream_event(path, value)
+            yield sse(event, data)
+    except InvalidPlanError as e:
+        yield sse("error", {"done": False, "error": "Invalid JSON from AI", "raw": e.raw})
+        return
+    except Exception as e:
+        print("Itinerary stream error:", e)
+        yield sse("error", {"done": False, "error": "Itinerary generation failed"})
+        return
+
+    itinerary = itinerary_model.Itinerary(result_json)
+    result_json["summary"] = itinerary.summary()
+    final_result = finalize_result(result_json, session_id)
+    session["result"] = final_result
+    session["itinerary"] = itinerary
+
+    saved = True
+    try:
+        await save_result(final_result)
+    except Exception as e:
+        saved = False
+        print("Cosmos DB error:", e)
+
+    session["show_followup"] = True
+    yield sse("done", {"done": True, "feedback": [], "session_id": session_id, "summary": final_result["summary"], "saved": saved, "options": FOLLOWUP_OPTIONS})
+
+def starts_generation(session, answer):
+    return bool(session and not session.get("result") and session["step"] == "ready_to_generate" and not session.get("waiting_for_answer") and answer.lower() in GENERATE_CHOICES)
+
+async def stream_turn(user_input):
+    # Streams outlive the handler, so they hold the session themselves
+    session_id = user_input.session_id
+    answer = (user_input.answer or "").strip()
+    try:
+        async with user_sessions.in_use(session_id):
+            session = user_sessions.get(session_id)
+            # Another turn or an eviction may have changed the session since chat_stream() looked
+            if not starts_generation(session, answer):
+                yield sse("message", await chat_turn(user_input))
+                return
+            session["history"].append(answer)
+            async for event in stream_itinerary(session_id, session):
+                yield event
+    except session_store.SessionBusy:
+        yield sse("error", {"done": False, "error": "Session is busy with another request"})
+
+@app.post("/chat/stream")
+async def chat_stream(user_input: UserInput):
+    """
+    Server-Sent Events variant of /chat. Itinerary generation streams persona, hotel,
+    inter_city_travel, activity and day events as soon as each one is complete,
+    followed by a final done event with the summary. With the parallel engine days
+    finish in any order; every event carries its city and day index. Any other turn is answered
+    with a single message event carrying the regular /chat response.
+    """
+    session_id = user_input.session_id
+    answer = (user_input.answer or "").strip()
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    llm_metrics.current_session.set(session_id)
+    async with user_sessions.in_use(session_id):
+        session = user_sessions.get(session_id)
+        generates = starts_generation(session, answer)
+
+    if generates:
+        return StreamingResponse(stream_turn(user_input), media_type="text/event-stream", headers=headers)
+
+    async def single_turn():
+        try:
+            yield sse("message", await chat(user_input))
+        except session_store.SessionBusy:
+            yield sse("error", {"done": False, "error": "Session is busy with another request"})
+    return StreamingResponse(single_turn(), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,203 @@
+# place_kb.py
+"""
+Knowledge base of fully described places, harvested from every saved itinerary.
+
+Each hotel, meal and sightseeing activity is stored once per city, deduplicated by
+normalized name plus coordinates, together with the details the model wrote for it
+(address, highlights, carry, rating, reviews). why_recommended is not kept: the plan
+prompt writes it for one traveler's vibe and goals. The replacement flows
+read details from here before asking the model. Entries older than KB_MAX_AGE_DAYS
+are treated as stale so that closed or changed places get refreshed.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from gazetteer import normalize
+load_dotenv()
+
+KB_ENABLED = os.getenv("PLACE_KB_ENABLED", "true").lower() in ("1", "true", "yes")
+DB_PATH = os.getenv("PLACE_KB_PATH", "place_kb.sqlite3")
+KB_MAX_AGE_DAYS = float(os.getenv("PLACE_KB_MAX_AGE_DAYS", "30"))
+# Two sightings of a name count as the same place within this many degrees (~500 m)
+SAME_PLACE_DEGREES = 0.005
+
+# Actions that describe movement or logistics rather than a place worth suggesting
+LOGISTICS_ACTIONS = {"Arrival", "Transfer", "Hotel Check-in", "Return to Hotel", "Hotel Check-out", "Departure"}
+DETAIL_FIELDS = ("highlights", "carry", "rating", "reviews", "check_in", "check_out")
+
+
+def category_of(activity):
+    # Meals are filed per meal so a dinner spot is not offered for breakfast
+    if activity.get("meal"):
+        return activity["meal"].strip().lower()
+    if activity.get("action") in LOGISTICS_ACTIONS:
+        return None
+    return "activity"
+
+
+def category_for(item_type):
+    """
+    Category for an item_type of the suggestion prompts (breakfast/lunch/dinner/activity/attraction/hotel).
+    """
+    item_type = (item_type or "").strip().lower()
+    return item_type if item_type in ("breakfast", "lunch", "dinner", "hotel") else "activity"
+
+
+def coordinates(place):
+    try:
+        lat, lon = float(place.get("latitude")), float(place.get("longitude"))
+    except (TypeError, ValueError):
+        return None
+    return None if lat == 0.0 and lon == 0.0 else (lat, lon)
+
+
+class PlaceKB:
+    def __init__(self, path, max_age_days):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self._local = threading.local()
+        self.counters = {"hits": 0, "stale": 0, "misses": 0, "ingested": 0, "merged": 0}
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS places ("
+            "id INTEGER PRIMARY KEY, city TEXT NOT NULL, norm TEXT NOT NULL, category TEXT NOT NULL, "
+            "name TEXT NOT NULL, address TEXT, latitude REAL NOT NULL, longitude REAL NOT NULL, "
+            "details TEXT NOT NULL, seen INTEGER NOT NULL, last_session TEXT, first_seen REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS places_name ON places(city, norm)")
+        conn.execute("CREATE INDEX IF NOT EXISTS places_category ON places(city, category, updated_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _upsert(self, conn, city, category, place, session_id, now):
+        coords = coordinates(place)
+        name = place.get("name")
+        if not name or coords is None:
+            return
+        details = {field: place[field] for field in DETAIL_FIELDS if place.get(field)}
+        norm = normalize(name)
+        existing = conn.execute(
+            "SELECT id, details FROM places WHERE city = ? AND norm = ? AND abs(latitude - ?) < ? AND abs(longitude - ?) < ?",
+            (city, norm, coords[0], SAME_PLACE_DEGREES, coords[1], SAME_PLACE_DEGREES)
+        ).fetchone()
+        if existing:
+            # Newer sightings refresh the fields they carry and keep the rest. Re-saves of the
+            # same plan after an edit do not count as another sighting.
+            merged = {**json.loads(existing["details"]), **details}
+            conn.execute(
+                "UPDATE places SET address = coalesce(?, address), details = ?, "
+                "seen = seen + (coalesce(last_session, '') != ?), last_session = ?, updated_at = ? WHERE id = ?",
+                (place.get("address"), json.dumps(merged, ensure_ascii=False), session_id, session_id, now, existing["id"])
+            )
+            self.counters["merged"] += 1
+        else:
+            conn.execute(
+                "INSERT INTO places (city, norm, category, name, address, latitude, longitude, details, seen, last_session, first_seen, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                (city, norm, category, name, place.get("address"), coords[0], coords[1],
+                 json.dumps(details, ensure_ascii=False), session_id, now, now)
+            )
+            self.counters["ingested"] += 1
+
+    def ingest(self, result_json):
+        """
+        Harvest every hotel, meal and activity of a saved itinerary in one transaction.
+        """
+        conn = self._conn()
+        now = time.time()
+        session_id = str(result_json.get("session_id") or "")
+        conn.execute("BEGIN")
+        try:
+            for city in result_json.get("cities", []):
+                city_key = normalize(city.get("city_name"))
+                if city.get("hotel"):
+                    self._upsert(conn, city_key, "hotel", city["hotel"], session_id, now)
+                for day in city.get("recommendations", []):
+                    for activity in day.get("activities", []):
+                        category = category_of(activity)
+                        if category:
+                            self._upsert(conn, city_key, category, activity, session_id, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _row_to_place(self, row):
+        # Rows written before a field was dropped from DETAIL_FIELDS may still carry it
+        details = json.loads(row["details"])
+        return {
+            "name": row["name"],
+            "address": row["address"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            **{field: details[field] for field in DETAIL_FIELDS if field in details}
+        }
+
+    def details(self, name, city, category=None, required=()):
+        """
+        Stored details for a place in the same shape the detail prompts return, or None
+        when the place is unknown, stale, or lacks any of the `required` fields.
+        """
+        clause, params = ("AND category = ?", [category]) if category else ("", [])
+        row = self._conn().execute(
+            f"SELECT * FROM places WHERE city = ? AND norm = ? {clause} ORDER BY seen DESC, updated_at DESC LIMIT 1",
+            (normalize(city), normalize(name), *params)
+        ).fetchone()
+        if row is None:
+            self.counters["misses"] += 1
+            return None
+        if time.time() - row["updated_at"] > self.max_age:
+            self.counters["stale"] += 1
+            return None
+        place = self._row_to_place(row)
+        if any(not place.get(field) for field in required):
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return place
+
+    def popular(self, city, category, exclude=(), limit=5):
+        """
+        Fresh places of a category in a city, most often seen first.
+        """
+        excluded = {normalize(name) for name in exclude}
+        rows = self._conn().execute(
+            "SELECT * FROM places WHERE city = ? AND category = ? AND updated_at > ? ORDER BY seen DESC, updated_at DESC LIMIT ?",
+            (normalize(city), category, time.time() - self.max_age, 4 * limit + len(excluded))
+        ).fetchall()
+        places = []
+        for row in rows:
+            if row["norm"] not in excluded:
+                excluded.add(row["norm"])
+                places.append(self._row_to_place(row))
+        return places[:limit]
+
+    def fresh_places(self):
+        """
+        (city, category, name, latitude, longitude) of every fresh place, for building the spatial index.
+        """
+        rows = self._conn().execute(
+            "SELECT city, category, name, latitude, longitude FROM places WHERE updated_at > ?",
+            (time.time() - self.max_age,)
+        )
+        for row in rows:
+            yield tuple(row)
+
+    def stats(self):
+        total = self._conn().execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        return {**self.counters, "enabled": KB_ENABLED, "places": total}
+
+
+kb = PlaceKB(DB_PATH, KB_MAX_AGE_DAYS)
@@ -0,0 +1,189 @@
+# response_bank.py
+"""
+Precomputed acknowledgement lines and movie-genre words for the fixed travel vibes,
+so the vibe and movie-description steps skip the LLM whenever the user picked a listed
+vibe. Lines rotate per key. Free-text answers return None and the caller falls back to
+the LLM. The clarifying-answer step only ever gets free text, so it has no entries.
+
+The bank ships with built-in defaults and is refreshed offline with:
+
+    python response_bank.py --refresh [--variants 6]
+
+which regenerates every entry through the LLM and writes RESPONSE_BANK_PATH.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import itertools
+from dotenv import load_dotenv
+load_dotenv()
+
+BANK_PATH = os.getenv("RESPONSE_BANK_PATH", "response_bank.json")
+BANK_ENABLED = os.getenv("RESPONSE_BANK", "true").lower() in ("1", "true", "yes")
+
+TRAVEL_VIBES = ["Bro-cation", "Queens on Tour", "Love Escape", "Work & Wander", "Bonding Break", "Freedom Trip"]
+
+DEFAULT_BANK = {
+    "travel_vibe": {
+        "Bro-cation": [
+            "Bro-cation it is, let's make this one legendary!",
+            "Love it! A Bro-cation means big days and even bigger stories.",
+            "Bro-cation locked in, time to plan some unforgettable moments with the crew!",
+            "Awesome pick! Nothing beats a Bro-cation with your best mates."
+        ],
+        "Queens on Tour": [
+            "Queens on Tour, this is going to be fabulous!",
+            "Yes, queens! Let's plan a trip worthy of your crown.",
+            "Queens on Tour it is, get ready for a trip full of sparkle and fun!",
+            "Love it! A girls' getaway packed with good vibes coming right up."
+        ],
+        "Love Escape": [
+            "A Love Escape, how romantic! Let's make it unforgettable.",
+            "Love Escape it is, time for sunsets, slow dinners and special moments!",
+            "Aww, a romantic getaway! I'll make sure it's magical.",
+            "Love Escape locked in, let's plan something the two of you will never forget."
+        ],
+        "Work & Wander": [
+            "Work & Wander, the perfect mix of productivity and adventure!",
+            "Love it! Let's balance the laptop hours with some amazing exploring.",
+            "Work & Wander it is, great wifi and even better weekends coming up!",
+            "Smart choice! Let's find spots that make both work and play easy."
+        ],
+        "Bonding Break": [
+            "A Bonding Break, let's create memories everyone will treasure!",
+            "Love it! Time together is the best kind of travel.",
+            "Bonding Break it is, let's plan something fun for the whole group!",
+            "Wonderful choice! Let's make this a trip full of shared moments."
+        ],
+        "Freedom Trip": [
+            "A Freedom Trip, the open road is calling!",
+            "Love it! Let's plan a trip where you set your own rhythm.",
+            "Freedom Trip it is, no rules, just great experiences!",
+            "Awesome! Let's make this trip all about doing things your way."
+        ]
+    },
+    "movie_genre": {
+        "Bro-cation": ["Hangover", "Adventure", "Rampage", "Legends"],
+        "Queens on Tour": ["Sparkle", "Glamour", "Escapade", "Fabulous"],
+        "Love Escape": ["Romance", "Serenade", "Honeymoon", "Starlight"],
+        "Work & Wander": ["Discovery", "Nomad", "Horizons", "Balance"],
+        "Bonding Break": ["Reunion", "Together", "Homecoming", "Adventure"],
+        "Freedom Trip": ["Escape", "Wanderlust", "Odyssey", "Freedom"]
+    }
+}
+
+counters = {"hits": 0, "misses": 0}
+
+
+def _load():
+    bank = {kind: {key: list(lines) for key, lines in entries.items()} for kind, entries in DEFAULT_BANK.items()}
+    if os.path.exists(BANK_PATH):
+        try:
+            with open(BANK_PATH, encoding="utf-8") as f:
+                refreshed = json.load(f)
+            for kind, entries in refreshed.items():
+                for key, lines in entries.items():
+                    if lines:
+                        bank.setdefault(kind, {})[key] = lines
+        except Exception as e:
+            print("Response bank load error:", e)
+    return bank
+
+
+_bank = _load()
+_rotations = {}
+
+
+def _normalize(choice):
+    return " ".join((choice or "").split()).lower()
+
+
+def _index():
+    return {kind: {_normalize(key): key for key in entries} for kind, entries in _bank.items()}
+
+
+_keys = _index()
+
+
+def pick(kind, choice):
+    """
+    Next line for a listed option, rotating through its variants. None for free text
+    (or when the bank is disabled) so the caller asks the LLM instead.
+    """
+    key = _keys.get(kind, {}).get(_normalize(choice)) if BANK_ENABLED else None
+    if key is None:
+        counters["misses"] += 1
+        return None
+    rotation = _rotations.get((kind, key))
+    if rotation is None:
+        rotation = _rotations[(kind, key)] = itertools.cycle(_bank[kind][key])
+    counters["hits"] += 1
+    return next(rotation)
+
+
+def stats():
+    return {**counters, "enabled": BANK_ENABLED, "entries": {kind: len(entries) for kind, entries in _bank.items()}}
+
+
+async def refresh(variants=4):
+    """
+    Regenerate every entry through the LLM and write BANK_PATH. Run offline, not in the server.
+    """
+    import llm_gateway
+
+    async def lines(kind, prompt, system, key):
+        results = []
+        for _ in range(variants * 2):
+            if len(results) >= variants:
+                break
+            text = (await llm_gateway.complete(
+                step=f"bank_{kind}",
+                messages=[{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+                cache=False
+            )).strip().replace('"', '')
+            if text and text not in results:
+                results.append(text)
+        return key, results
+
+    jobs = []
+    for vibe in TRAVEL_VIBES:
+        jobs.append(("travel_vibe", lines(
+            "travel_vibe",
+            f"User selected '{vibe}' as their travel vibe. Generate one enthusiastic sentence acknowledging this choice.",
+            "You are Laura, an enthusiastic travel assistant.",
+            vibe
+        )))
+        jobs.append(("movie_genre", lines(
+            "movie_genre",
+            f"Generate ONE word that describes a '{vibe}' trip like a movie genre/title. Examples: Hangover, Adventure, Romance, Discovery, Escape, etc.\nReturn only the single word.",
+            "Generate a single descriptive word for the trip.",
+            vibe
+        )))
+
+    bank = {}
+    results = await asyncio.gather(*(job for _, job in jobs), return_exceptions=True)
+    for (kind, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            print(f"Refresh of a {kind} entry failed:", result, file=sys.stderr)
+            continue
+        key, generated = result
+        if generated:
+            bank.setdefault(kind, {})[key] = generated
+    with open(BANK_PATH, "w", encoding="utf-8") as f:
+        json.dump(bank, f, indent=2, ensure_ascii=False)
+    return bank
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the precomputed response bank")
+    parser.add_argument("--refresh", action="store_true", help="regenerate every entry through the LLM")
+    parser.add_argument("--variants", type=int, default=4, help="lines to keep per option")
+    args = parser.parse_args()
+    if args.refresh:
+        refreshed = asyncio.run(refresh(args.variants))
+        print(f"Wrote {sum(len(v) for v in refreshed.values())} entries to {BANK_PATH}")
+    else:
+        print(json.dumps(stats(), indent=2))
@@ -0,0 +1,84 @@
+# session_rehydrate.py
+"""
+Loads a saved itinerary for a session_id the session store does not know, so a user
+whose session was lost to a restart or eviction can keep editing their plan.
+
+The Cosmos read is awaited on the shared async client, and concurrent requests for the
+same session share one read. Session IDs with nothing saved are remembered for
+REHYDRATE_MISS_TTL seconds so that new or bogus IDs cost one read, not one per request.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+import cosmos_async
+import write_behind
+from singleflight import SingleFlight
+load_dotenv()
+
+REHYDRATE_ENABLED = os.getenv("REHYDRATE_ENABLED", "true").lower() in ("1", "true", "yes")
+MISS_TTL = float(os.getenv("REHYDRATE_MISS_TTL", "600"))
+MISS_MAX = int(os.getenv("REHYDRATE_MISS_MAX", "100000"))
+
+# session_id -> time of the read that found nothing; oldest first
+_misses = OrderedDict()
+_flight = SingleFlight()
+counters = {"restored": 0, "misses": 0, "negative_hits": 0, "errors": 0}
+
+
+def _known_missing(session_id):
+    missed_at = _misses.get(session_id)
+    if missed_at is None:
+        return False
+    if time.time() - missed_at > MISS_TTL:
+        del _misses[session_id]
+        return False
+    return True
+
+
+def _remember_miss(session_id):
+    _misses[session_id] = time.time()
+    _misses.move_to_end(session_id)
+    while len(_misses) > MISS_MAX:
+        _misses.popitem(last=False)
+
+
+def forget_miss(session_id):
+    """
+    Call when a result is saved for a session, so an earlier miss does not hide it.
+    """
+    _misses.pop(session_id, None)
+
+
+async def load_result(session_id):
+    """
+    The saved itinerary document for a session, or None when there is none (or the read failed).
+    """
+    if not REHYDRATE_ENABLED or not session_id:
+        return None
+    # A save still waiting in the write-behind queue is newer than anything in Cosmos
+    queued = write_behind.queue.pending(session_id)
+    if queued is not None:
+        counters["restored"] += 1
+        return queued
+    if _known_missing(session_id):
+        counters["negative_hits"] += 1
+        return None
+    try:
+        result, _ = await _flight.do(session_id, lambda: cosmos_async.get_result(session_id))
+    except Exception as e:
+        # Not cached: the document may well exist once the store is reachable again
+        counters["errors"] += 1
+        print("Session rehydrate error:", e)
+        return None
+    if not result or not result.get("cities"):
+        counters["misses"] += 1
+        _remember_miss(session_id)
+        return None
+    counters["restored"] += 1
+    return result
+
+
+def stats():
+    return {**counters, "enabled": REHYDRATE_ENABLED, "negative_entries": len(_misses), "in_flight": _flight.stats()["in_flight_keys"]}
@@ -0,0 +1,500 @@
+# session_store.py
+"""
+Bounded store for chat sessions.
+
+Sessions are kept in memory in least-recently-used order, capped by SESSION_MAX_ENTRIES
+and by SESSION_MAX_BYTES of estimated memory. Sessions idle for SESSION_IDLE_TTL seconds
+are evicted as well. Evicted sessions are written to a SQLite spill file and loaded back
+when the next request for their session_id starts, so a user coming back after a break
+continues where they left off. Spill reads and writes run on a background thread.
+
+Sizes are measured by walking the session's containers with sys.getsizeof after every
+request that touched it; sessions in the middle of a request are never evicted.
+
+With SESSION_BACKEND=sqlite (one host) or redis (any number of hosts) the backend is
+the only copy of a session, shared by every worker. A request takes a per-session lock,
+loads the session, and writes it back and releases the lock when it is done, so two
+workers never interleave turns of the same session and no sticky routing is needed.
+The lock is renewed while the turn runs, the write only lands while the lock is still
+held, and a request that cannot get the lock within LOCK_WAIT fails with SessionBusy.
+Sessions are stored as compact JSON, zlib-compressed above COMPRESS_MIN_BYTES.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+load_dotenv()
+
+# "memory" keeps sessions in this worker (spilling to SQLite), "sqlite" and "redis" share them
+BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# A lock left behind by a crashed worker expires after LOCK_TTL; waiters give up after LOCK_WAIT.
+# Running turns renew their lock every LOCK_TTL / 3, so LOCK_TTL does not bound turn length.
+LOCK_TTL = float(os.getenv("SESSION_LOCK_TTL", "120"))
+LOCK_WAIT = float(os.getenv("SESSION_LOCK_WAIT", "30"))
+LOCK_POLL = 0.02
+COMPRESS_MIN_BYTES = 512
+MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "5000"))
+MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(512 * 1024 * 1024)))
+IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+SPILL_ENABLED = os.getenv("SESSION_SPILL_ENABLED", "true").lower() in ("1", "true", "yes")
+# Holds spilled sessions for the memory backend and all sessions for the sqlite backend
+SPILL_PATH = os.getenv("SESSION_SPILL_PATH", "sessions.sqlite3")
+# Stored sessions nobody came back for are deleted after this many days
+SPILL_MAX_AGE_DAYS = float(os.getenv("SESSION_SPILL_MAX_AGE_DAYS", "7"))
+
+# Derived state that is rebuilt from the rest of the session on demand
+TRANSIENT_KEYS = {"itinerary"}
+
+
+class SessionBusy(Exception):
+    """
+    Another request held the session's lock for longer than LOCK_WAIT.
+    """
+
+
+def encode(session):
+    data = {key: value for key, value in session.items() if key not in TRANSIENT_KEYS}
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # One-byte tag: "z" for zlib, "j" for plain JSON
+    return b"z" + zlib.compress(raw, 6) if len(raw) >= COMPRESS_MIN_BYTES else b"j" + raw
+
+
+def decode(blob):
+    blob = bytes(blob)
+    if blob[:1] == b"z":
+        return json.loads(zlib.decompress(blob[1:]))
+    if blob[:1] == b"j":
+        return json.loads(blob[1:])
+    # Untagged JSON written before compression was added
+    return json.loads(blob)
+
+
+def deep_size(obj):
+    """
+    Approximate memory held by a session: sys.getsizeof over every container, object and
+    value reachable from it, counting shared objects once.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+        elif hasattr(type(item), "__slots__"):
+            # Index records of the itinerary model
+            stack.extend(getattr(item, slot) for slot in type(item).__slots__ if hasattr(item, slot))
+    return total
+
+
+class SqliteBackend:
+    def __init__(self, path, max_age_days):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self._local = threading.local()
+        self._puts = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_locks (session_id TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, session_id, blob):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session_id, blob, time.time())
+        )
+        self._puts += 1
+        if self._puts % 1000 == 0:
+            self.purge()
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge(self):
+        return self._conn().execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.max_age,)).rowcount
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def acquire(self, session_id, token, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM session_locks WHERE session_id = ? AND expires_at < ?", (session_id, now))
+            acquired = conn.execute(
+                "INSERT OR IGNORE INTO session_locks (session_id, token, expires_at) VALUES (?, ?, ?)",
+                (session_id, token, now + ttl)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def release(self, session_id, token):
+        self._conn().execute("DELETE FROM session_locks WHERE session_id = ? AND token = ?", (session_id, token))
+
+    def renew(self, session_id, token, ttl):
+        now = time.time()
+        return self._conn().execute(
+            "UPDATE session_locks SET expires_at = ? WHERE session_id = ? AND token = ? AND expires_at >= ?",
+            (now + ttl, session_id, token, now)
+        ).rowcount == 1
+
+    def put_locked(self, session_id, blob, token):
+        """
+        put() only while `token` still holds the session's lock. Returns whether it was written.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            held = conn.execute(
+                "SELECT 1 FROM session_locks WHERE session_id = ? AND token = ? AND expires_at >= ?",
+                (session_id, token, time.time())
+            ).fetchone() is not None
+            if held:
+                self.put(session_id, blob)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return held
+
+
+class RedisBackend:
+    # Deletes the lock only if it still holds our token, so an expired and re-taken lock is left alone
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    # Writes the session only while the lock still holds our token
+    PUT_LOCKED_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "redis.call('set', KEYS[2], ARGV[2], 'EX', ARGV[3]) return 1 else return 0 end"
+    )
+
+    def __init__(self, url, max_age_days):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.max_age = int(max_age_days * 86400)
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+        self._renew = self.client.register_script(self.RENEW_SCRIPT)
+        self._put_locked = self.client.register_script(self.PUT_LOCKED_SCRIPT)
+
+    def get(self, session_id):
+        return self.client.get(f"session:{session_id}")
+
+    def put(self, session_id, blob):
+        # Expiry doubles as the purge of abandoned sessions
+        self.client.set(f"session:{session_id}", blob, ex=self.max_age)
+
+    def delete(self, session_id):
+        self.client.delete(f"session:{session_id}")
+
+    def count(self):
+        return sum(1 for _ in self.client.scan_iter(match="session:*", count=1000))
+
+    def acquire(self, session_id, token, ttl):
+        return bool(self.client.set(f"session_lock:{session_id}", token, nx=True, px=int(ttl * 1000)))
+
+    def release(self, session_id, token):
+        self._release(keys=[f"session_lock:{session_id}"], args=[token])
+
+    def renew(self, session_id, token, ttl):
+        return bool(self._renew(keys=[f"session_lock:{session_id}"], args=[token, int(ttl * 1000)]))
+
+    def put_locked(self, session_id, blob, token):
+        return bool(self._put_locked(keys=[f"session_lock:{session_id}", f"session:{session_id}"], args=[token, blob, self.max_age]))
+
+
+class SessionStore:
+    def __init__(self, max_entries, max_bytes, idle_ttl, spill=None, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        # Spill reads and writes run off the event loop on one thread, so they apply in order
+        self._spill_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-spill") if spill is not None else None
+        # session_id -> encoded session whose spill write has not finished yet
+        self._spilling = {}
+        # Shared backend: memory then only holds the sessions of requests running in this worker
+        self.shared = shared
+        # session_id -> (session, size in bytes, last access); oldest access first
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        # session_id -> number of requests currently working on it
+        self._active = {}
+        self.counters = {
+            "hits": 0, "reloads": 0, "misses": 0, "evicted_lru": 0, "evicted_bytes": 0,
+            "evicted_idle": 0, "spilled": 0, "spill_errors": 0,
+            "shared_loads": 0, "shared_saves": 0, "lock_waits": 0, "lock_timeouts": 0, "locks_lost": 0
+        }
+
+    def _load(self, session_id):
+        backend = self.shared or self.spill
+        if backend is None or session_id in self._active:
+            # in_use() already loaded whatever the backend holds; nothing there means a new session
+            return None
+        # Read outside a request: a snapshot, not cached, since other workers may change it
+        try:
+            blob = self._spilling.get(session_id) or backend.get(session_id)
+        except Exception as e:
+            print("Session read error:", e)
+            return None
+        return decode(blob) if blob is not None else None
+
+    async def _spill_call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._spill_io, fn, *args)
+
+    async def _reload(self, session_id):
+        # Brings a spilled session back into memory at the start of a request
+        blob = self._spilling.get(session_id)
+        if blob is None:
+            try:
+                blob = await self._spill_call(self.spill.get, session_id)
+            except Exception as e:
+                print("Session spill read error:", e)
+                return
+            # A concurrent request for the same session may have reloaded it meanwhile
+            if blob is None or session_id in self._sessions:
+                return
+        self.counters["reloads"] += 1
+        self._store(session_id, decode(blob))
+        # The session lives in memory again; the spilled copy would only go stale
+        try:
+            await self._spill_call(self.spill.delete, session_id)
+        except Exception as e:
+            print("Session spill delete error:", e)
+
+    async def _spill_write(self, session_id, blob):
+        try:
+            await self._spill_call(self.spill.put, session_id, blob)
+            self.counters["spilled"] += 1
+        except Exception as e:
+            self.counters["spill_errors"] += 1
+            print("Session spill write error:", e)
+        finally:
+            if self._spilling.get(session_id) is blob:
+                del self._spilling[session_id]
+
+    def _store(self, session_id, session):
+        old = self._sessions.pop(session_id, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = deep_size(session)
+        self._sessions[session_id] = (session, size, time.time())
+        self._bytes += size
+        self._evict()
+
+    def _evict(self):
+        now = time.time()
+        skipped = 0
+        # Pops from the oldest end until the limits hold, without walking the rest
+        while len(self._sessions) > skipped:
+            session_id, (session, size, last_access) = next(iter(self._sessions.items()))
+            if session_id in self._active:
+                # In use, so as recent as any; touch() measures it again when the request ends
+                self._sessions.move_to_end(session_id)
+                skipped += 1
+                continue
+            if now - last_access > self.idle_ttl:
+                reason = "evicted_idle"
+            elif len(self._sessions) > self.max_entries:
+                reason = "evicted_lru"
+            elif self._bytes > self.max_bytes:
+                reason = "evicted_bytes"
+            else:
+                # Everything after this one was used more recently
+                break
+            self._drop(session_id, reason)
+
+    def _drop(self, session_id, reason):
+        session, size, _ = self._sessions.pop(session_id)
+        self._bytes -= size
+        self.counters[reason] += 1
+        if self.spill is None:
+            return
+        blob = encode(session)
+        # Readable from memory until the write lands
+        self._spilling[session_id] = blob
+        asyncio.ensure_future(self._spill_write(session_id, blob))
+
+    def get(self, session_id, default=None):
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            self._sessions.move_to_end(session_id)
+            self._sessions[session_id] = (entry[0], entry[1], time.time())
+            self.counters["hits"] += 1
+            return entry[0]
+        session = self._load(session_id)
+        if session is None:
+            self.counters["misses"] += 1
+            return default
+        return session
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id, session):
+        self._store(session_id, session)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def touch(self, session_id):
+        """
+        Re-measure a session after a request changed it, then enforce the limits.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            self._store(session_id, entry[0])
+
+    async def _lock(self, session_id):
+        token = uuid.uuid4().hex
+        deadline = time.time() + LOCK_WAIT
+        waited = False
+        while not await asyncio.to_thread(self.shared.acquire, session_id, token, LOCK_TTL):
+            if time.time() > deadline:
+                # Serving the turn unlocked would let two turns overwrite each other
+                self.counters["lock_timeouts"] += 1
+                raise SessionBusy(session_id)
+            if not waited:
+                waited = True
+                self.counters["lock_waits"] += 1
+            await asyncio.sleep(LOCK_POLL)
+        return token
+
+    async def _renew(self, session_id, token, lock):
+        # Keeps the lock alive for turns that run longer than LOCK_TTL
+        while True:
+            await asyncio.sleep(LOCK_TTL / 3)
+            try:
+                renewed = await asyncio.to_thread(self.shared.renew, session_id, token, LOCK_TTL)
+            except Exception as e:
+                # Try again next round; the lock still has two thirds of its TTL left
+                print("Session lock renew error:", e)
+                continue
+            if not renewed:
+                lock["lost"] = True
+                self.counters["locks_lost"] += 1
+                print(f"Session lock lost for {session_id}")
+                return
+
+    @asynccontextmanager
+    async def in_use(self, session_id):
+        """
+        Keep a session in memory for the duration of a request and re-measure it afterwards.
+        With a shared backend the session is locked, loaded fresh, and written back at the end;
+        raises SessionBusy when the lock cannot be taken.
+        """
+        lock = None
+        blob = None
+        self._active[session_id] = self._active.get(session_id, 0) + 1
+        try:
+            if self.shared is not None:
+                lock = {"token": await self._lock(session_id), "lost": False}
+                lock["renewer"] = asyncio.ensure_future(self._renew(session_id, lock["token"], lock))
+                blob = await asyncio.to_thread(self.shared.get, session_id)
+                if blob is not None:
+                    self._store(session_id, decode(blob))
+                    self.counters["shared_loads"] += 1
+            elif self.spill is not None and session_id not in self._sessions:
+                await self._reload(session_id)
+            yield
+        finally:
+            if self._active[session_id] == 1:
+                del self._active[session_id]
+            else:
+                self._active[session_id] -= 1
+            if self.shared is None:
+                self.touch(session_id)
+            elif lock is not None:
+                lock["renewer"].cancel()
+                await self._save_shared(session_id, lock, blob)
+
+    async def _save_shared(self, session_id, lock, loaded):
+        try:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                blob = encode(entry[0])
+                # Turns that only read the session skip the write
+                if blob != loaded:
+                    # A lost lock may already belong to another turn, whose write must win
+                    if lock["lost"]:
+                        print(f"Session save skipped for {session_id}: lock no longer held")
+                    elif await asyncio.to_thread(self.shared.put_locked, session_id, blob, lock["token"]):
+                        self.counters["shared_saves"] += 1
+                    else:
+                        self.counters["locks_lost"] += 1
+                        print(f"Session save skipped for {session_id}: lock no longer held")
+                if session_id not in self._active:
+                    self._bytes -= entry[1]
+                    del self._sessions[session_id]
+        except Exception as e:
+            print("Session save error:", e)
+        finally:
+            await asyncio.to_thread(self.shared.release, session_id, lock["token"])
+
+    def stats(self):
+        return {
+            **self.counters,
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "active": len(self._active),
+            "backend": BACKEND,
+            "spilled_sessions": self.spill.count() if self.spill is not None else 0
+        }
+
+
+def create_store():
+    if BACKEND == "redis":
+        return SessionStore(MAX_ENTRIES, MAX_BYTES, IDLE_TTL, shared=RedisBackend(REDIS_URL, SPILL_MAX_AGE_DAYS))
+    if BACKEND == "sqlite":
+        return SessionStore(MAX_ENTRIES, MAX_BYTES, IDLE_TTL, shared=SqliteBackend(SPILL_PATH, SPILL_MAX_AGE_DAYS))
+    return SessionStore(MAX_ENTRIES, MAX_BYTES, IDLE_TTL, spill=SqliteBackend(SPILL_PATH, SPILL_MAX_AGE_DAYS) if SPILL_ENABLED else None)
+
+
+sessions = create_store()
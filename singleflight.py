@@ -0,0 +1,45 @@
+# singleflight.py
+
+import asyncio
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+    The first caller (the leader) starts the work; callers arriving while it is
+    still running await the same result instead of repeating it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.counters = {"leaders": 0, "coalesced": 0, "saved_prompt_tokens": 0, "saved_completion_tokens": 0}
+
+    async def do(self, key, fn):
+        """
+        Returns (result, shared). shared is True when the result came from another caller's call.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(task), True
+
+        # Run the work in its own task so a cancelled leader does not fail its followers
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        self.counters["leaders"] += 1
+        return await asyncio.shield(task), False
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved when nobody is left waiting on it
+        if not task.cancelled():
+            task.exception()
+
+    def note_saved(self, usage):
+        self.counters["saved_prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        self.counters["saved_completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def stats(self):
+        return {**self.counters, "in_flight_keys": len(self._calls)}
@@ -0,0 +1,120 @@
+# spatial_index.py
+"""
+In-memory grid index over known places, per city and category.
+
+Places are bucketed into square cells of SPATIAL_CELL_DEGREES (about 1.1 km at the
+default), the same idea as a fixed-precision geohash. nearest() walks rings of cells
+outwards from the anchors, so a query only looks at the few cells around the
+activities it is anchored to. The index is filled from the place knowledge base on
+first use and kept current as plans are saved.
+"""
+
+import os
+import math
+import threading
+from dotenv import load_dotenv
+import place_kb
+from gazetteer import normalize
+from travel_estimator import haversine_km
+load_dotenv()
+
+INDEX_ENABLED = os.getenv("SPATIAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+CELL_DEGREES = float(os.getenv("SPATIAL_CELL_DEGREES", "0.01"))
+# Candidates further than this from every anchor are not worth suggesting
+MAX_RADIUS_KM = float(os.getenv("SPATIAL_MAX_RADIUS_KM", "15"))
+
+
+class SpatialIndex:
+    def __init__(self, cell_degrees):
+        self.cell = cell_degrees
+        # (city, category) -> {(ix, iy): {norm: (name, lat, lon)}}
+        self._grids = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.counters = {"queries": 0, "cells_scanned": 0}
+
+    def _key(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def add(self, city, category, name, lat, lon):
+        grid = self._grids.setdefault((normalize(city), category), {})
+        grid.setdefault(self._key(lat, lon), {})[normalize(name)] = (name, lat, lon)
+
+    def add_result(self, result_json):
+        for city in result_json.get("cities", []):
+            city_name = city.get("city_name")
+            places = [("hotel", city.get("hotel") or {})]
+            places += [(place_kb.category_of(a), a) for day in city.get("recommendations", []) for a in day.get("activities", [])]
+            for category, place in places:
+                coords = place_kb.coordinates(place)
+                if category and coords and place.get("name"):
+                    self.add(city_name, category, place["name"], *coords)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                for city, category, name, lat, lon in place_kb.kb.fresh_places():
+                    self.add(city, category, name, lat, lon)
+                self._loaded = True
+
+    def nearest(self, city, category, anchors, k=5, exclude=()):
+        """
+        Up to k places of a category closest to the anchors ((lat, lon) pairs, e.g. the
+        activities before and after the one being replaced). Cost is the summed distance
+        to all anchors, i.e. the detour of visiting the place between them.
+        Returns [{"name", "latitude", "longitude", "distance_km"}], closest first.
+        """
+        self._ensure_loaded()
+        self.counters["queries"] += 1
+        grid = self._grids.get((normalize(city), category))
+        if not grid or not anchors:
+            return []
+        excluded = {normalize(name) for name in exclude}
+        centers = [self._key(lat, lon) for lat, lon in anchors]
+        km_per_ring = self.cell * 111.0 * min(max(math.cos(math.radians(lat)), 0.1) for lat, _ in anchors)
+        max_ring = max(1, int(MAX_RADIUS_KM / km_per_ring) + 1)
+        found = {}
+        seen_cells = set()
+        ring = 0
+        enough_at = None
+        while ring <= max_ring:
+            for cx, cy in centers:
+                for ix in range(cx - ring, cx + ring + 1):
+                    for iy in range(cy - ring, cy + ring + 1):
+                        # Only the outer edge of the square is new at this ring
+                        if max(abs(ix - cx), abs(iy - cy)) != ring or (ix, iy) in seen_cells:
+                            continue
+                        seen_cells.add((ix, iy))
+                        for norm, (name, lat, lon) in grid.get((ix, iy), {}).items():
+                            if norm not in excluded and norm not in found:
+                                found[norm] = (name, lat, lon)
+            # Once k are found, one more ring covers closer places just across a cell boundary
+            if enough_at is None and len(found) >= k:
+                enough_at = ring
+            if enough_at is not None and ring > enough_at:
+                break
+            ring += 1
+        self.counters["cells_scanned"] += len(seen_cells)
+        ranked = []
+        for name, lat, lon in found.values():
+            distances = [haversine_km(lat, lon, a_lat, a_lon) for a_lat, a_lon in anchors]
+            if min(distances) <= MAX_RADIUS_KM:
+                ranked.append((sum(distances), min(distances), name, lat, lon))
+        ranked.sort()
+        return [
+            {"name": name, "latitude": lat, "longitude": lon, "distance_km": round(closest, 2)}
+            for _, closest, name, lat, lon in ranked[:k]
+        ]
+
+    def stats(self):
+        return {
+            **self.counters,
+            "enabled": INDEX_ENABLED,
+            "loaded": self._loaded,
+            "places": sum(len(cell) for grid in self._grids.values() for cell in grid.values())
+        }
+
+
+index = SpatialIndex(CELL_DEGREES)
@@ -0,0 +1,90 @@
+# speculation.py
+
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+load_dotenv()
+
+SPECULATION_ENABLED = os.getenv("SPECULATIVE_PREFETCH", "true").lower() in ("1", "true", "yes")
+# Unclaimed results are dropped after this many seconds
+SPECULATION_TTL = int(os.getenv("SPECULATION_TTL", "900"))
+
+# session_id -> {name: (key, task, started_at)}
+_pending = {}
+counters = {"started": 0, "hits": 0, "stale": 0, "misses": 0, "failed": 0, "expired": 0}
+
+
+def start(session_id, name, key, factory):
+    """
+    Begin work for a step the user has not reached yet. `key` captures every input
+    the work depends on; a later take() with a different key discards the result.
+    `factory` is called with no arguments and must return a coroutine.
+    """
+    if not SPECULATION_ENABLED:
+        return
+    _sweep()
+    entries = _pending.setdefault(session_id, {})
+    current = entries.get(name)
+    if current is not None:
+        if current[0] == key:
+            return
+        current[1].cancel()
+        counters["stale"] += 1
+    task = asyncio.ensure_future(factory())
+    task.add_done_callback(_retrieve)
+    entries[name] = (key, task, time.time())
+    counters["started"] += 1
+
+
+async def take(session_id, name, key):
+    """
+    Claim a speculative result. Returns None when nothing usable was prepared,
+    in which case the caller does the work itself.
+    """
+    entries = _pending.get(session_id)
+    entry = entries.pop(name, None) if entries else None
+    if entries is not None and not entries:
+        del _pending[session_id]
+    if entry is None:
+        counters["misses"] += 1
+        return None
+    stored_key, task, _ = entry
+    if stored_key != key:
+        task.cancel()
+        counters["stale"] += 1
+        return None
+    try:
+        result = await task
+    except Exception as e:
+        print(f"Speculative {name} failed:", e)
+        counters["failed"] += 1
+        return None
+    counters["hits"] += 1
+    return result
+
+
+def discard(session_id):
+    for _, task, _ in _pending.pop(session_id, {}).values():
+        task.cancel()
+
+
+def stats():
+    return {**counters, "enabled": SPECULATION_ENABLED, "pending_sessions": len(_pending)}
+
+
+def _sweep():
+    cutoff = time.time() - SPECULATION_TTL
+    for session_id in list(_pending):
+        entries = _pending[session_id]
+        for name in [n for n, entry in entries.items() if entry[2] < cutoff]:
+            entries.pop(name)[1].cancel()
+            counters["expired"] += 1
+        if not entries:
+            del _pending[session_id]
+
+
+def _retrieve(task):
+    # Keep unclaimed failures from being reported as "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,108 @@
+# stub_cosmos.py
+"""
+In-memory stand-in for the Cosmos DB container used by cosmos_helper and cosmos_async,
+enabled with COSMOS_STUB=true for load benchmarks and offline runs. Calls take
+COSMOS_STUB_LATENCY_MS: blocking in InMemoryContainer like the synchronous SDK client,
+awaiting in AsyncInMemoryContainer like the azure.cosmos.aio one.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+LATENCY_MS = float(os.getenv("COSMOS_STUB_LATENCY_MS", "0"))
+
+
+class NotFoundError(Exception):
+    status_code = 404
+
+
+class InMemoryContainer:
+    """
+    Implements the subset of azure.cosmos ContainerProxy that cosmos_helper uses.
+    Items are stored as JSON text so callers never share mutable state with the store.
+    """
+
+    def __init__(self, partition_key="session_id", latency_ms=LATENCY_MS):
+        self.partition_key = partition_key
+        self.latency_ms = latency_ms
+        self._items = {}
+        self._lock = threading.Lock()
+        self.counters = {"upserts": 0, "reads": 0, "queries": 0, "not_found": 0}
+
+    def _wait(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def upsert_item(self, body):
+        self._wait()
+        if "id" not in body:
+            raise ValueError("Item must have an 'id'")
+        item = {**body, "_etag": uuid.uuid4().hex, "_ts": int(time.time())}
+        key = (str(item.get(self.partition_key)), str(item["id"]))
+        with self._lock:
+            self._items[key] = json.dumps(item)
+            self.counters["upserts"] += 1
+        return json.loads(self._items[key])
+
+    def read_item(self, item, partition_key):
+        self._wait()
+        with self._lock:
+            self.counters["reads"] += 1
+            raw = self._items.get((str(partition_key), str(item)))
+            if raw is None:
+                self.counters["not_found"] += 1
+        if raw is None:
+            raise NotFoundError(f"Entity with the specified id does not exist: {item}")
+        return json.loads(raw)
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        # Supports the "SELECT * FROM c WHERE c.field=@param [AND ...]" queries cosmos_helper issues
+        self._wait()
+        values = {p["name"]: p["value"] for p in parameters or []}
+        conditions = re.findall(r"c\.(\w+)\s*=\s*(@\w+)", query)
+        with self._lock:
+            self.counters["queries"] += 1
+            rows = [json.loads(raw) for raw in self._items.values()]
+        for row in rows:
+            if all(row.get(field) == values.get(param) for field, param in conditions):
+                yield row
+
+    def stats(self):
+        return {**self.counters, "items": len(self._items)}
+
+
+class AsyncInMemoryContainer:
+    """
+    Implements the subset of azure.cosmos.aio ContainerProxy that cosmos_async uses.
+    """
+
+    def __init__(self, partition_key="session_id"):
+        # Storage and counters come from the sync container; only the waiting differs
+        self._store = InMemoryContainer(partition_key, latency_ms=0)
+
+    async def _wait(self):
+        if LATENCY_MS:
+            await asyncio.sleep(LATENCY_MS / 1000)
+
+    async def upsert_item(self, body):
+        await self._wait()
+        return self._store.upsert_item(body)
+
+    async def read_item(self, item, partition_key):
+        await self._wait()
+        return self._store.read_item(item, partition_key)
+
+    async def query_items(self, query, parameters=None):
+        await self._wait()
+        for row in self._store.query_items(query, parameters=parameters):
+            yield row
+
+    def stats(self):
+        return self._store.stats()
@@ -0,0 +1,427 @@
+# stub_llm_server.py
+"""
+Local stand-in for the Azure OpenAI chat completions endpoint, used for load benchmarks.
+
+Answers every prompt main.py sends with deterministic, schema-valid content (the same
+prompt always gets the same answer) after a configurable latency, and injects 429/500
+errors at configurable rates. Run it with:
+
+    uvicorn stub_llm_server:app --port 8001
+
+and point the app at it:
+
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8001 AZURE_OPENAI_API_KEY=stub
+    AZURE_OPENAI_API_VERSION=2024-06-01 AZURE_OPENAI_DEPLOYMENT=stub COSMOS_STUB=true
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Per-call latency is lognormal around the median plus a per-token generation cost
+LATENCY_MEDIAN_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "400"))
+LATENCY_SIGMA = float(os.getenv("STUB_LLM_LATENCY_SIGMA", "0.4"))
+MS_PER_TOKEN = float(os.getenv("STUB_LLM_MS_PER_TOKEN", "2"))
+ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+THROTTLE_RATE = float(os.getenv("STUB_LLM_THROTTLE_RATE", "0"))
+RETRY_AFTER = int(os.getenv("STUB_LLM_RETRY_AFTER", "1"))
+# Seeds latency and error sampling; content is seeded by the prompt itself
+SEED = int(os.getenv("STUB_LLM_SEED", "42"))
+
+app = FastAPI()
+_rng = random.Random(SEED)
+counters = Counter()
+
+CITY_CENTERS = {
+    "hawaii": (21.2793, -157.8292),
+    "honolulu": (21.3069, -157.8583),
+    "paris": (48.8566, 2.3522),
+    "london": (51.5072, -0.1276),
+    "tokyo": (35.6762, 139.6503),
+    "new york": (40.7128, -74.0060),
+    "las vegas": (36.1699, -115.1398),
+    "miami": (25.7617, -80.1918),
+    "dubai": (25.2048, 55.2708),
+    "singapore": (1.3521, 103.8198),
+    "bangkok": (13.7563, 100.5018),
+    "mumbai": (19.0760, 72.8777),
+    "goa": (15.2993, 74.1240)
+}
+PLACE_WORDS = ["Sunset", "Harbor", "Banyan", "Coral", "Lantern", "Summit", "Palm", "Old Town", "Riverside", "Golden"]
+MEAL_NOUNS = {"Breakfast": "Cafe", "Lunch": "Kitchen", "Dinner": "Grill"}
+SIGHT_NOUNS = ["Gardens", "Museum", "Lookout", "Market", "Beach", "Trail", "Gallery", "Pier"]
+VIBE_WORDS = ["Adventure", "Romance", "Discovery", "Escape", "Hangover"]
+
+
+def _seeded(text):
+    return random.Random(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def _field(text, label, default="Unknown"):
+    match = re.search(rf"^{label}:\s*(.+)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else default
+
+
+def _center(destination):
+    key = destination.lower()
+    for city, coords in CITY_CENTERS.items():
+        if city in key:
+            return coords
+    rng = _seeded(key)
+    return (round(rng.uniform(-40, 55), 4), round(rng.uniform(-120, 140), 4))
+
+
+def _place(rng, destination, center, noun, spread=0.05):
+    name = f"{rng.choice(PLACE_WORDS)} {noun}"
+    return {
+        "name": name,
+        "address": f"{rng.randint(1, 999)} {rng.choice(PLACE_WORDS)} Street, {destination}",
+        "latitude": round(center[0] + rng.uniform(-spread, spread), 5),
+        "longitude": round(center[1] + rng.uniform(-spread, spread), 5)
+    }
+
+
+def _reviews(name):
+    return {f"Review {i}": f"Visit {i} to {name} was memorable, friendly staff and a great atmosphere." for i in range(1, 6)}
+
+
+def _activity(rng, destination, center, time_str, noun, meal=None, action=None):
+    activity = {"time": time_str}
+    if meal:
+        activity["meal"] = meal
+    if action:
+        activity["action"] = action
+    activity.update(_place(rng, destination, center, noun))
+    activity.update({
+        "travel_distance_from_previous": f"{rng.randint(1, 8)} km",
+        "travel_time_from_previous": f"{rng.randint(5, 30)} mins by taxi",
+        "highlights": f"{activity['name']} is a local favourite in {destination}. Expect lively crowds and great views.",
+        "why_recommended": f"Fits a relaxed {destination} itinerary.",
+        "rating": round(rng.uniform(3.8, 4.9), 1),
+        "reviews": _reviews(activity["name"])
+    })
+    if not meal and not action:
+        activity["carry"] = "Camera, water bottle, comfortable shoes"
+    return activity
+
+
+def _hotel_activity(time_str, action, hotel):
+    return {
+        "time": time_str,
+        "action": action,
+        "name": hotel["name"],
+        "address": hotel["address"],
+        "latitude": hotel["latitude"],
+        "longitude": hotel["longitude"],
+        "travel_distance_from_previous": "3 km",
+        "travel_time_from_previous": "10 mins by taxi"
+    }
+
+
+def _hotel(rng, destination, center):
+    hotel = _place(rng, destination, center, "Resort & Spa", spread=0.02)
+    hotel.update({"check_in": "03:00 PM", "check_out": "11:00 AM", "why_recommended": "Central, comfortable and close to the main sights."})
+    return hotel
+
+
+def _day_activities(rng, destination, center, hotel, day_number, total_days):
+    if day_number == 1:
+        airport = _place(rng, destination, center, "International Airport", spread=0.1)
+        activities = [
+            {"time": "10:00 AM", "action": "Arrival", **airport, "name": f"Arrival at {airport['name']}",
+             "travel_distance_from_previous": "0 km", "travel_time_from_previous": "0 mins"},
+            {"time": "10:30 AM", "action": "Transfer", "name": f"Transfer from {airport['name']} to {hotel['name']}",
+             "address": f"{airport['address']} → {hotel['address']}", "latitude": hotel["latitude"], "longitude": hotel["longitude"],
+             "travel_distance_from_previous": "15 km", "travel_time_from_previous": "30 mins by taxi"},
+            _activity(rng, destination, center, "12:30 PM", MEAL_NOUNS["Lunch"], meal="Lunch"),
+            _hotel_activity(hotel.get("check_in", "03:00 PM"), "Hotel Check-in", hotel),
+            _activity(rng, destination, center, "04:30 PM", rng.choice(SIGHT_NOUNS)),
+            _activity(rng, destination, center, "07:30 PM", MEAL_NOUNS["Dinner"], meal="Dinner")
+        ]
+    else:
+        activities = [
+            _activity(rng, destination, center, "08:00 AM", MEAL_NOUNS["Breakfast"], meal="Breakfast"),
+            _activity(rng, destination, center, "10:00 AM", rng.choice(SIGHT_NOUNS)),
+            _activity(rng, destination, center, "12:30 PM", MEAL_NOUNS["Lunch"], meal="Lunch")
+        ]
+        if day_number == total_days:
+            airport = _place(rng, destination, center, "International Airport", spread=0.1)
+            activities.insert(2, _hotel_activity(hotel.get("check_out", "11:00 AM"), "Hotel Check-out", hotel))
+            activities.append({"time": "02:30 PM", "action": "Transfer", "name": f"Transfer from {hotel['name']} to {airport['name']}",
+                               "address": f"{hotel['address']} → {airport['address']}", "latitude": airport["latitude"],
+                               "longitude": airport["longitude"], "travel_distance_from_previous": "15 km",
+                               "travel_time_from_previous": "30 mins by taxi"})
+            activities.append({"time": "05:00 PM", "action": "Departure", **airport, "name": f"Departure from {airport['name']}",
+                               "travel_distance_from_previous": "0 km", "travel_time_from_previous": "0 mins"})
+            return activities
+        activities += [
+            _activity(rng, destination, center, "02:30 PM", rng.choice(SIGHT_NOUNS)),
+            _activity(rng, destination, center, "07:30 PM", MEAL_NOUNS["Dinner"], meal="Dinner"),
+            _activity(rng, destination, center, "09:30 PM", "Lounge", action="Nightlife")
+        ]
+    if day_number != total_days:
+        activities.append(_hotel_activity("End of Day", "Return to Hotel", hotel))
+    return activities
+
+
+def _travel(rng, origin, destination, center):
+    home = _center(origin)
+    arrival = _place(rng, destination, center, "International Airport", spread=0.1)
+    departure = _place(rng, origin, home, "International Airport", spread=0.1)
+    outbound = {"from_city": origin, "to_city": destination, "mode": "Flight", "departure_time": "06:00 AM",
+                "arrival_time": "10:00 AM", "travel_duration": "4h 0m", "departure_point": departure, "arrival_point": arrival}
+    inbound = {"from_city": destination, "to_city": origin, "mode": "Flight", "departure_time": "06:00 PM",
+               "arrival_time": "10:00 PM", "travel_duration": "4h 0m", "departure_point": arrival, "arrival_point": departure}
+    return [outbound, inbound]
+
+
+def _days(text):
+    match = re.search(r"^Days:\s*(\d+)", text, re.MULTILINE)
+    return max(1, min(int(match.group(1)), 14)) if match else 3
+
+
+def skeleton(text, rng):
+    destination, days = _field(text, "Destination"), _days(text)
+    center = _center(destination)
+    return {
+        "persona": f"A {_field(text, 'Travel Vibe').lower()} traveler heading to {destination}",
+        "cities": [{
+            "city_name": destination,
+            "hotel": _hotel(rng, destination, center),
+            "days": [{"day": f"Day {n} - {rng.choice(SIGHT_NOUNS)} and {rng.choice(SIGHT_NOUNS)}", "arrival_time": "10:00 AM",
+                      "theme": f"Neighbourhood {n} of {destination}"} for n in range(1, days + 1)]
+        }],
+        "inter_city_travel": _travel(rng, _field(text, "Origin"), destination, center)
+    }
+
+
+def day_plan(text, rng):
+    destination = _field(text, "City", _field(text, "Destination"))
+    match = re.search(r"Plan only (.+?) of (\d+)\.", text)
+    label, total_days = (match.group(1), int(match.group(2))) if match else ("Day 1", 1)
+    day_match = re.search(r"Day (\d+)", label)
+    day_number = int(day_match.group(1)) if day_match else 1
+    try:
+        hotel = json.loads(_field(text, "Hotel", "{}"))
+    except ValueError:
+        hotel = {}
+    center = _center(destination)
+    if not hotel.get("name"):
+        hotel = _hotel(rng, destination, center)
+    return {"day": label, "arrival_time": "10:00 AM",
+            "activities": _day_activities(rng, destination, center, hotel, day_number, total_days)}
+
+
+def full_plan(text, rng):
+    plan = skeleton(text, rng)
+    city = plan["cities"][0]
+    center = _center(city["city_name"])
+    outlines = city.pop("days")
+    city["recommendations"] = [
+        {"day": outline["day"], "arrival_time": outline["arrival_time"],
+         "activities": _day_activities(rng, city["city_name"], center, city["hotel"], n, len(outlines))}
+        for n, outline in enumerate(outlines, start=1)
+    ]
+    return plan
+
+
+def place_details(text, rng, hotel=False):
+    match = re.search(r"details for (.+?) in ([^\n:]+):", text)
+    name, destination = (match.group(1), match.group(2)) if match else ("Local Favourite", "the city")
+    details = _place(rng, destination, _center(destination), "Place")
+    details["name"] = name
+    if hotel:
+        details.update({"check_in": "03:00 PM", "check_out": "11:00 AM", "why_recommended": "Well located with great service."})
+        return details
+    details.update({"highlights": f"{name} is one of the best-loved spots in {destination}.", "why_recommended": "Matches the trip's vibe.",
+                    "carry": "Camera, water bottle", "rating": round(rng.uniform(3.8, 4.9), 1), "reviews": _reviews(name)})
+    return details
+
+
+def suggestions(text, rng):
+    request = re.search(r'User request: "(.*)"', text)
+    request = request.group(1).lower() if request else ""
+    day = re.search(r"day (\d+)", request)
+    current_id = ""
+    for item_id, row_day, row_type, name in re.findall(r"^(A\d+) \| (\d+) \| [^|]* \| ([^|]*) \| (.*)$", text, re.MULTILINE):
+        named = name.strip().lower() and name.strip().lower() in request
+        typed = row_type.strip().lower() in request and (day is None or day.group(1) == row_day)
+        if named or typed:
+            current_id = item_id
+            break
+    item_type = next((t for t in ("breakfast", "lunch", "dinner", "hotel") if t in request), "activity")
+    noun = {"breakfast": "Cafe", "lunch": "Kitchen", "dinner": "Grill", "hotel": "Hotel"}.get(item_type, rng.choice(SIGHT_NOUNS))
+    names = []
+    while len(names) < 5:
+        name = f"{rng.choice(PLACE_WORDS)} {noun}"
+        if name not in names:
+            names.append(name)
+    return {"understood_request": request or "new suggestions", "current_item_id": current_id, "item_type": item_type,
+            "suggestions": names, "reasoning": "Popular, well-reviewed alternatives nearby."}
+
+
+def intent(text):
+    # Mirrors the intent prompt's action list for the simple commands the load test sends
+    said = re.search(r'The user said: "(.*)"', text)
+    said = said.group(1).strip() if said else ""
+    regenerate = re.match(r"(?:regenerate|redo|refresh)\b.*?\bday\s*(\d+)", said, re.IGNORECASE)
+    if regenerate:
+        return {"actions": [{"action": "regenerate", "day": f"Day {regenerate.group(1)}"}]}
+    replace = re.match(r"(?:replace|swap)\s+(.+?)\s+(?:with|for)\s+(?:an?\s+)?(.+)", said, re.IGNORECASE) or \
+        re.match(r"instead of\s+(.+?),?\s+add\s+(?:an?\s+)?(.+)", said, re.IGNORECASE)
+    if replace:
+        return {"actions": [{"action": "remove", "activity": replace.group(1)},
+                            {"action": "add", "activity": replace.group(2), "address": ""}]}
+    remove = re.match(r"(?:remove|drop|delete)\s+(.+)", said, re.IGNORECASE)
+    if remove:
+        return {"actions": [{"action": "remove", "activity": remove.group(1)}]}
+    add = re.match(r"add\s+(?:an?\s+|some\s+)?(.+)", said, re.IGNORECASE)
+    if add:
+        return {"actions": [{"action": "add", "activity": add.group(1), "address": ""}]}
+    return {"actions": []}
+
+
+def regenerated_day(text, rng):
+    # Same shape main.py reads back: {"recommendations": [day]}
+    match = re.search(r"Regenerate a new plan for (.+?) for: (.*)", text)
+    label, history = (match.group(1), match.group(2).lower()) if match else ("Day 2", "")
+    day_match = re.search(r"\d+", label)
+    day_number = int(day_match.group(0)) if day_match else 2
+    destination = next((city.title() for city in CITY_CENTERS if city in history), "the city")
+    center = _center(destination)
+    hotel = _hotel(rng, destination, center)
+    # Planned as a middle day, so it ends back at the hotel
+    return {"recommendations": [{"day": label, "arrival_time": "",
+                                 "activities": _day_activities(rng, destination, center, hotel, day_number, day_number + 1)}]}
+
+
+def respond(messages):
+    """
+    Content for one request. Returns (content, kind) where kind is the recognised prompt type.
+    """
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = "\n".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+    rng = _seeded(system + user)
+
+    if "Do NOT generate activities" in user:
+        return json.dumps(skeleton(user, rng)), "skeleton"
+    if "Plan only " in user:
+        return json.dumps(day_plan(user, rng)), "day_plan"
+    if "Generate a travel itinerary in the following exact JSON format" in user:
+        return json.dumps(full_plan(user, rng)), "plan"
+    if "Regenerate a new plan for" in user:
+        return json.dumps(regenerated_day(user, rng)), "day_regenerate"
+    if '"goals"' in user:
+        return json.dumps({"goals": ["🍽️ Food & Culinary", "🛍️ Shopping", "🏖️ Beach Time", "🥾 Hiking", "🎭 Culture",
+                                     "🌃 Nightlife", "📸 Photography", "🧘 Wellness"]}), "trip_goals"
+    if "popular US destinations" in user:
+        return "1. Las Vegas, Nevada\n2. Miami, Florida\n3. New Orleans, Louisiana\n4. Austin, Texas\n5. Nashville, Tennessee", "destination_suggestions"
+    if "travel input parser" in system:
+        said = re.search(r'User said: "(.*)"', user)
+        said = said.group(1) if said else ""
+        route = re.search(r"(?:from\s+)?([A-Za-z ]+?)\s+to\s+([A-Za-z ]+?)(?:\s+for\b|$)", said, re.IGNORECASE)
+        origin, destination = (route.group(1).strip(), route.group(2).strip()) if route else ("", said.strip())
+        return json.dumps({"has_origin": bool(origin), "has_destination": bool(destination), "origin": origin,
+                           "destination": destination, "interpretation": said}), "destination_parse"
+    if "single descriptive word" in system:
+        return rng.choice(VIBE_WORDS), "movie_genre"
+    if "geocoder" in system:
+        destination = re.search(r"highly-rated .+ in (.+?)\.", user)
+        destination = destination.group(1) if destination else "the city"
+        return json.dumps(_place(rng, destination, _center(destination), rng.choice(SIGHT_NOUNS))), "geo"
+    if "intent-to-JSON" in system:
+        return json.dumps(intent(user)), "intent"
+    if '"suggestions"' in user and "User request:" in user:
+        return json.dumps(suggestions(user, rng)), "suggestion"
+    if '"suggestions"' in user:
+        return json.dumps({"suggestions": [f"{rng.choice(PLACE_WORDS)} {rng.choice(SIGHT_NOUNS)}" for _ in range(5)]}), "suggestion_refresh"
+    if "hotel information" in system:
+        return json.dumps(place_details(user, rng, hotel=True)), "hotel_details"
+    if "real travel information" in system:
+        return json.dumps(place_details(user, rng)), "place_details"
+    if "review generator" in system:
+        return " | ".join(f"Review {i}: Loved it, visit {i} was even better than the photos." for i in range(1, 6)), "reviews"
+    if "travel writer" in system:
+        return "A lively local landmark with sweeping views. Great for an unhurried afternoon.", "highlights"
+    if "travel advisor" in system:
+        return "Camera, water bottle, sunscreen", "carry"
+    if "recommendation expert" in system:
+        return "A great fit for the traveler's chosen vibe and scenes.", "why_recommended"
+    return "That sounds fantastic, this trip is going to be one to remember!", "chat"
+
+
+def _usage(messages, content):
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    completion_tokens = max(1, len(content) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _error(status, message, headers=None):
+    return JSONResponse(status_code=status, content={"error": {"code": str(status), "message": message}}, headers=headers)
+
+
+async def _stream(completion_id, deployment, content, usage, delay):
+    pieces = [content[i:i + 40] for i in range(0, len(content), 40)] or [""]
+    base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": deployment}
+    for piece in pieces:
+        await asyncio.sleep(delay / len(pieces))
+        chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+    yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    counters["requests"] += 1
+
+    roll = _rng.random()
+    if roll < THROTTLE_RATE:
+        counters["throttled"] += 1
+        return _error(429, "Rate limit is exceeded.", headers={"retry-after": str(RETRY_AFTER)})
+    if roll < THROTTLE_RATE + ERROR_RATE:
+        counters["errors"] += 1
+        await asyncio.sleep(_rng.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MEDIAN_MS / 1000)
+        return _error(500, "The server had an error while processing your request.")
+
+    content, kind = respond(messages)
+    counters[kind] += 1
+    usage = _usage(messages, content)
+    delay = (_rng.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MEDIAN_MS + usage["completion_tokens"] * MS_PER_TOKEN) / 1000
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    if body.get("stream"):
+        return StreamingResponse(_stream(completion_id, deployment, content, usage, delay), media_type="text/event-stream")
+
+    await asyncio.sleep(delay)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage
+    }
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    return {
+        "latency_median_ms": LATENCY_MEDIAN_MS,
+        "latency_sigma": LATENCY_SIGMA,
+        "ms_per_token": MS_PER_TOKEN,
+        "error_rate": ERROR_RATE,
+        "throttle_rate": THROTTLE_RATE,
+        "counts": dict(counters)
+    }
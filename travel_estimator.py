@@ -0,0 +1,118 @@
+# travel_estimator.py
+"""
+Offline replacement for asking the model how far apart two activities are.
+Great-circle distance is scaled by a per-mode detour factor to approximate the
+street route, and turned into minutes with a per-mode average speed plus a fixed
+overhead (hailing a taxi, walking to the platform). Results use the itinerary's
+own formats: "2.4 km" and "12 mins" / "18 mins by taxi" / "25 mins by metro".
+"""
+
+import os
+import math
+from dotenv import load_dotenv
+load_dotenv()
+
+EARTH_RADIUS_KM = 6371.0088
+
+# mode -> (average speed in km/h, route detour factor, fixed overhead in minutes)
+MODES = {
+    "walk": (4.8, 1.25, 0),
+    "taxi": (float(os.getenv("TRAVEL_TAXI_SPEED_KMH", "24")), 1.35, 3),
+    "metro": (float(os.getenv("TRAVEL_METRO_SPEED_KMH", "32")), 1.3, 8)
+}
+# Anything closer than this on foot is walked
+WALK_MAX_KM = float(os.getenv("TRAVEL_WALK_MAX_KM", "1.2"))
+# Metro only pays off over longer hops, and only where there is one
+METRO_MIN_KM = float(os.getenv("TRAVEL_METRO_MIN_KM", "6"))
+METRO_CITIES = {c.strip().lower() for c in os.getenv(
+    "TRAVEL_METRO_CITIES",
+    "new york,london,paris,tokyo,singapore,dubai,delhi,mumbai,bangkok,hong kong,seoul,barcelona,madrid,berlin,rome"
+).split(",") if c.strip()}
+
+# Activities that do not move the traveler on their own
+NO_TRAVEL_ACTIONS = {"Arrival"}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def coordinates(place):
+    """
+    (lat, lon) of an activity or hotel dict, or None when missing or left at the 0.0 placeholder.
+    """
+    if not place:
+        return None
+    try:
+        lat, lon = float(place.get("latitude")), float(place.get("longitude"))
+    except (TypeError, ValueError):
+        return None
+    if lat == 0.0 and lon == 0.0:
+        return None
+    return lat, lon
+
+
+def has_metro(city):
+    city = (city or "").lower()
+    return any(name in city for name in METRO_CITIES)
+
+
+def choose_mode(straight_km, metro=False):
+    if straight_km * MODES["walk"][1] <= WALK_MAX_KM:
+        return "walk"
+    if metro and straight_km >= METRO_MIN_KM:
+        return "metro"
+    return "taxi"
+
+
+def format_distance(km):
+    return f"{km:.1f} km" if km < 10 else f"{round(km)} km"
+
+
+def format_time(minutes, mode):
+    text = f"{max(1, round(minutes))} mins"
+    return text if mode == "walk" else f"{text} by {mode}"
+
+
+def estimate(origin, destination, metro=False):
+    """
+    (distance, time) strings for travelling between two places, or None when either
+    has no usable coordinates.
+    """
+    start, end = coordinates(origin), coordinates(destination)
+    if start is None or end is None:
+        return None
+    straight_km = haversine_km(*start, *end)
+    if straight_km < 0.05:
+        return "0 km", "0 mins"
+    mode = choose_mode(straight_km, metro)
+    speed, detour, overhead = MODES[mode]
+    route_km = straight_km * detour
+    return format_distance(route_km), format_time(route_km / speed * 60 + overhead, mode)
+
+
+def recompute(recommendations, hotel=None, city=None):
+    """
+    Rewrite travel_distance_from_previous / travel_time_from_previous for every activity.
+    Each day after the first starts from the hotel. Activities without coordinates keep
+    their current values. Returns the number of activities updated.
+    """
+    metro = has_metro(city)
+    updated = 0
+    previous = None
+    for day_idx, day in enumerate(recommendations):
+        if day_idx > 0 and coordinates(hotel) is not None:
+            previous = hotel
+        for activity in day.get("activities", []):
+            if activity.get("action") in NO_TRAVEL_ACTIONS or previous is None:
+                result = ("0 km", "0 mins") if previous is None and coordinates(activity) else None
+            else:
+                result = estimate(previous, activity, metro)
+            if result is not None:
+                activity["travel_distance_from_previous"], activity["travel_time_from_previous"] = result
+                updated += 1
+            if coordinates(activity) is not None:
+                previous = activity
+    return updated
@@ -0,0 +1,142 @@
+# write_behind.py
+"""
+Write-behind queue for itinerary saves.
+
+save() only records the latest document per session_id and returns, so the response
+goes out without waiting for Cosmos. A background task writes each session once its
+first unsaved change is WRITE_BEHIND_WINDOW_MS old; every save that arrives for the
+same session within that window replaces the queued document instead of adding an
+upsert. Failed writes are retried a few times unless a newer document has replaced
+them. flush() writes everything still queued and is called on shutdown.
+"""
+
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+import cosmos_async
+load_dotenv()
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("1", "true", "yes")
+WINDOW = float(os.getenv("WRITE_BEHIND_WINDOW_MS", "1500")) / 1000
+MAX_CONCURRENT_WRITES = int(os.getenv("WRITE_BEHIND_CONCURRENCY", "8"))
+MAX_ATTEMPTS = 3
+
+
+class WriteBehindQueue:
+    def __init__(self, write, window, concurrency):
+        self.write = write
+        self.window = window
+        self.concurrency = concurrency
+        # session_id -> [document, first unsaved change at, attempts]
+        self._pending = {}
+        self._in_flight = {}
+        self._worker = None
+        self._wake = None
+        self._semaphore = None
+        self.counters = {"enqueued": 0, "written": 0, "writes_saved": 0, "failed": 0, "retried": 0, "dropped": 0}
+        self._lag_ms_total = 0.0
+        self._lag_ms_max = 0.0
+
+    def _start(self):
+        if self._worker is None or self._worker.done():
+            self._wake = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._worker = asyncio.ensure_future(self._run())
+
+    def save(self, document):
+        """
+        Queue a document for writing. Returns immediately.
+        """
+        session_id = document.get("session_id") or document.get("id")
+        self.counters["enqueued"] += 1
+        entry = self._pending.get(session_id)
+        if entry is not None:
+            # The queued write has not happened yet, so this one replaces it
+            entry[0] = document
+            entry[2] = 0
+            self.counters["writes_saved"] += 1
+        else:
+            self._pending[session_id] = [document, time.time(), 0]
+        self._start()
+        self._wake.set()
+
+    def pending(self, session_id):
+        """
+        The newest document for a session that is not in Cosmos yet, or None.
+        """
+        entry = self._pending.get(session_id)
+        if entry is not None:
+            return entry[0]
+        return self._in_flight.get(session_id)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+            now = time.time()
+            # A session with a write still running waits for it, so writes land in order
+            due = [sid for sid, entry in self._pending.items() if now - entry[1] >= self.window and sid not in self._in_flight]
+            for session_id in due:
+                document, first_change, attempts = self._pending.pop(session_id)
+                asyncio.ensure_future(self._write(session_id, document, first_change, attempts))
+            # Sleep until the oldest remaining change comes due
+            waits = [entry[1] + self.window - now for entry in self._pending.values()]
+            await asyncio.sleep(max(0.01, min(waits)) if waits else 0)
+
+    async def _write(self, session_id, document, first_change, attempts):
+        async with self._semaphore:
+            self._in_flight[session_id] = document
+            try:
+                await self.write(document)
+                lag_ms = (time.time() - first_change) * 1000
+                self.counters["written"] += 1
+                self._lag_ms_total += lag_ms
+                self._lag_ms_max = max(self._lag_ms_max, lag_ms)
+            except Exception as e:
+                print("Write-behind save error:", e)
+                if session_id in self._pending:
+                    # A newer document is queued and will be written instead
+                    self.counters["failed"] += 1
+                elif attempts + 1 < MAX_ATTEMPTS:
+                    self.counters["retried"] += 1
+                    # Retried one window later; lag is then measured from the retry
+                    self._pending[session_id] = [document, time.time(), attempts + 1]
+                    self._start()
+                    self._wake.set()
+                else:
+                    self.counters["dropped"] += 1
+            finally:
+                if self._in_flight.get(session_id) is document:
+                    del self._in_flight[session_id]
+
+    async def flush(self):
+        """
+        Write every queued document now and wait for writes already in progress.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        while self._pending or self._in_flight:
+            batch = [(sid, self._pending.pop(sid)) for sid in list(self._pending) if sid not in self._in_flight]
+            if batch:
+                # Last chance: a failure here is dropped rather than queued again
+                await asyncio.gather(*(self._write(sid, entry[0], entry[1], MAX_ATTEMPTS - 1) for sid, entry in batch))
+            else:
+                await asyncio.sleep(0.01)
+
+    def stats(self):
+        now = time.time()
+        written = self.counters["written"]
+        return {
+            **self.counters,
+            "enabled": WRITE_BEHIND_ENABLED,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "oldest_pending_ms": round(max((now - entry[1] for entry in self._pending.values()), default=0.0) * 1000, 1),
+            "lag_ms_avg": round(self._lag_ms_total / written, 1) if written else 0.0,
+            "lag_ms_max": round(self._lag_ms_max, 1)
+        }
+
+
+queue = WriteBehindQueue(cosmos_async.save_result, WINDOW, MAX_CONCURRENT_WRITES)